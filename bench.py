@@ -0,0 +1,1012 @@
+# clockwork benchmarks
+# Run with `python bench.py COMMAND`. Synthetic charts are generated in a temporary directory.
+
+# MODULES
+import click
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from decimal import Decimal
+from fractions import Fraction
+from time import perf_counter
+# local
+from timing import Timing, TimingList, TimingTable, TempoMap, STEP128
+from convert import Convert, split_tag, IN_FORMATS, OUT_FORMATS
+from notes import read_notes, emit_notes
+from fit import fit_timings
+
+
+
+# UTILS
+def measure(func, *args, repeat: int = 3) -> tuple[float, int]:
+    '''
+    Runs func(*args) and returns the best wall time in seconds and the peak traced memory in bytes.
+    Memory is traced in a separate run so that tracemalloc does not skew the timings.
+
+    - func: Callable | the function to benchmark
+    - repeat: int | the number of timed runs
+    '''
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = perf_counter()
+        func(*args)
+        best = min(best, perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def report(name: str, seconds: float, peak: int):
+    '''Prints a single benchmark result.'''
+    click.echo(f'{name:<24} {seconds * 1000:>10.2f} ms {peak / 2**20:>10.2f} MiB peak')
+
+
+def parse_bpms(tag: str) -> list[tuple[Decimal, Decimal]]:
+    '''Returns the (beat, bpm) pairs of a #BPMS tag, to compare tags regardless of how the numbers are written.'''
+    return [tuple(Decimal(x) for x in pair.split('=')) for pair in tag[6:-1].split(',')]
+
+
+
+# GENERATORS
+def generate_osu(path: str, timing_points: int, size: int):
+    '''
+    Writes a synthetic .osu file with the given amount of timing points, padded with hit objects up to size bytes.
+    Every other timing point is inherited.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of timing points
+    - size: int | the approximate size of the file in bytes
+    '''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('osu file format v14\n\n[General]\nAudioFilename: audio.mp3\n\n[Events]\n//Background and Video events\n\n')
+
+        f.write('[TimingPoints]\n')
+        for i in range(timing_points):
+            if i % 2:
+                f.write(f'{i * 1000},-100,4,2,0,80,0,0\n')
+            else:
+                f.write(f'{i * 1000},{300 + i % 7}.5,4,2,0,80,1,0\n')
+
+        f.write('\n[HitObjects]\n')
+        i = 0
+        while f.tell() < size:
+            f.write(f'{64 + i % 4 * 128},192,{i * 125},1,0,0:0:0:0:\n')
+            i += 1
+
+
+
+def generate_osu_sv(path: str, timing_points: int, velocities: int):
+    '''
+    Writes a synthetic SV-heavy .osu file: velocities inherited points spread between the uninherited ones, with changing multipliers.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of uninherited timing points
+    - velocities: int | the number of inherited timing points
+    '''
+    per_point = max(velocities // max(timing_points, 1), 1)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('osu file format v14\n\n[TimingPoints]\n')
+
+        for i in range(timing_points):
+            f.write(f'{i * per_point * 100},{300 + i % 7}.5,4,2,0,80,1,0\n')
+            for j in range(1, per_point + 1):
+                f.write(f'{i * per_point * 100 + j * 100 - 50},-{25 + (i + j) % 8 * 25},4,2,0,80,0,0\n')
+
+        f.write('\n[HitObjects]\n')
+
+
+def generate_osu_notes(path: str, timing_points: int, notes: int):
+    '''
+    Writes a synthetic 4K osu!mania chart: taps on 1/4th beats over the 4 columns, and a hold every 8 notes.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of uninherited timing points
+    - notes: int | the number of hit objects
+    '''
+    per_point = max(notes // max(timing_points, 1), 1)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('osu file format v14\n\n[General]\nMode: 3\n\n[Difficulty]\nCircleSize:4\n\n[TimingPoints]\n')
+
+        for i in range(timing_points):
+            f.write(f'{i * per_point * 125},500,4,2,0,80,1,0\n')
+
+        f.write('\n[HitObjects]\n')
+
+        for i in range(notes):
+            x = 64 + i % 4 * 128
+            if i % 8 == 7:
+                f.write(f'{x},192,{i * 125},128,0,{i * 125 + 250}:0:0:0:0:\n')
+            else:
+                f.write(f'{x},192,{i * 125},1,0,0:0:0:0:\n')
+
+
+
+def generate_sm_bpms(timing_points: int, exact: bool = False) -> list[str]:
+    '''
+    Returns a list of synthetic Stepmania #BPMS entries.
+
+    - timing_points: int | the number of BPM changes
+
+    OPTIONAL ARGS:
+    - exact: bool | if True, only use whole beats and BPMs with short beat lengths, so that 7-digit Decimals never round
+    '''
+    if exact:
+        bpms = ['120.000', '150.000', '200.000', '240.000', '125.000']
+        gaps = [1, 2, 4]
+    else:
+        bpms = ['120.000', '148.020', '165.500', '181.818', '200.250']
+        gaps = [0.5, 0.75, 1, 2, 4.25]
+
+    res = []
+    beat = 0.0
+    for i in range(timing_points):
+        res.append(f'{beat:.3f}={bpms[i * 7 % len(bpms)]}')
+        beat += gaps[i * 3 % len(gaps)]
+
+    return res
+
+
+def generate_sm(path: str, timing_points: int, size: int):
+    '''
+    Writes a synthetic .sm file with the given amount of BPM changes and stops, padded with #NOTES blocks up to size bytes.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of BPM changes
+    - size: int | the approximate size of the file in bytes
+    '''
+    bpms = generate_sm_bpms(timing_points)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#TITLE:synthetic;\n#ARTIST:bench;\n#OFFSET:-0.050;\n')
+        f.write('#BPMS:' + '\n,'.join(bpms) + ';\n')
+        f.write('#STOPS:' + '\n,'.join(f'{b.split("=")[0]}=0.125' for b in bpms[1::10]) + ';\n')
+
+        while f.tell() < size:
+            f.write('#NOTES:\n     dance-single:\n     :\n     Challenge:\n     12:\n     0,0,0,0,0:\n')
+            f.write(',\n'.join('1000\n0100\n0010\n0001' for _ in range(2000)) + '\n;\n')
+
+def generate_qua(path: str, timing_points: int, size: int):
+    '''
+    Writes a synthetic .qua file with the given amount of timing points, padded with hit objects up to size bytes.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of timing points
+    - size: int | the approximate size of the file in bytes
+    '''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('AudioFile: audio.mp3\nMode: Keys4\nTitle: synthetic\n')
+
+        f.write('TimingPoints:\n')
+        for i in range(timing_points):
+            f.write(f'- StartTime: {i * 1000}\n  Bpm: {300 + i % 7}.5\n')
+            if i % 5 == 0:
+                f.write('  Meter: 3\n')
+
+        f.write('SliderVelocities:\n')
+        for i in range(timing_points):
+            f.write(f'- StartTime: {i * 1000 + 500}\n  Multiplier: 1.5\n')
+
+        f.write('HitObjects:\n')
+        i = 0
+        while f.tell() < size:
+            f.write(f'- StartTime: {i * 125}\n  Lane: {1 + i % 4}\n  KeySounds: []\n')
+            i += 1
+
+
+
+def generate_sd2(path: str, timing_points: int, size: int):
+    '''
+    Writes a synthetic soundodger 2 level with the given amount of timing points, padded with shots up to size bytes, and its header file.
+    The first timing point is in the header, the others are bookmarks.
+
+    - path: str | the path of the generated level .xml file
+    - timing_points: int | the number of timing points
+    - size: int | the approximate size of the level in bytes
+    '''
+    with open(path[:-4] + '.header.xml', 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<Header title="synthetic" bpm="120" offset="0.05" />\n')
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<Level>\n  <Editor zoom="1" />\n')
+
+        for i in range(1, timing_points):
+            f.write('  ' + Timing(Decimal(i * 1000 + 50), Decimal(300 + i % 7)).to_sd2() + '\n')
+
+        f.write('  <Shots>\n')
+        i = 0
+        while f.tell() < size:
+            f.write(f'    <Shot time="{i * 0.125}" type="aimed" speed="1" amount="{1 + i % 8}" angle="{i % 360}" />\n')
+            i += 1
+        f.write('  </Shots>\n</Level>\n')
+
+
+def base36(value: int) -> str:
+    '''Returns a two-digit base 36 BMS key, e.g. 1 -> "01", 1295 -> "ZZ".'''
+    digits = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return digits[value // 36] + digits[value % 36]
+
+
+def generate_bms(path: str, timing_points: int, size: int):
+    '''
+    Writes a synthetic .bms file with the given amount of BPM changes and a stop every ten of them, padded with note channels up to size bytes.
+    BMS charts cannot have more than 1000 measures, so the changes are spread evenly across them.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of BPM changes
+    - size: int | the approximate size of the file in bytes
+    '''
+    bpms = ['120', '148.02', '165.5', '181.818', '200.25']
+    per_measure = -(-timing_points // 1000)
+    notes = '01020304' * 4
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#PLAYER 1\n#TITLE synthetic\n#ARTIST bench\n#BPM 120\n#STOP01 24\n')
+        for i, bpm in enumerate(bpms, 1):
+            f.write(f'#BPM{base36(i)} {bpm}\n')
+        f.write('#WAV01 kick.wav\n#WAV02 snare.wav\n\n')
+
+        measure = 0
+        written = 0
+        while (written < timing_points or f.tell() < size) and measure < 1000:
+            if written < timing_points:
+                count = min(per_measure, timing_points - written)
+                if measure % 7 == 3:
+                    f.write(f'#{measure:03}02:0.75\n')
+                f.write(f'#{measure:03}08:' + ''.join(base36(1 + (written + i) * 7 % len(bpms)) for i in range(count)) + '\n')
+                if measure % 10 == 0:
+                    f.write(f'#{measure:03}09:0001\n')
+                written += count
+
+            for channel in range(11, 16):
+                f.write(f'#{measure:03}{channel}:{notes}\n')
+            # pad big charts evenly across their measures
+            for _ in range(max(0, size // 1000 - f.tell() // (measure + 1)) // 200):
+                f.write(f'#{measure:03}01:{notes * 6}\n')
+            measure += 1
+
+
+
+def generate_adofai(path: str, timing_points: int, tiles: int):
+    '''
+    Writes a synthetic .adofai level with the given amount of tiles and SetSpeed actions, a twirl every hundred tiles,
+    and decorative actions on every tile. Written with trailing commas, like ADOFAI does.
+
+    - path: str | the path of the generated file
+    - timing_points: int | the number of SetSpeed actions
+    - tiles: int | the number of tiles, at least timing_points
+    '''
+    angles = [0, 0, 90, 180, 45, 0, 270, 999, 90, 135]
+    tiles = max(tiles, timing_points)
+
+    with open(path, 'w', encoding='utf-8-sig') as f:
+        f.write('{\n\t"angleData": [' + ', '.join(str(angles[i % len(angles)]) for i in range(tiles)) + '], \n')
+        f.write('\t"settings":\n\t{\n\t\t"version": 12 ,\n\t\t"bpm": 120, \n\t\t"offset": 250, \n\t},\n')
+        f.write('\t"actions":\n\t[\n')
+
+        gap = tiles // max(timing_points, 1)
+        for i in range(tiles):
+            if i % gap == 0 and i // gap < timing_points:
+                f.write(f'\t\t{{ "floor": {i}, "eventType": "SetSpeed", "speedType": "Bpm", "beatsPerMinute": {120 + i % 7 * 10}, "bpmMultiplier": 1 }},\n')
+            if i % 100 == 50:
+                f.write(f'\t\t{{ "floor": {i}, "eventType": "Twirl" }},\n')
+            f.write(f'\t\t{{ "floor": {i}, "eventType": "MoveCamera", "duration": 1, "position": [0, 0], "relativeTo": "Player", "zoom": 100, "ease": "Linear" }},\n')
+
+        f.write('\t],\n\t"decorations":\n\t[\n\t]\n}\n')
+
+
+
+# LEGACY
+# previous implementations, kept as a baseline for the benchmarks
+
+def legacy_from_osu(input_path: str) -> list[Timing]:
+    '''Whole-file read + split('\\n\\n') .osu reader.'''
+    with open(input_path, 'r', encoding='utf-8') as f:
+        osu_content = f.read().split('\n\n')
+
+    osu_timing_points = []
+    for section in osu_content:
+        if section.startswith('[TimingPoints]'):
+            osu_timing_points = section.split('\n')[1:]
+            break
+
+    return [Timing.from_osu(t) for t in osu_timing_points if t.split(',')[-2] == '1']
+
+
+def legacy_from_quaver(input_path: str) -> list[Timing]:
+    '''Regex slicing between TimingPoints and SliderVelocities.'''
+    with open(input_path, 'r', encoding='utf-8') as f:
+        qua_content = f.read()
+
+    timings_rawstr = re.findall('TimingPoints.*SliderVelocities', qua_content, re.DOTALL)[0]
+    timings_rawstr = re.sub('TimingPoints:\n', '', timings_rawstr)
+    timings_rawstr = re.sub('SliderVelocities', '', timings_rawstr)
+    return [Timing.from_quaver(t) for t in timings_rawstr.split('- ')[1:]]
+
+
+def legacy_stepmania_tags(sm_content: str) -> tuple[str, list[str]]:
+    '''Uncompiled findall + re.split reading of #OFFSET and #BPMS.'''
+    try:
+        offset_rawstr = re.findall('#OFFSET:.*;', sm_content)[0]
+        offset_split = re.split('[,;:]', offset_rawstr)
+        offset = [x for x in offset_split if x][1]
+    except:
+        offset = '0.000000'
+
+    bpm_rawstr = re.findall('#BPMS:[^;]*;', sm_content, re.DOTALL)[0]
+    bpm_split = re.split('[,;:\\s]', bpm_rawstr)
+    return offset, [x for x in bpm_split if x][1:]
+
+
+def stepmania_tags(sm_content: str) -> tuple[str, list[str]]:
+    '''Single-pass reading of the same tags.'''
+    tags = Convert._scan_stepmania(sm_content)[0]
+    return tags['OFFSET'], split_tag(tags['BPMS'])
+
+
+
+# BENCHMARKS
+@click.group()
+def bench():
+    '''
+    Benchmarks for the clockwork conversion paths.
+    '''
+
+
+@bench.command('osu-reader')
+@click.option('--size', type = int, default = 50, help = 'Size of the synthetic map in MB.')
+@click.option('--points', type = int, default = 2000, help = 'Number of timing points in the synthetic map.')
+def osu_reader(size, points):
+    '''
+    Compares the memory-mapped .osu reader with the legacy whole-file reader.
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'marathon.osu')
+        generate_osu(path, points, size * 2**20)
+
+        assert [repr(t) for t in legacy_from_osu(path)] == [repr(t) for t in Convert.from_osu(path)]
+
+        report('legacy', *measure(legacy_from_osu, path))
+        report('mapped', *measure(Convert.from_osu, path))
+
+
+
+@bench.command('qua-reader')
+@click.option('--size', type = int, default = 50, help = 'Size of the synthetic map in MB.')
+@click.option('--points', type = int, default = 10_000, help = 'Number of timing points in the synthetic map.')
+def qua_reader(size, points):
+    '''
+    Compares the memory-mapped .qua reader with the legacy regex reader.
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'marathon.qua')
+        generate_qua(path, points, size * 2**20)
+
+        assert [repr(t) for t in legacy_from_quaver(path)] == [repr(t) for t in Convert.from_quaver(path)]
+
+        report('legacy', *measure(legacy_from_quaver, path))
+        report('mapped', *measure(Convert.from_quaver, path))
+
+
+
+@bench.command('sm-reader')
+@click.option('--size', type = int, default = 50, help = 'Size of the synthetic chart in MB.')
+@click.option('--points', type = int, default = 2000, help = 'Number of BPM changes in the synthetic chart.')
+def sm_reader(size, points):
+    '''
+    Compares the single-pass Stepmania tag scanner with the legacy regexes, on a chart padded with #NOTES blocks.
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'marathon.sm')
+        generate_sm(path, points, size * 2**20)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            sm_content = f.read()
+
+        assert legacy_stepmania_tags(sm_content) == stepmania_tags(sm_content)
+
+        report('legacy tags', *measure(legacy_stepmania_tags, sm_content))
+        report('single pass tags', *measure(stepmania_tags, sm_content))
+        report('from_stepmania', *measure(Convert.from_stepmania, path))
+
+
+
+@bench.command('bms-reader')
+@click.option('--charts', type = int, default = 20, help = 'Number of charts in the synthetic pack.')
+@click.option('--size', type = int, default = 10, help = 'Size of each synthetic chart in MB.')
+@click.option('--points', type = int, default = 2000, help = 'Number of BPM changes in each synthetic chart.')
+def bms_reader(charts, size, points):
+    '''
+    Measures the throughput of the .bms reader on a pack of charts, against decoding and parsing every line of the files.
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f'{i}.bms') for i in range(charts)]
+        for path in paths:
+            generate_bms(path, points, size * 2**20)
+
+        total = sum(os.path.getsize(path) for path in paths)
+
+        def full_decode():
+            for path in paths:
+                with open(path, 'rb') as f:
+                    Convert.parse_bms(f.read())
+
+        def mapped():
+            for path in paths:
+                Convert.from_bms(path)
+
+        with open(paths[0], 'rb') as f:
+            assert [repr(t) for t in Convert.parse_bms(f.read())] == [repr(t) for t in Convert.from_bms(paths[0])]
+
+        for name, func in (('full decode', full_decode), ('mapped', mapped)):
+            seconds, peak = measure(func, repeat = 1)
+            report(name, seconds, peak)
+            click.echo(f'{"":<24} {total / 2**20 / seconds:>10.1f} MB/s')
+
+
+
+@bench.command('sd2-reader')
+@click.option('--size', type = int, default = 50, help = 'Size of the synthetic level in MB.')
+@click.option('--points', type = int, default = 2000, help = 'Number of timing points in the synthetic level.')
+def sd2_reader(size, points):
+    '''
+    Compares the streaming soundodger 2 reader with loading the whole level as a tree.
+    '''
+    from xml.etree import ElementTree
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'level.xml')
+        generate_sd2(path, points, size * 2**20)
+
+        assert len(Convert.from_sd2(path)) == points
+
+        report('ElementTree.parse', *measure(ElementTree.parse, path))
+        report('from_sd2', *measure(Convert.from_sd2, path))
+
+
+
+@bench.command('adofai-reader')
+@click.option('--tiles', type = int, default = 50_000, help = 'Number of tiles in the synthetic level.')
+@click.option('--points', type = int, default = 1000, help = 'Number of SetSpeed actions in the synthetic level.')
+def adofai_reader(tiles, points):
+    '''
+    Compares the incremental .adofai reader with loading the whole document, and times every numeric backend.
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'level.adofai')
+        generate_adofai(path, points, tiles)
+
+        def whole_document():
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                json.loads(re.sub(r',(\s*[}\]])', r'\1', f.read()))
+
+        report('json.loads (tree only)', *measure(whole_document))
+
+        for backend in ('decimal', 'fraction', 'fixed', 'numpy'):
+            report(f'from_adofai {backend}', *measure(Convert.from_adofai, path, None, backend))
+
+        timings = Convert.from_adofai(path)
+        report('to_adofai', *measure(Convert.to_adofai, timings))
+
+
+
+@bench.command('serve')
+@click.option('--runs', type = int, default = 20, help = 'Number of cold CLI and clockwork-client runs.')
+@click.option('--requests', type = int, default = 2000, help = 'Number of requests sent to the server by each client.')
+@click.option('--clients', type = int, default = 16, help = 'Number of concurrent clients.')
+def serve_bench(runs, requests, clients):
+    '''
+    Compares cold CLI runs with requests to `clockwork serve`: through clockwork-client, over one connection, and from concurrent clients.
+    Reports the throughput and the p50 / p99 latency of each.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    from client import Client
+
+    def summary(name: str, latencies: list[float], elapsed: float):
+        latencies = sorted(latencies)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        click.echo(f'{name:<24} {len(latencies) / elapsed:>10.1f} req/s   p50 {p50 * 1000:>8.2f} ms   p99 {p99 * 1000:>8.2f} ms')
+
+    def timed(func, count: int) -> tuple[list[float], float]:
+        latencies = []
+        start = perf_counter()
+        for _ in range(count):
+            begin = perf_counter()
+            func()
+            latencies.append(perf_counter() - begin)
+        return latencies, perf_counter() - start
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    cli = os.path.join(root, 'clockwork.py')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'chart.osu')
+        socket_path = os.path.join(tmp, 'clockwork.sock')
+        generate_osu(path, 40, 0)
+        request = {'input': path, 'in_format': 'osu', 'out_format': 'stepmania'}
+
+        server = subprocess.Popen([sys.executable, cli, 'serve', '--socket', socket_path, '--quiet'])
+
+        try:
+            # wait for the server to listen
+            for _ in range(100):
+                if os.path.exists(socket_path):
+                    break
+                subprocess.run([sys.executable, '-c', 'import time; time.sleep(0.05)'])
+
+            with Client(socket_path) as connection:
+                assert connection.request(**request)['ok']
+
+            run = lambda script, *args: subprocess.run([sys.executable, os.path.join(root, script), *args], capture_output = True, check = True)
+            summary('cold CLI', *timed(lambda: run('clockwork.py', path, '-i', 'osu', '-o', 'stepmania', '-q'), runs))
+            summary('clockwork-client', *timed(lambda: run('client.py', path, '-i', 'osu', '-o', 'stepmania', '--socket', socket_path), runs))
+
+            with Client(socket_path) as connection:
+                summary('one connection', *timed(lambda: connection.request(**request), requests))
+
+            def client_run(_):
+                with Client(socket_path) as connection:
+                    return timed(lambda: connection.request(**request), requests // clients)
+
+            start = perf_counter()
+            with ThreadPoolExecutor(clients) as pool:
+                results = list(pool.map(client_run, range(clients)))
+            summary(f'{clients} concurrent clients', [latency for latencies, _ in results for latency in latencies], perf_counter() - start)
+
+        finally:
+            server.terminate()
+            server.wait()
+
+
+
+@bench.command('timing-table')
+@click.option('--points', type = int, default = 100_000, help = 'Number of timing points.')
+def timing_table(points):
+    '''
+    Compares the memory held by a list[Timing] and by TimingTables, in double and fixed-point precision.
+    '''
+    def source():
+        for i in range(points):
+            yield Timing(Decimal(i * 375), Decimal('148.02000427246094') + i % 5, (4 if i % 3 else 3, 4))
+
+    containers = {
+        'list[Timing]': list,
+        'TimingTable double': TimingTable,
+        'TimingTable fixed 3': lambda timings: TimingTable(timings, precision = 3),
+    }
+
+    for name, build in containers.items():
+        tracemalloc.start()
+        held = build(source())
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        per_100k = current / len(held) * 100_000
+        click.echo(f'{name:<24} {per_100k / 2**20:>10.2f} MiB per 100k points')
+
+
+
+@bench.command('numpy-engine')
+@click.option('--points', type = int, default = 100_000, help = 'Number of timing points.')
+def numpy_engine(points):
+    '''
+    Checks that the numpy engine of TimingList matches the Decimal loops, then compares their speed.
+    '''
+    # same output on charts where 7-digit Decimals are exact
+    sm_timings = generate_sm_bpms(min(points, 1000), exact = True)
+    decimal_timings = TimingList.from_stepmania(0.0, sm_timings, backend = 'decimal')
+    numpy_timings = TimingList.from_stepmania(0.0, sm_timings, backend = 'numpy')
+
+    assert [(t.offset, t.bpm, t.meter) for t in decimal_timings] == [(t.offset, t.bpm, t.meter) for t in numpy_timings]
+
+    timings = []
+    offset = 0
+    for i in range(min(points, 1000)):
+        bpm = (120, 150, 200, 240, 125)[i * 7 % 5]
+        timings.append(Timing(Decimal(offset), Decimal(bpm)))
+        offset += 60000 // bpm * (1, 2, 4)[i * 3 % 3]
+
+    decimal_tags = TimingList.to_stepmania(timings, backend = 'decimal')
+    numpy_tags = TimingList.to_stepmania(timings, backend = 'numpy')
+    assert parse_bpms(decimal_tags[0]) == parse_bpms(numpy_tags[0]) and Decimal(decimal_tags[1][8:-1]) == Decimal(numpy_tags[1][8:-1])
+    click.echo('numpy engine matches the Decimal loops.')
+
+    # speed, on a chart where the Decimal loops round at every step
+    sm_timings = generate_sm_bpms(points)
+    timings = TimingList.from_stepmania(0.0, sm_timings)
+    table = TimingTable(timings)
+
+    for backend in ('decimal', 'numpy'):
+        report(f'from_stepmania {backend}', *measure(TimingList.from_stepmania, 0.0, sm_timings, None, backend))
+        report(f'  into TimingTable', *measure(lambda: TimingList.from_stepmania(0.0, sm_timings, TimingTable(), backend)))
+        report(f'to_stepmania {backend}', *measure(TimingList.to_stepmania, timings, STEP128, backend, repeat = 1))
+        report(f'  from TimingTable', *measure(TimingList.to_stepmania, table, STEP128, backend, repeat = 1))
+
+
+
+@bench.command('tempo-map')
+@click.option('--points', type = int, default = 10_000, help = 'Number of timing points.')
+@click.option('--lookups', type = int, default = 1_000_000, help = 'Number of times to convert.')
+def tempo_map(points, lookups):
+    '''
+    Times TempoMap lookups, one by one and in bulk.
+    '''
+    timings = TimingList.from_stepmania(0.0, generate_sm_bpms(points))
+    end = float(timings[-1].offset)
+    times = [end * i / lookups for i in range(lookups)]
+
+    report('build', *measure(TempoMap, timings))
+    tempo = TempoMap(timings)
+
+    beats = tempo.times_to_beats(times)
+    assert all(abs(tempo.beat_to_time(b) - t) < 1e-6 for b, t in zip(beats[::997], times[::997]))
+
+    report('time_to_beat', *measure(lambda: [tempo.time_to_beat(t) for t in times], repeat = 1))
+    report('times_to_beats', *measure(tempo.times_to_beats, times, repeat = 1))
+    report('beats_to_times', *measure(tempo.beats_to_times, beats, repeat = 1))
+
+
+
+@bench.command('drift')
+@click.option('--points', type = int, default = 10_000, help = 'Number of BPM changes.')
+def drift(points):
+    '''
+    Measures the error accumulated by every numeric backend of TimingList.from_stepmania, against exact rationals, and its cost per point.
+    '''
+    sm_timings = generate_sm_bpms(points)
+
+    # exact offsets, without any rounding
+    exact = [Fraction(0)]
+    for previous, current in zip(sm_timings, sm_timings[1:]):
+        beat, bpm = (Fraction(x) for x in previous.split('='))
+        exact.append(exact[-1] + 60000 / bpm * (Fraction(current.split('=')[0]) - beat))
+
+    click.echo(f'{"backend":<12} {"max error":>14} {"final error":>14} {"cost":>14}')
+
+    for backend in ('decimal', 'fraction', 'fixed', 'numpy'):
+        seconds, _ = measure(TimingList.from_stepmania, 0.0, sm_timings, None, backend)
+        timings = TimingList.from_stepmania(0.0, sm_timings, backend = backend)
+        errors = [abs(Fraction(t.offset) - e) for t, e in zip(timings, exact)]
+
+        click.echo(f'{backend:<12} {float(max(errors)):>11.6f} ms {float(errors[-1]):>11.6f} ms {seconds / points * 1e6:>8.3f} µs/pt')
+
+
+
+@bench.command('import-time')
+@click.option('--budget', type = int, default = 40, help = 'Maximum cumulative import time of each module in ms, on top of the bare import of click for the CLI.')
+@click.option('--runs', type = int, default = 5, help = 'Number of interpreter runs, the fastest one is kept.')
+def import_time(budget, runs):
+    '''
+    Measures the import time of the clockwork modules with `python -X importtime`, and fails if it regresses.
+    The CLI is measured against a bare `import click`, which it cannot do without: the budget is the time it adds on top.
+    The library modules must not import the CLI dependencies or numpy at all.
+    '''
+    # module: (the module it is measured against, the modules it must not import)
+    modules = {
+        'timing': (None, ('click', 'pyperclip', 'zenlog', 'numpy')),
+        'convert': (None, ('click', 'pyperclip', 'zenlog', 'numpy', 'json', 'xml.etree.ElementTree', 'importlib.metadata')),
+        'clockwork': ('click', ('pyperclip', 'zenlog', 'numpy', 'multiprocessing', 'xml.etree.ElementTree', 'importlib.metadata', 'asyncio', 'notes', 'fit')),
+        'client': (None, ('click', 'argparse', 'asyncio', 'convert', 'timing')),
+    }
+    # the bytecode caches are written by the first run: without them, every run would compile the modules
+    env = {name: value for name, value in os.environ.items() if name != 'PYTHONDONTWRITEBYTECODE'}
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def measure_import(module: str) -> tuple[float, dict[str, int]]:
+        best, imported = float('inf'), {}
+
+        for _ in range(runs + 1):
+            stderr = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd = cwd, env = env, capture_output = True, text = True, check = True
+            ).stderr
+
+            # import time: self [us] | cumulative | imported package
+            imported = {}
+            for line in stderr.splitlines()[1:]:
+                _, cumulative, name = line.split('|')
+                imported[name.strip()] = int(cumulative)
+
+            best = min(best, imported[module] / 1000)
+
+        return best, imported
+
+    baselines = {}
+    failed = False
+
+    for module, (baseline, forbidden) in modules.items():
+        if baseline is not None and baseline not in baselines:
+            baselines[baseline] = measure_import(baseline)[0]
+
+        best, imported = measure_import(module)
+        added = best - baselines.get(baseline, 0.0)
+        heavy = [name for name in forbidden if name in imported]
+        ok = added <= budget and not heavy
+        failed = failed or not ok
+
+        click.echo(
+            f'{module:<24} {best:>10.2f} ms {"ok" if ok else "FAILED"}'
+            + (f' ({added:.2f} ms over {baseline}, {baselines[baseline]:.2f} ms)' if baseline is not None else '')
+            + (f' (imports {", ".join(heavy)})' if heavy else '')
+        )
+
+    if failed:
+        click.echo(f'Import time budget of {budget} ms exceeded.')
+        exit(1)
+
+
+
+@bench.command('in-process')
+@click.option('--charts', type = int, default = 2000, help = 'Number of charts to convert.')
+@click.option('--points', type = int, default = 50, help = 'Number of timing points per chart.')
+def in_process(charts, points):
+    '''
+    Measures how many charts per second Convert.convert() handles in-process, with the content already in memory.
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'chart.osu')
+        generate_osu(path, points * 2, 64 * 2**10)
+        with open(path, 'rb') as f:
+            content = f.read()
+
+    for out_format in ('osu', 'sd2', 'stepmania', 'quaver'):
+        seconds, peak = measure(lambda: [Convert.convert(content, 'osu', out_format) for _ in range(charts)], repeat = 1)
+        click.echo(f'osu -> {out_format:<16} {charts / seconds:>10.0f} charts/sec {peak / 2**20:>10.2f} MiB peak')
+
+
+
+@bench.command('emit-scaling')
+@click.option('--max-points', type = int, default = 1_000_000, help = 'Largest number of timing points, starting from 1000 and growing tenfold.')
+@click.option('--tolerance', type = float, default = 2.0, help = 'Maximum ratio between the cost per point of the largest and smallest charts.')
+def emit_scaling(max_points, tolerance):
+    '''
+    Streams every output format to os.devnull through Convert.dump() and checks that the cost per timing point stays flat.
+    '''
+    sizes = [10 ** n for n in range(3, 7) if 10 ** n <= max_points]
+    tables = {}
+    failed = False
+
+    for size in sizes:
+        tables[size] = TimingTable()
+        tables[size].extend_columns([i * 250.0 for i in range(size)], [(120.0, 150.0, 240.0)[i % 3] for i in range(size)])
+
+    for out_format in ('osu', 'sd2', 'stepmania', 'quaver'):
+        costs = []
+
+        # warm up, so that the numpy import is not billed to the smallest chart
+        with open(os.devnull, 'w') as f:
+            Convert.dump(tables[sizes[0]], out_format, f)
+
+        for size in sizes:
+            with open(os.devnull, 'w') as f:
+                seconds, peak = measure(Convert.dump, tables[size], out_format, f, repeat = 1)
+
+            costs.append(seconds / size)
+            click.echo(f'{out_format:<10} {size:>9} points {seconds * 1000:>10.1f} ms {costs[-1] * 1e6:>8.2f} µs/pt {peak / 2**20:>8.2f} MiB peak')
+
+        if costs[-1] / costs[0] > tolerance:
+            click.echo(f'{out_format}: the cost per point grows with the number of points.')
+            failed = True
+
+    if failed:
+        exit(1)
+
+
+
+@bench.command('sv-scaling')
+@click.option('--max-velocities', type = int, default = 100_000, help = 'Largest number of inherited points, starting from 1000 and growing tenfold.')
+@click.option('--tolerance', type = float, default = 2.0, help = 'Maximum ratio between the cost per point of the largest and smallest charts.')
+def sv_scaling(max_velocities, tolerance):
+    '''
+    Reads SV-heavy .osu files with their velocities, writes them to every format which has velocities,
+    and checks that the cost per point of the merge stays flat.
+    '''
+    sizes = [10 ** n for n in range(3, 7) if 10 ** n <= max_velocities]
+    costs = {}
+
+    # warm up, so that the numpy import is not billed to the first chart which uses it
+    with open(os.devnull, 'w') as devnull:
+        Convert.dump(TimingTable([Timing(Decimal(i), Decimal(120)) for i in range(1000)]), 'stepmania', devnull)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f'{size}.osu')
+            generate_osu_sv(path, size // 10, size)
+            velocities = []
+            timings = Convert.from_osu(path, None, velocities)
+
+            def read():
+                Convert.from_osu(path, None, [])
+
+            stages = [('read', read)] + [
+                (out_format, lambda out_format = out_format: Convert.dump(timings, out_format, devnull, velocities = velocities))
+                for out_format in ('osu', 'quaver', 'stepmania')
+            ]
+
+            with open(os.devnull, 'w') as devnull:
+                for name, func in stages:
+                    seconds, peak = measure(func, repeat = 1)
+                    costs.setdefault(name, []).append(seconds / size)
+                    click.echo(f'{name:<10} {size:>9} velocities {len(timings):>8} bpms {seconds * 1000:>10.1f} ms {costs[name][-1] * 1e6:>8.2f} µs/pt {peak / 2**20:>8.2f} MiB peak')
+
+    failed = [name for name, cost in costs.items() if cost[-1] / cost[0] > tolerance]
+    for name in failed:
+        click.echo(f'{name}: the cost per point grows with the number of points.')
+
+    if failed:
+        exit(1)
+
+
+
+@bench.command('notes-scaling')
+@click.option('--max-notes', type = int, default = 100_000, help = 'Largest number of notes, starting from 10000 and growing tenfold.')
+@click.option('--tolerance', type = float, default = 2.0, help = 'Maximum ratio between the largest and smallest charts, of the cost per note and of the peak memory.')
+def notes_scaling(max_notes, tolerance):
+    '''
+    Streams osu!mania, Quaver and Stepmania charts into every other format with `clockwork notes`,
+    and checks that the cost per note stays flat and that the peak memory does not grow with the chart.
+    '''
+    # smaller charts fit in a single chunk, see notes.CHUNK_SIZE
+    sizes = [10 ** n for n in range(4, 8) if 10 ** n <= max_notes]
+    extensions = {'osu': 'osu', 'quaver': 'qua', 'stepmania': 'sm'}
+    costs, peaks = {}, {}
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        for size in sizes:
+            paths = {'osu': os.path.join(tmp, f'{size}.osu')}
+            generate_osu_notes(paths['osu'], 100, size)
+
+            # the other inputs are written by the pipeline itself
+            for out_format in ('quaver', 'stepmania'):
+                paths[out_format] = os.path.join(tmp, f'{size}.{extensions[out_format]}')
+                with open(paths[out_format], 'w', encoding = 'utf-8') as f:
+                    f.write('Mode: Keys4\n' if out_format == 'quaver' else '')
+                    f.writelines(emit_notes(read_notes(paths['osu'], 'osu'), out_format))
+
+            for in_format, path in paths.items():
+                for out_format in extensions:
+                    name = f'{in_format} -> {out_format}'
+                    seconds, peak = measure(lambda: devnull.writelines(emit_notes(read_notes(path, in_format), out_format)), repeat = 1)
+                    costs.setdefault(name, []).append(seconds / size)
+                    peaks.setdefault(name, []).append(peak)
+                    click.echo(f'{name:<24} {size:>9} notes {seconds * 1000:>10.1f} ms {costs[name][-1] * 1e6:>8.2f} µs/note {peak / 2**20:>8.2f} MiB peak')
+
+    failed = [name for name in costs if costs[name][-1] / costs[name][0] > tolerance or peaks[name][-1] / peaks[name][0] > tolerance]
+    for name in failed:
+        click.echo(f'{name}: the cost per note or the peak memory grows with the number of notes.')
+
+    if failed:
+        exit(1)
+
+
+
+@bench.command('fit')
+@click.option('--onsets', type = int, default = 50_000, help = 'Number of onsets.')
+@click.option('--segments', type = int, default = 50, help = 'Number of BPM changes in the synthetic onsets.')
+@click.option('--noise', type = float, default = 1.0, help = 'Standard deviation of the onsets around the grid, in ms.')
+@click.option('--budget', type = float, default = 5.0, help = 'Maximum time of the fit, in seconds.')
+def fit_bench(onsets, segments, noise, budget):
+    '''
+    Fits timings to synthetic onsets: random 1/4th, 1/2 and whole beat rhythms over BPMs between 90 and 180, with some noise.
+    Checks that every BPM is found back, and that the fit stays within budget.
+    '''
+    import numpy as np
+    rng = np.random.default_rng(0)
+    per_segment = onsets // segments
+    bpms = np.round(rng.uniform(90, 180, segments), 1)
+
+    # no two neighbouring segments with the same BPM, they could not be told apart
+    bpms[1:][np.abs(np.diff(bpms)) < 1] += 5
+    steps = rng.choice([1, 2, 2, 4], size = (segments, per_segment)).cumsum(axis = 1)
+    lengths = steps[:, -1] * 15000 / bpms
+    starts = 1000 + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    times = (starts[:, None] + steps * (15000 / bpms)[:, None]).ravel() + rng.normal(0, noise, segments * per_segment)
+
+    seconds, peak = measure(fit_timings, times, repeat = 1)
+    fitted = [float(t.bpm) for t in fit_timings(times)]
+    report(f'fit {len(times)} onsets', seconds, peak)
+
+    found = sum(any(abs(bpm - f) < 0.05 for f in fitted) for bpm in bpms)
+    click.echo(f'{found}/{segments} BPMs found back, {len(fitted)} timing points fitted.')
+
+    if seconds > budget or found < segments:
+        exit(1)
+
+
+
+@bench.command('suite')
+@click.option('--sizes', default = '10,1000,100000,1000000', help = 'Comma-separated numbers of timing points.')
+@click.option('--output', type = click.Path(dir_okay = False), default = 'bench-results.json', help = 'Where to save the results as JSON.')
+@click.option('--compare', type = click.Path(exists = True, dir_okay = False), default = None, help = 'Results of a previous run to compare with.')
+@click.option('--tolerance', type = float, default = 0.25, help = 'With --compare, the relative slowdown above which a result is a regression.')
+def suite(sizes, output, compare, tolerance):
+    '''
+    Times every Convert input -> output pair on synthetic charts, records the peak memory, and saves the results as JSON.
+    With --compare, exits with 1 if any result regressed.
+    '''
+    generators = {
+        'osu': ('osu', lambda path, points: generate_osu(path, points * 2, 0)),
+        'stepmania': ('sm', lambda path, points: generate_sm(path, points, 0)),
+        'quaver': ('qua', lambda path, points: generate_qua(path, points, 0)),
+        'sd2': ('xml', lambda path, points: generate_sd2(path, points, 0)),
+        'bms': ('bms', lambda path, points: generate_bms(path, points, 0)),
+        'adofai': ('adofai', lambda path, points: generate_adofai(path, points, points * 4)),
+    }
+    readers = {
+        'osu': Convert.from_osu,
+        'stepmania': Convert.from_stepmania,
+        'quaver': Convert.from_quaver,
+        'sd2': Convert.from_sd2,
+        'bms': Convert.from_bms,
+        'adofai': Convert.from_adofai,
+    }
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(x) for x in sizes.split(',')]:
+            # small charts are repeated to smooth out the noise, the best run is kept
+            repeat = max(1, min(100, 10_000 // size))
+
+            for in_format in IN_FORMATS:
+                extension, generate = generators[in_format]
+                path = os.path.join(tmp, f'{size}.{extension}')
+                generate(path, size)
+
+                read = readers[in_format]
+                cases = [(f'{in_format} read', lambda: read(path))] + [
+                    (f'{in_format} -> {out_format}', lambda out_format = out_format: Convert.write(read(path), out_format))
+                    for out_format in OUT_FORMATS
+                ]
+
+                for name, func in cases:
+                    seconds, peak = measure(func, repeat = repeat)
+                    results.append({'name': name, 'points': size, 'seconds': seconds, 'peak': peak})
+                    click.echo(f'{name:<24} {size:>8} points {seconds * 1000:>10.2f} ms {peak / 2**20:>10.2f} MiB peak')
+
+                os.remove(path)
+
+    with open(output, 'w', encoding = 'utf-8') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f, indent = 2)
+    click.echo(f'Results saved to {output}.')
+
+    if compare is None:
+        return
+
+    with open(compare, 'r', encoding = 'utf-8') as f:
+        baseline = {(r['name'], r['points']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    click.echo(f'{"compared to " + compare:<32} {"time":>10} {"memory":>10}')
+
+    for result in results:
+        previous = baseline.get((result['name'], result['points']))
+        if previous is None:
+            continue
+
+        time_ratio = result['seconds'] / previous['seconds']
+        memory_ratio = result['peak'] / previous['peak'] if previous['peak'] else 1.0
+        regressed = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        regressions += regressed
+
+        click.echo(f'{result["name"] + " " + str(result["points"]):<32} {time_ratio:>9.2f}x {memory_ratio:>9.2f}x' + ('  REGRESSION' if regressed else ''))
+
+    if regressions:
+        click.echo(f'{regressions} regression(s) above {tolerance:.0%}.')
+        exit(1)
+
+
+
+# MAIN
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,139 @@
+# MODULES
+# a persistent cache of converted snippets, keyed by the content of the input file, see `clockwork batch --cache`.
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from time import time
+
+# CONSTANTS
+# bump whenever the output of a conversion changes, so that older entries are never served
+CACHE_VERSION = 2
+# default size of the cache in MB
+CACHE_SIZE = 256
+
+
+
+# UTILS
+def default_cache_path() -> str:
+    '''
+    Returns the path of the cache database in the user cache directory (%LOCALAPPDATA% on Windows, $XDG_CACHE_HOME or ~/.cache elsewhere).
+    '''
+    if sys.platform == 'win32':
+        root = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        root = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+
+    return os.path.join(root, 'clockwork', 'cache.sqlite')
+
+
+
+# CONVERSIONCACHE CLASS
+class ConversionCache:
+    '''
+    A size-bounded SQLite store of converted snippets. When it grows past max_size, the least recently used entries are evicted.
+    Use as a context manager: changes are committed when it is closed.
+
+    - self.path: str | the path of the database
+    - self.max_size: int | the maximum total size of the snippets, in bytes
+    - self.size: int | the current total size of the snippets, in bytes
+    - self.hits: int | number of successful lookups
+    - self.misses: int | number of failed lookups
+    '''
+
+    def __init__(self, path: str | None = None, max_size: int = CACHE_SIZE * 2**20):
+        self.path = default_cache_path() if path is None else path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                snippet TEXT NOT NULL,
+                points INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+        ''')
+        self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    @staticmethod
+    def key(content: bytes, in_format: str, out_format: str, options: dict) -> str:
+        '''
+        Returns the cache key of a conversion: a hash of the input content, the formats and every option that changes the output.
+
+        - content: bytes | the content of the input file
+        - in_format: str | the format to convert timings from
+        - out_format: str | the format to convert timings to
+        - options: dict | the conversion options, see clockwork.second_pass()
+        '''
+        settings = json.dumps([CACHE_VERSION, in_format, out_format, options], sort_keys=True, default=str)
+
+        digest = hashlib.sha256(content)
+        digest.update(settings.encode('utf-8'))
+        return digest.hexdigest()
+
+
+    def get(self, key: str) -> tuple[str, int] | None:
+        '''
+        Returns the snippet and the number of timing points stored under key, or None. Found entries become the most recently used.
+
+        - key: str | see ConversionCache.key()
+        '''
+        row = self.connection.execute('SELECT snippet, points FROM entries WHERE key = ?', (key,)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time(), key))
+        return row
+
+
+    def put(self, key: str, snippet: str, points: int):
+        '''
+        Stores a snippet, then evicts the least recently used entries until the cache fits in max_size.
+
+        - key: str | see ConversionCache.key()
+        - snippet: str | the converted snippet
+        - points: int | the number of timing points
+        '''
+        size = len(snippet.encode('utf-8'))
+
+        # a snippet larger than the whole cache would only evict everything else
+        if size > self.max_size:
+            return
+
+        previous = self.connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        self.connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', (key, snippet, points, size, time()))
+        self.size += size - (previous[0] if previous else 0)
+
+        while self.size > self.max_size:
+            oldest = self.connection.execute('SELECT key, size FROM entries ORDER BY last_used LIMIT 64').fetchall()
+
+            for old_key, old_size in oldest:
+                if self.size <= self.max_size:
+                    break
+                self.connection.execute('DELETE FROM entries WHERE key = ?', (old_key,))
+                self.size -= old_size
+
+
+    def close(self):
+        '''Commits the changes and closes the database.'''
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,210 @@
+# MODULES
+# the thin client of `clockwork serve`, see server.py for the protocol.
+# standard library only, and nothing from clockwork itself: `clockwork-client` must start faster than a conversion takes.
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# CONSTANTS
+# used instead of a Unix socket where there are none, or with --port
+DEFAULT_PORT = 47321
+
+USAGE = '''Usage: clockwork-client INPUT -i IN_FORMAT -o OUT_FORMAT [OPTIONS]
+
+  Converts the timings of a single INPUT file with a running `clockwork serve`,
+  and prints the result or injects it into an existing chart.
+
+Options:
+  -i, --in-format TEXT     The format to convert timings from.  [required]
+  -o, --out-format TEXT    The format to convert timings to.  [required]
+  --inject FILE            Replace the timings of this existing chart instead of printing them.
+  --socket FILE            The Unix socket of the server.
+  --port INTEGER           The localhost TCP port of the server, instead of a Unix socket.
+  --practice               If -o is sd2, turn the bookmarks into practice points.
+  --sv                     Also convert scroll velocities (osu!, Quaver and Stepmania).
+  --simplify TOLERANCE     Drop the timing points which move the beat grid by no more than TOLERANCE ms.
+  --sample-set INTEGER     If -o is osu, the sample_set of the timing points.
+  --sample-index INTEGER   If -o is osu, the sample_index of the timing points.
+  --volume INTEGER         If -o is osu, the volume of the timing points.
+  --step INTEGER           If -o is stepmania or adofai, the beat quantization step, e.g. 128 for 1/128ths.
+  --backend TEXT           The numeric backend: decimal, fraction, fixed or numpy.
+  -h, --help               Show this message and exit.
+'''
+
+# command line option -> request key, and how its value is read
+OPTIONS = {
+    '-i': ('in_format', str.lower),
+    '--in-format': ('in_format', str.lower),
+    '-o': ('out_format', str.lower),
+    '--out-format': ('out_format', str.lower),
+    '--inject': ('target', os.path.abspath),
+    '--socket': ('socket', str),
+    '--port': ('port', int),
+    '--sample-set': ('sample_set', int),
+    '--sample-index': ('sample_index', int),
+    '--volume': ('volume', int),
+    '--step': ('step', int),
+    '--backend': ('backend', str.lower),
+    '--simplify': ('simplify', float),
+}
+
+
+
+# UTILS
+def default_socket_path() -> str:
+    '''
+    Returns the path of the server socket: in $XDG_RUNTIME_DIR if it is set, in the temporary directory otherwise.
+    '''
+    if 'XDG_RUNTIME_DIR' in os.environ:
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'clockwork.sock')
+
+    return os.path.join(tempfile.gettempdir(), f'clockwork-{os.getuid()}.sock')
+
+
+def use_tcp(socket_path: str | None, port: int | None) -> bool:
+    '''Returns True if the server listens on localhost TCP: with a port and no socket, or where Unix sockets are not available.'''
+    return socket_path is None and (port is not None or not hasattr(socket, 'AF_UNIX'))
+
+
+def address(socket_path: str | None = None, port: int | None = None) -> str:
+    '''Returns the address of the server, as shown to the user.'''
+    if use_tcp(socket_path, port):
+        return f'127.0.0.1:{port or DEFAULT_PORT}'
+
+    return socket_path or default_socket_path()
+
+
+
+# CLIENT CLASS
+class Client:
+    '''
+    A blocking connection to a running server. Requests are sent one at a time over the same connection.
+    Use as a context manager. Raises ConnectionError if the server cannot be reached.
+
+    - self.connection: socket.socket | the connection to the server
+    '''
+
+    def __init__(self, socket_path: str | None = None, port: int | None = None, timeout: float | None = 30):
+        try:
+            if use_tcp(socket_path, port):
+                self.connection = socket.create_connection(('127.0.0.1', port or DEFAULT_PORT), timeout)
+            else:
+                self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.connection.settimeout(timeout)
+                self.connection.connect(socket_path or default_socket_path())
+
+        except OSError as e:
+            raise ConnectionError(f'Could not connect to the server at {address(socket_path, port)}, is `clockwork serve` running? ({e})') from e
+
+        self.responses = self.connection.makefile('rb')
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def request(self, **request) -> dict:
+        '''
+        Sends a request and returns the decoded response, see the protocol in server.py.
+        '''
+        self.connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        line = self.responses.readline()
+
+        if not line:
+            raise ConnectionError('The server closed the connection.')
+
+        return json.loads(line)
+
+
+    def close(self):
+        '''Closes the connection.'''
+        self.responses.close()
+        self.connection.close()
+
+
+
+# CLI
+def parse_args(args: list[str]) -> dict | None:
+    '''
+    Turns the command line into a request, see USAGE. Returns None if the usage was asked for, raises ValueError on a bad command line.
+
+    - args: list[str] | the arguments, without the program name
+    '''
+    request = {}
+    args = list(args)
+
+    while args:
+        arg = args.pop(0)
+
+        if arg in ('-h', '--help'):
+            return None
+
+        if arg in ('--practice', '--sv'):
+            request[arg[2:]] = True
+
+        elif arg in OPTIONS:
+            if not args:
+                raise ValueError(f'Option {arg} requires a value.')
+            key, read = OPTIONS[arg]
+            request[key] = read(args.pop(0))
+
+        elif arg.startswith('-'):
+            raise ValueError(f'No such option: {arg}')
+
+        elif 'input' in request:
+            raise ValueError(f'Got unexpected extra argument ({arg})')
+
+        else:
+            request['input'] = os.path.abspath(arg)
+
+    for key, name in (('input', 'INPUT'), ('in_format', '--in-format'), ('out_format', '--out-format')):
+        if key not in request:
+            raise ValueError(f'Missing {name}.')
+
+    return request
+
+
+def main(args: list[str] | None = None):
+    '''
+    Entry point of `clockwork-client`. Exits with 1 if the conversion failed, 2 on a bad command line.
+    '''
+    try:
+        request = parse_args(sys.argv[1:] if args is None else args)
+    except ValueError as e:
+        sys.stderr.write(f'{USAGE.splitlines()[0]}\n\nError: {e}\n')
+        sys.exit(2)
+
+    if request is None:
+        sys.stderr.write(USAGE)
+        return
+
+    try:
+        with Client(request.pop('socket', None), request.pop('port', None)) as connection:
+            response = connection.request(**request)
+
+    except ConnectionError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    # e.g. the server did not answer in time
+    except OSError as e:
+        sys.stderr.write(f'The request to the server failed ({e}).\n')
+        sys.exit(1)
+
+    if not response['ok']:
+        sys.stderr.write(f'{response["error"]}\n')
+        sys.exit(1)
+
+    if response['output'] is not None:
+        sys.stdout.write(response['output'] + '\n')
+
+
+
+if __name__ == '__main__':
+    main()
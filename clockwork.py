@@ -1,113 +1,847 @@
-# clockwork v0.3.0
-
-# MODULES
-import click
-import pyperclip
-from decimal import *
-from sys import platform
-from zenlog import log
-# local
-from timing import Timing, STEP128
-from convert import Convert
-
-
-
-# CLI
-@click.command()
-@click.version_option()
-@click.argument('input', 
-    type = click.Path()
-)
-
-# io
-@click.option('--in-format', '-i',
-    type = click.Choice(['osu', 'stepmania', 'quaver'], case_sensitive = False),
-    required = True,
-    help = 'The format to convert timings from.',
-)
-@click.option('--out-format', '-o',
-    type = click.Choice(['osu', 'sd2', 'stepmania', 'quaver'], case_sensitive = False),
-    required = True,
-    help = 'The format to convert timings to.',
-)
-@click.option('--show-result', '-s',
-    is_flag = True, 
-    help = 'Show the results of the conversion on the terminal.'
-)
-
-# sd2
-@click.option('--practice/--no-practice',
-    is_flag = True,
-    help = 'If -o is sd2, turn the bookmarks into practice points (or not). Ignored if --out-format is not sd2.'
-)
-
-# osu
-@click.option('--sample-set',
-    type = click.IntRange(0, 3, clamp=True),
-    required = False,
-    default = 0,
-    help = 'If -o is osu, use the provided sample_set value in timing points.'
-)
-@click.option('--sample-index',
-    type = int,
-    default = 0,
-    required = False,
-    help = 'If -o is osu, use the provided sample_index value in timing points.'
-)
-@click.option('--volume',
-    type = click.IntRange(0, 100),
-    default = 80,
-    required = False,
-    help = 'If -o is osu, use the provided volume value in timing points.'
-)
-
-# stepmania
-@click.option('--step',
-    type = click.Choice(['1', '2', '4', '16', '32', '64', '128', '3', '6', '12', '24', '48', '96']),
-    default = '128',
-    required = False,
-    help = 'If -o is stepmania, use the following step value as a precision. For example, choosing 2 will yield bpm changes only on full and half notes.'
-)
-
-# cli command
-def cli(input, in_format, out_format, show_result, practice, volume, sample_set, sample_index, step):
-
-    click.echo()
-
-    # FIRST PASS: convert to Timing instances
-    if in_format == 'osu':
-        first_pass = Convert.from_osu(input)
-
-    elif in_format == 'stepmania': 
-        first_pass = Convert.from_stepmania(input)
-
-    elif in_format == 'quaver': 
-        first_pass = Convert.from_quaver(input)
-
-
-    # SECOND PASS: convert to file snippets
-    if out_format == 'osu':
-        second_pass = Convert.to_osu(first_pass, volume, sample_set, sample_index)
-
-    elif out_format == 'stepmania':
-        second_pass = Convert.to_stepmania(first_pass, step=Decimal(1 / int(step)))
-
-    elif out_format == 'sd2':
-        if practice: 
-            second_pass = Convert.to_sd2(first_pass, practice = True)
-        else: 
-            second_pass = Convert.to_sd2(first_pass)
-
-    elif out_format == 'quaver':
-        second_pass = Convert.to_quaver(first_pass)
-        
-
-    if show_result:
-        click.echo()
-        click.echo(second_pass)
-
-
-
-# MAIN
-if __name__ == '__main__':
-    cli()
+# clockwork v0.3.0
+
+# MODULES
+# pyperclip, zenlog, the process pool, inject, cache, server and cProfile are imported where they are used, so that scripted runs do not pay for them
+from time import perf_counter, process_time
+# start of the `startup` stage of --profile
+STARTED = perf_counter()
+import click
+import json
+import os
+import sys
+from contextlib import contextmanager
+from decimal import *
+# local
+from timing import Timing, TimingList, Velocity, BACKENDS, STEP128
+from convert import Convert, ClockworkError, check_timings
+from formats import get_format, format_names
+
+# CONSTANTS
+# the --step choices, in 1/nths of a beat
+STEPS = ['1', '2', '4', '16', '32', '64', '128', '3', '6', '12', '24', '48', '96']
+
+
+
+# UTILS
+def logger():
+    '''Returns the zenlog logger. zenlog is imported on first use, so that --quiet runs never load it.'''
+    from zenlog import log
+    return log
+
+
+def copy_to_clipboard(snippet: str, out_format: str, quiet: bool = False):
+    '''
+    Copies a snippet to the clipboard and explains where to paste it.
+
+    - snippet: str | the converted snippet
+    - out_format: str | the format of the snippet
+
+    OPTIONAL ARGS:
+    - quiet: bool | if True, do not log anything
+    '''
+    import pyperclip
+
+    pyperclip.copy(snippet)
+
+    if not quiet:
+        for hint in get_format(out_format).hints:
+            logger().info(hint)
+
+
+
+# PROFILING
+class StageTimer:
+    '''
+    Records the wall and CPU time spent in each stage of a conversion, see --profile.
+    Use as `with timer('stage'): ...`. Entering a stage again adds to its times.
+
+    - self.stages: dict[str, list[float]] | the [wall, cpu] times of each stage in seconds, in the order they were first entered
+    '''
+
+    def __init__(self):
+        self.stages = {}
+
+
+    @contextmanager
+    def __call__(self, name: str):
+        wall, cpu = perf_counter(), process_time()
+
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - wall, process_time() - cpu)
+
+
+    def add(self, name: str, wall: float, cpu: float):
+        '''Adds times to a stage.'''
+        times = self.stages.setdefault(name, [0.0, 0.0])
+        times[0] += wall
+        times[1] += cpu
+
+
+    def merge(self, stages: dict[str, list[float]]):
+        '''Adds the stages of another StageTimer, e.g. one returned by a worker process.'''
+        for name, (wall, cpu) in stages.items():
+            self.add(name, wall, cpu)
+
+
+    def to_json(self) -> dict[str, dict[str, float]]:
+        '''Returns the stages as {name: {'wall': seconds, 'cpu': seconds}}.'''
+        return {name: {'wall': wall, 'cpu': cpu} for name, (wall, cpu) in self.stages.items()}
+
+
+    def report(self, points: int):
+        '''Prints the stages as a table on stderr.'''
+        click.echo(f'{"stage":<24} {"wall":>12} {"cpu":>12}', err = True)
+
+        for name, (wall, cpu) in self.stages.items():
+            click.echo(f'{name:<24} {wall * 1000:>9.2f} ms {cpu * 1000:>9.2f} ms', err = True)
+
+        total_wall = sum(wall for wall, cpu in self.stages.values())
+        total_cpu = sum(cpu for wall, cpu in self.stages.values())
+        click.echo(f'{"total":<24} {total_wall * 1000:>9.2f} ms {total_cpu * 1000:>9.2f} ms', err = True)
+        click.echo(f'{points} timing points', err = True)
+
+
+
+# CONVERSION
+def first_pass(input_path: str, in_format: str, backend: str | None = None, timer: StageTimer | None = None, velocities: list[Velocity] | None = None) -> list[Timing]:
+    '''
+    Converts a file to a list of Timing instances.
+
+    - input_path: str | the path towards the file
+    - in_format: str | the format to convert timings from
+
+    OPTIONAL ARGS:
+    - backend: str | the numeric backend used by formats which use beats instead of offsets
+    - timer: StageTimer | records the `read` and `first pass` stages
+    - velocities: list[Velocity] | if given, the scroll velocities of the file are appended to it, see --sv
+    '''
+    timer = StageTimer() if timer is None else timer
+
+    with timer('read'):
+        content = Convert.extract(input_path, in_format)
+
+    with timer('first pass'):
+        return Convert.read(content, in_format, backend=backend, velocities=velocities)
+
+
+def simplify_pass(timings: list[Timing], tolerance: float | None, timer: StageTimer | None = None) -> tuple[list[Timing], float]:
+    '''
+    Drops the timing points which move the beat grid by less than tolerance ms, see TimingList.simplify(). Returns the kept points and the largest shift in ms.
+    Does nothing if tolerance is None.
+
+    - timings: list[Timing] | a list of Timing instances
+    - tolerance: float | None | the largest shift of the beat grid allowed, in ms, see --simplify
+
+    OPTIONAL ARGS:
+    - timer: StageTimer | records the `simplify` stage
+    '''
+    if tolerance is None:
+        return timings, 0.0
+
+    check_timings(timings)
+    timer = StageTimer() if timer is None else timer
+
+    with timer('simplify'):
+        return TimingList.simplify(timings, tolerance)
+
+
+def second_pass(timings: list[Timing], out_format: str, practice: bool = False, volume: int = 80, sample_set: int = 0, sample_index: int = 0, step: str = '128', backend: str | None = None, velocities: list[Velocity] | None = None, stream=None) -> str | None:
+    '''
+    Converts a list of Timing instances to a file snippet.
+
+    - timings: list[Timing] | a list of Timing instances
+    - out_format: str | the format to convert timings to
+
+    OPTIONAL ARGS:
+    - velocities: list[Velocity] | the scroll velocities read by first_pass(), written by formats which have them
+    - stream: TextIO | if given, the snippet is written to it as it is generated and None is returned
+    See the options of the `clockwork` command for the others.
+    '''
+    options = {
+        'practice': practice,
+        'volume': volume,
+        'sample_set': sample_set,
+        'sample_index': sample_index,
+        'step': Decimal(1 / int(step)),
+        'backend': backend,
+        'velocities': velocities,
+    }
+
+    if stream is not None:
+        return Convert.dump(timings, out_format, stream, **options)
+
+    return Convert.write(timings, out_format, **options)
+
+
+def convert_file(input_path: str, output_path: str, in_format: str, out_format: str, options: dict) -> tuple[int, dict]:
+    '''
+    Converts a single file and writes the snippet to output_path. Returns the number of timing points and the stages of a StageTimer.
+    Runs inside the `clockwork batch` worker processes.
+
+    - input_path: str | the path towards the input file
+    - output_path: str | the path towards the output file
+    - in_format: str | the format to convert timings from
+    - out_format: str | the format to convert timings to
+    - options: dict | keyword arguments passed to second_pass(), `sv` to convert scroll velocities along and `simplify`, see simplify_pass()
+    '''
+    timer = StageTimer()
+    options = dict(options)
+    velocities = [] if options.pop('sv', False) else None
+    tolerance = options.pop('simplify', None)
+    timings = simplify_pass(first_pass(input_path, in_format, options.get('backend'), timer, velocities), tolerance, timer)[0]
+
+    with timer('second pass + write'):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            second_pass(timings, out_format, **options, velocities=velocities, stream=f)
+
+    return len(timings), timer.stages
+
+
+def convert_content(content: bytes, output_path: str, in_format: str, out_format: str, options: dict) -> tuple[int, str, dict]:
+    '''
+    Converts the content of a file and writes the snippet to output_path. Returns the number of timing points, the snippet and the stages of a StageTimer.
+    Runs inside the `clockwork batch --cache` worker processes: the content was already read and hashed by the main process.
+
+    - content: bytes | the content of the input file
+    - output_path: str | the path towards the output file
+    - in_format: str | the format to convert timings from
+    - out_format: str | the format to convert timings to
+    - options: dict | keyword arguments passed to second_pass(), `sv` to convert scroll velocities along and `simplify`, see simplify_pass()
+    '''
+    timer = StageTimer()
+    options = dict(options)
+    velocities = [] if options.pop('sv', False) else None
+    tolerance = options.pop('simplify', None)
+
+    with timer('first pass'):
+        timings = Convert.read(content, in_format, backend=options.get('backend'), velocities=velocities)
+
+    timings = simplify_pass(timings, tolerance, timer)[0]
+
+    with timer('second pass'):
+        snippet = second_pass(timings, out_format, **options, velocities=velocities)
+
+    with timer('write'):
+        write_output(output_path, snippet)
+
+    return len(timings), snippet, timer.stages
+
+
+def write_output(output_path: str, snippet: str):
+    '''
+    Writes a snippet to output_path, creating its directory if needed.
+
+    - output_path: str | the path towards the output file
+    - snippet: str | the converted snippet
+    '''
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(snippet)
+
+
+def find_files(directory: str, in_format: str) -> list[str]:
+    '''
+    Walks a directory tree and returns the sorted paths of every file matching the input format.
+
+    - directory: str | the root of the tree
+    - in_format: str | the format to convert timings from
+    '''
+    extensions = tuple(f'.{ext}' for ext in get_format(in_format).extensions)
+    res = []
+
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        res += [os.path.join(root, name) for name in sorted(files) if name.endswith(extensions)]
+
+    return res
+
+
+def output_path_for(input_path: str, directory: str, output_dir: str | None, out_format: str) -> str:
+    '''
+    Returns the path of the snippet written for input_path: next to the input, or in a mirrored tree under output_dir.
+    The snippet keeps the full input name, e.g. "song.osu" -> "song.osu.stepmania.txt", so that it is never picked up by a later run.
+
+    - input_path: str | the path towards the input file
+    - directory: str | the root of the walked tree
+    - output_dir: str | None | the root of the mirrored output tree, if any
+    - out_format: str | the format to convert timings to
+    '''
+    name = f'{os.path.basename(input_path)}.{out_format}.txt'
+
+    if output_dir is None:
+        return os.path.join(os.path.dirname(input_path), name)
+
+    relative_dir = os.path.relpath(os.path.dirname(input_path), directory)
+    return os.path.normpath(os.path.join(output_dir, relative_dir, name))
+
+
+
+# CLI
+class DefaultGroup(click.Group):
+    '''
+    A click group that falls back to a default command, so that `clockwork INPUT -i ... -o ...` keeps working next to `clockwork batch ...`.
+    '''
+
+    def __init__(self, *args, default: str = 'convert', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default = default
+
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ('--help', '--version'):
+            args = [self.default] + args
+
+        return super().parse_args(ctx, args)
+
+
+class FormatChoice(click.ParamType):
+    '''
+    A case-insensitive choice between the formats with a capability, see formats.py.
+    Built-in formats are accepted without looking up plugins. Plugins are only listed in --help and error messages.
+    '''
+    name = 'format'
+
+    def __init__(self, capability: str):
+        self.capability = capability
+
+
+    def get_metavar(self, param, ctx = None):
+        return f'[{"|".join(format_names(self.capability))}]'
+
+
+    def convert(self, value, param, ctx):
+        name = value.lower()
+        file_format = get_format(name)
+
+        if file_format is None or self.capability not in file_format.capabilities:
+            self.fail(f'"{value}" is not one of {", ".join(format_names(self.capability))}.', param, ctx)
+
+        return name
+
+
+def format_options(func):
+    '''
+    Adds the options shared by every conversion command: io formats and per-format settings.
+    '''
+    options = [
+        # io
+        click.option('--in-format', '-i',
+            type = FormatChoice('read'),
+            required = True,
+            help = 'The format to convert timings from.',
+        ),
+        click.option('--out-format', '-o',
+            type = FormatChoice('write'),
+            required = True,
+            help = 'The format to convert timings to.',
+        ),
+
+        # sd2
+        click.option('--practice/--no-practice',
+            is_flag = True,
+            help = 'If -o is sd2, turn the bookmarks into practice points (or not). Ignored if --out-format is not sd2.'
+        ),
+
+        # osu
+        click.option('--sample-set',
+            type = click.IntRange(0, 3, clamp=True),
+            required = False,
+            default = 0,
+            help = 'If -o is osu, use the provided sample_set value in timing points.'
+        ),
+        click.option('--sample-index',
+            type = int,
+            default = 0,
+            required = False,
+            help = 'If -o is osu, use the provided sample_index value in timing points.'
+        ),
+        click.option('--volume',
+            type = click.IntRange(0, 100),
+            default = 80,
+            required = False,
+            help = 'If -o is osu, use the provided volume value in timing points.'
+        ),
+
+        # stepmania
+        click.option('--step',
+            type = click.Choice(STEPS),
+            default = '128',
+            required = False,
+            help = 'If -o is stepmania, use the following step value as a precision. For example, choosing 2 will yield bpm changes only on full and half notes.'
+        ),
+
+        # osu, quaver, stepmania
+        click.option('--sv/--no-sv',
+            default = False,
+            help = 'Also convert scroll velocities: osu! inherited timing points, Quaver SliderVelocities and Stepmania #SCROLLS. Ignored by the other formats.'
+        ),
+
+        # every format
+        click.option('--simplify',
+            type = click.FloatRange(0),
+            default = None,
+            metavar = 'TOLERANCE',
+            help = 'Drop the timing points which move the beat grid by no more than TOLERANCE ms, e.g. runs of almost identical BPMs.'
+        ),
+
+        # numeric backend
+        click.option('--backend',
+            type = click.Choice(BACKENDS, case_sensitive = False),
+            default = None,
+            required = False,
+            help = 'The arithmetic used for stepmania beats: 7-digit decimals, exact fractions, integer microseconds or numpy. By default, numpy writes the beats of large charts, with the same result as decimals.'
+        ),
+    ]
+
+    for option in reversed(options):
+        func = option(func)
+
+    return func
+
+
+@click.group(cls = DefaultGroup)
+@click.version_option()
+def cli():
+    '''
+    A small CLI for timing conversion between various music games.
+    Runs `clockwork convert` when no command is given.
+    '''
+
+
+# convert command
+@cli.command()
+@click.argument('input',
+    type = click.Path()
+)
+@format_options
+@click.option('--clipboard', '-c',
+    is_flag = True,
+    help = 'Copy the results of the conversion to the clipboard instead of printing them.'
+)
+@click.option('--inject', 'target',
+    type = click.Path(exists = True, dir_okay = False),
+    default = None,
+    help = 'Replace the timings of this existing chart with the results of the conversion instead of printing them. The format of the chart is -o.'
+)
+@click.option('--show-result', '-s',
+    is_flag = True,
+    help = 'With --clipboard, also show the results of the conversion on the terminal.'
+)
+@click.option('--quiet', '-q',
+    is_flag = True,
+    help = 'Do not log anything but errors.'
+)
+@click.option('--profile',
+    is_flag = True,
+    help = 'Show the wall and CPU time of each stage of the conversion on stderr.'
+)
+@click.option('--profile-dump',
+    type = click.Path(dir_okay = False),
+    default = None,
+    help = 'Run the conversion under cProfile and save the statistics to this file, to be read with pstats or snakeviz.'
+)
+def convert(input, in_format, out_format, clipboard, target, show_result, quiet, profile, profile_dump, practice, volume, sample_set, sample_index, step, sv, simplify, backend):
+    '''
+    Converts the timings of a single INPUT file and prints the result, copies it to the clipboard, or injects it into an existing chart.
+    '''
+    timer = StageTimer()
+    timer.add('startup', perf_counter() - STARTED, process_time())
+
+    if profile_dump is not None:
+        from cProfile import Profile
+        profiler = Profile()
+        profiler.enable()
+
+    try:
+        # FIRST PASS: convert to Timing instances
+        velocities = [] if sv else None
+        timings = first_pass(input, in_format, backend, timer, velocities)
+        read_points = len(timings)
+        timings, shift = simplify_pass(timings, simplify, timer)
+
+        # SECOND PASS: convert to file snippets
+        # printed snippets are streamed to stdout, only the clipboard needs the whole string
+        if clipboard:
+            with timer('second pass'):
+                snippet = second_pass(timings, out_format, practice, volume, sample_set, sample_index, step, backend, velocities)
+
+        if target is not None:
+            from inject import inject
+            with timer('second pass + inject'):
+                inject(timings, target, out_format, practice = practice, volume = volume, sample_set = sample_set, sample_index = sample_index, step = Decimal(1 / int(step)), backend = backend, velocities = velocities)
+
+        elif not clipboard:
+            with timer('second pass + write'):
+                second_pass(timings, out_format, practice, volume, sample_set, sample_index, step, backend, velocities, stream = sys.stdout)
+                click.echo()
+
+    except ClockworkError as e:
+        logger().error(str(e))
+        exit(1)
+
+    if not quiet:
+        click.echo(err = True)
+        logger().info('Successfully converted!')
+
+        if simplify is not None:
+            logger().info(f'{read_points - len(timings)} of {read_points} timing points simplified away, the beat grid moved by {shift:.3f} ms at most.')
+
+        if target is not None:
+            logger().info(f'Timings injected into {target}.')
+
+    if clipboard:
+        with timer('clipboard'):
+            copy_to_clipboard(snippet, out_format, quiet)
+
+        if show_result:
+            click.echo()
+            click.echo(snippet)
+
+    if profile_dump is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_dump)
+
+    if profile:
+        click.echo(err = True)
+        timer.report(len(timings))
+
+
+# batch command
+@cli.command()
+@click.argument('directory',
+    type = click.Path(exists = True, file_okay = False)
+)
+@format_options
+@click.option('--output-dir', '-d',
+    type = click.Path(file_okay = False),
+    default = None,
+    help = 'Write the results into a mirrored tree under this directory instead of next to the input files.'
+)
+@click.option('--jobs', '-j',
+    type = click.IntRange(1),
+    default = None,
+    help = 'The number of worker processes. Defaults to the number of CPUs.'
+)
+@click.option('--cache/--no-cache',
+    default = False,
+    help = 'Keep the results in a persistent cache, so that files which did not change since the last run are neither parsed nor converted again.'
+)
+@click.option('--cache-path',
+    type = click.Path(dir_okay = False),
+    default = None,
+    help = 'The cache database. Defaults to clockwork/cache.sqlite in the user cache directory.'
+)
+@click.option('--cache-size',
+    type = click.IntRange(1),
+    default = 256,
+    help = 'The maximum size of the cache in MB. The least recently used results are evicted first.'
+)
+@click.option('--quiet', '-q',
+    is_flag = True,
+    help = 'Do not log anything but errors.'
+)
+@click.option('--profile',
+    is_flag = True,
+    help = 'Show the wall and CPU time of each stage, summed over every file, on stderr.'
+)
+@click.option('--profile-json',
+    type = click.Path(dir_okay = False),
+    default = None,
+    help = 'Save the stages of every file as JSON to this file.'
+)
+def batch(directory, in_format, out_format, practice, volume, sample_set, sample_index, step, sv, simplify, backend, output_dir, jobs, cache, cache_path, cache_size, quiet, profile, profile_json):
+    '''
+    Converts the timings of every matching file under DIRECTORY, using a pool of worker processes.
+    '''
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from contextlib import nullcontext
+
+    options = {
+        'practice': practice,
+        'volume': volume,
+        'sample_set': sample_set,
+        'sample_index': sample_index,
+        'step': step,
+        'backend': backend,
+        'sv': sv,
+        'simplify': simplify,
+    }
+    input_paths = find_files(directory, in_format)
+    failures = []
+    points = 0
+    # per-file profile, see --profile-json
+    files = {path: {'points': 0, 'error': None, 'timer': StageTimer()} for path in input_paths}
+
+    start = perf_counter()
+
+    if cache:
+        from cache import ConversionCache
+        results = ConversionCache(cache_path, cache_size * 2**20)
+    else:
+        results = nullcontext()
+
+    with results, ProcessPoolExecutor(max_workers = jobs) as executor:
+        futures = {}
+
+        for path in input_paths:
+            output_path = output_path_for(path, directory, output_dir, out_format)
+
+            if not cache:
+                futures[executor.submit(convert_file, path, output_path, in_format, out_format, options)] = (path, None)
+                continue
+
+            # cached results are written by the main process, the others are converted from the content that was hashed
+            timer = files[path]['timer']
+
+            try:
+                with timer('read + hash'):
+                    with open(path, 'rb') as f:
+                        content = f.read()
+                    key = results.key(content, in_format, out_format, options)
+
+                with timer('cache'):
+                    hit = results.get(key)
+
+                if hit is not None:
+                    with timer('write'):
+                        write_output(output_path, hit[0])
+                    points += hit[1]
+                    files[path]['points'] = hit[1]
+                    continue
+
+            except OSError as e:
+                failures.append((path, f'{type(e).__name__}: {e}'))
+                continue
+
+            futures[executor.submit(convert_content, content, output_path, in_format, out_format, options)] = (path, key)
+
+        for future in as_completed(futures):
+            path, key = futures[future]
+
+            try:
+                result = future.result()
+            except ClockworkError as e:
+                failures.append((path, str(e)))
+                continue
+            except Exception as e:
+                failures.append((path, f'{type(e).__name__}: {e}'))
+                continue
+
+            if key is None:
+                file_points, stages = result
+            else:
+                file_points, snippet, stages = result
+                results.put(key, snippet, file_points)
+
+            points += file_points
+            files[path]['points'] = file_points
+            files[path]['timer'].merge(stages)
+
+    elapsed = perf_counter() - start
+    converted = len(input_paths) - len(failures)
+    rate = len(input_paths) / elapsed if elapsed else 0.0
+
+    for path, error in sorted(failures):
+        logger().error(f'{path} | {error}')
+        files[path]['error'] = error
+
+    if not quiet:
+        logger().info(f'{converted}/{len(input_paths)} files converted ({points} timing points) in {elapsed:.2f}s, {rate:.1f} files/sec.')
+
+        if cache:
+            logger().info(f'Cache: {results.hits} hits, {results.misses} misses.')
+
+    totals = StageTimer()
+    for record in files.values():
+        totals.merge(record['timer'].stages)
+
+    if profile:
+        click.echo(err = True)
+        totals.report(points)
+
+    if profile_json is not None:
+        summary = {
+            'directory': directory,
+            'in_format': in_format,
+            'out_format': out_format,
+            'jobs': jobs or os.cpu_count(),
+            'elapsed': elapsed,
+            'points': points,
+            'stages': totals.to_json(),
+            'files': [
+                {'path': path, 'points': record['points'], 'error': record['error'], 'stages': record['timer'].to_json()}
+                for path, record in files.items()
+            ],
+        }
+
+        with open(profile_json, 'w', encoding = 'utf-8') as f:
+            json.dump(summary, f, indent = 2)
+
+    if failures:
+        exit(1)
+
+
+
+# notes command
+@cli.command()
+@click.argument('input',
+    type = click.Path(exists = True, dir_okay = False)
+)
+@click.option('--in-format', '-i',
+    type = FormatChoice('notes'),
+    required = True,
+    help = 'The format to convert the chart from.'
+)
+@click.option('--out-format', '-o',
+    type = FormatChoice('notes'),
+    required = True,
+    help = 'The format to convert the chart to.'
+)
+@click.option('--chart',
+    type = click.IntRange(0),
+    default = None,
+    help = 'If -i is stepmania, the index of the chart to convert, in the order of the file. Defaults to the first one.'
+)
+@click.option('--step',
+    type = click.Choice(STEPS),
+    default = '128',
+    help = 'If -o is stepmania, the step on which the BPM changes and the notes are quantized. For example, 16 puts every note on a 1/16th of a beat.'
+)
+@click.option('--backend',
+    type = click.Choice(BACKENDS, case_sensitive = False),
+    default = None,
+    help = 'The arithmetic used for stepmania beats, see `clockwork convert --help`.'
+)
+def notes(input, in_format, out_format, chart, step, backend):
+    '''
+    Converts the timing and the notes of a single INPUT chart, and prints them: osu!mania [TimingPoints] and [HitObjects],
+    Quaver TimingPoints and HitObjects, or Stepmania #OFFSET, #BPMS and an Edit #NOTES chart.
+    Notes are streamed from INPUT to the output, so that charts of any size are converted in constant memory.
+    '''
+    from notes import read_notes, emit_notes
+
+    try:
+        note_chart = read_notes(input, in_format, chart, backend)
+        sys.stdout.writelines(emit_notes(note_chart, out_format, step = Decimal(1 / int(step)), backend = backend))
+
+    except ClockworkError as e:
+        logger().error(str(e))
+        exit(1)
+
+
+
+# fit command
+@cli.command()
+@click.argument('input',
+    type = click.Path(exists = True, dir_okay = False)
+)
+@click.option('--in-format', '-i',
+    type = FormatChoice('notes'),
+    default = None,
+    help = 'The format of the chart whose notes are fitted. Without it, INPUT is a plain list of times in ms.'
+)
+@click.option('--out-format', '-o',
+    type = FormatChoice('write'),
+    required = True,
+    help = 'The format to write the fitted timings to.'
+)
+@click.option('--min-bpm',
+    type = click.FloatRange(1),
+    default = 90,
+    help = 'The BPMs are searched between --min-bpm and twice --min-bpm, since a grid also fits twice its BPM.'
+)
+@click.option('--snap',
+    type = click.IntRange(1),
+    default = 4,
+    help = 'The grid of the notes, in 1/nths of a beat. 12 also fits triplets, but is more easily fooled.'
+)
+@click.option('--tolerance',
+    type = click.FloatRange(0, min_open = True),
+    default = 5,
+    help = 'The largest distance between a note and the fitted grid, in ms. A BPM change is detected once notes stray further.'
+)
+@click.option('--step',
+    type = click.Choice(STEPS),
+    default = '128',
+    help = 'If -o is stepmania, use the following step value as a precision.'
+)
+@click.option('--backend',
+    type = click.Choice(BACKENDS, case_sensitive = False),
+    default = None,
+    help = 'The arithmetic used for stepmania beats, see `clockwork convert --help`.'
+)
+@click.option('--quiet', '-q',
+    is_flag = True,
+    help = 'Do not log anything but errors.'
+)
+def fit(input, in_format, out_format, min_bpm, snap, tolerance, step, backend, quiet):
+    '''
+    Fits timing points to the notes of an unsynced INPUT chart, or to a plain list of times in ms, and prints them.
+    BPM changes are detected where the notes leave the grid of the current BPM.
+    '''
+    from fit import read_onsets, fit_timings
+
+    try:
+        onsets = read_onsets(input, in_format)
+        timings = fit_timings(onsets, min_bpm, snap, tolerance)
+
+    except ClockworkError as e:
+        logger().error(str(e))
+        exit(1)
+
+    if not quiet:
+        logger().info(f'{len(timings)} timing points fitted to {len(onsets)} notes.')
+        click.echo(err = True)
+
+    second_pass(timings, out_format, step = step, backend = backend, stream = sys.stdout)
+    click.echo()
+
+
+
+# serve command
+@cli.command()
+@click.option('--socket', 'socket_path',
+    type = click.Path(dir_okay = False),
+    default = None,
+    help = 'The Unix socket to listen on. Defaults to $XDG_RUNTIME_DIR/clockwork.sock, or a socket in the temporary directory.'
+)
+@click.option('--port',
+    type = click.IntRange(1, 65535),
+    default = None,
+    help = 'Listen on this localhost TCP port instead of a Unix socket. Needs --root: any local user can connect to it.'
+)
+@click.option('--root',
+    type = click.Path(exists = True, file_okay = False),
+    default = None,
+    help = 'Only read and write the files of requests inside this directory. Required to listen on TCP.'
+)
+@click.option('--quiet', '-q',
+    is_flag = True,
+    help = 'Do not log anything but errors.'
+)
+def serve(socket_path, port, root, quiet):
+    '''
+    Keeps the conversion engine loaded and answers conversion requests sent over a local socket, until interrupted.
+    Requests are JSON objects, one per line, see server.py. `clockwork-client` sends them from the command line.
+    '''
+    import server
+
+    def ready(address):
+        if not quiet:
+            logger().info(f'Listening on {address}. Press Ctrl+C to stop.')
+
+    try:
+        server.serve(socket_path, port, ready, root)
+
+    except (ClockworkError, OSError) as e:
+        logger().error(str(e))
+        exit(1)
+
+
+
+# MAIN
+if __name__ == '__main__':
+    cli()
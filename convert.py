@@ -1,56 +1,257 @@
 # MODULES
-import click
-import pyperclip
+# nothing heavy is imported here: the clipboard and logging are side effects of the CLI, see clockwork.py,
+# and json and xml.etree are only imported by the readers which need them
+# the core API (Convert.parse_*, Convert.to_*, Convert.read/write/convert) never does any I/O and only raises ClockworkErrors.
+from contextlib import contextmanager
 from decimal import *
-from sys import platform
-from zenlog import log
+from io import BytesIO, StringIO
+from mmap import mmap, ACCESS_READ
+import os
+from typing import Iterable, Iterator, NamedTuple, TextIO
 import re
 # local
-from timing import Timing, TimingList, STEP128
+from timing import Timing, Velocity, TimingList, TimingTable, STEP128, FIXED_CONTEXT, ADOFAI_MIDSPIN
+from formats import Format, get_format, format_names
+
+# CONSTANTS
+# built-in formats only: plugins are looked up by the CLI, see formats.py
+IN_FORMATS = format_names('read', installed=False)
+OUT_FORMATS = format_names('write', installed=False)
+
+# STEPMANIA
+# the start of a tag, e.g. "#BPMS:". The value runs until the next ';' and is cut with str.find()
+SM_TAG = re.compile(r'#([A-Za-z0-9]+):')
+SM_TIMING_TAGS = ('OFFSET', 'BPMS', 'STOPS', 'DELAYS', 'WARPS', 'SCROLLS')
+
+# BMS
+# channels holding timings: measure length, BPM (hex), BPM (#BPMxx reference), stop (#STOPxx reference)
+BMS_LENGTH, BMS_BPM, BMS_EXBPM, BMS_STOP = '02', '03', '08', '09'
+# stops are given in 1/192ths of a 4/4 measure
+BMS_STOP_UNIT = 48
+
+# SOUNDODGER 2
+# names of the header file of a level, tried in order next to the level .xml. {stem} is the name of the level file without .xml
+SD2_HEADERS = ('{stem}.header.xml', '{stem}_header.xml', 'header.xml')
+# the label of a bookmark written by Timing.to_sd2(), "time / bpm"
+SD2_LABEL = re.compile(r'^\s*-?[\d.]+\s*/\s*[\d.]+\s*$')
+
+# ADOFAI
+# angles of the letters of pathData, the string used by levels older than angleData
+ADOFAI_PATH = {
+    'R': 0, 'p': 15, 'J': 30, 'E': 45, 'T': 60, 'o': 75, 'U': 90, 'q': 105, 'G': 120, 'Q': 135, 'H': 150, 'W': 165,
+    'L': 180, 'x': 195, 'N': 210, 'Z': 225, 'F': 240, 'V': 255, 'D': 270, 'Y': 285, 'B': 300, 'C': 315, 'M': 330, 'A': 345,
+    '!': ADOFAI_MIDSPIN,
+}
+# the actions which change the timing of a level, every other one is dropped as soon as it is read
+ADOFAI_TIMING_ACTIONS = ('SetSpeed', 'Twirl', 'Pause')
+# the separators before the next action, and the action if it has no nested objects. Only the type of those is looked at:
+# other actions are skipped without being decoded
+ADOFAI_NEXT_ACTION = re.compile(r'[\s,]*(\{[^{}]*\})?')
+ADOFAI_EVENT_TYPE = re.compile(r'"eventType"\s*:\s*"([^"]*)"')
+# ADOFAI writes trailing commas, which json does not accept
+TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+# BYTE MARKERS
+# used on mapped files, to find the timing region before decoding anything
+# the first chart of a .sm/.ssc: the song timing tags are all above it
+SM_CHART = re.compile(rb'#NOTE(?:S2?|DATA):', re.IGNORECASE)
+# the first line of the next top-level .qua key
+QUA_KEY = re.compile(rb'^[^\s#-]', re.MULTILINE)
+# the lines of a .bms holding timings: #BPM, #BPMxx, #EXBPMxx, #STOPxx, and the measure lines of the timing channels
+# not anchored with ^, which is several times slower on big files: matches which do not start a line are dropped afterwards
+BMS_TIMING_LINE = re.compile(rb'#(?:(?:EX)?BPM|STOP|[0-9]{3}0[2389]:)[^\r\n]*', re.IGNORECASE)
+
+
+
+# EXCEPTIONS
+class ClockworkError(Exception):
+    '''Base class of every error raised by clockwork.'''
+
+
+class FormatError(ClockworkError):
+    '''Raised when a file or format is not supported.'''
+
+
+class ParseError(ClockworkError):
+    '''Raised when the timings of a chart cannot be read.'''
+
+
+class MissingFileError(ClockworkError, FileNotFoundError):
+    '''Raised when an input file does not exist.'''
 
 
 
 # UTILS
 def check_format(input_path: str, ext: str | tuple[str, ...]):
     '''
-    Checks the extension of a file. Return True and proceed if the extension matches, exit otherwise.
+    Checks the extension of a file. Return True and proceed if the extension matches, raise a FormatError otherwise.
     
     - input_path: str | the path towards the file
     - ext: str | tuple[str, ...] | the extension(s)
     '''
-    
     if isinstance(ext, str):
-        if not input_path.endswith(f'.{ext}'):
-            log.error(f'The input file format is not .{ext}')
-            exit(1)
+        ext = (ext,)
+
+    for x in ext:
+        if input_path.endswith(f'.{x}'):
+            return True
+
+    raise FormatError(f'The input file format is not .{" / .".join(ext)}')
 
-        return True
 
-    else:
-        for x in ext:
-            if input_path.endswith(f'.{x}'):
-                return True
-        
-        log.error(f'The input file format is not .{x}')
-        exit(1)
+def find_sd2_header(input_path: str) -> str | None:
+    '''
+    Returns the path of the header file of a Soundodger 2 level, or None if there is none, see SD2_HEADERS.
+
+    - input_path: str | the path towards the level .xml file
+    '''
+    directory, name = os.path.split(input_path)
+    stem = name[:-4] if name.endswith('.xml') else name
 
-        
+    for header in SD2_HEADERS:
+        path = os.path.join(directory, header.format(stem=stem))
+        if os.path.isfile(path) and not os.path.samefile(path, input_path):
+            return path
+
+    return None
+
+
+def require_format(name: str, capability: str) -> Format:
+    '''
+    Looks up a format in the registry. Return it and proceed if it exists and has the capability, raise a FormatError otherwise.
+
+    - name: str | the name of the format
+    - capability: str | read, write or inject
+    '''
+    file_format = get_format(name)
+
+    if file_format is None or capability not in file_format.capabilities:
+        if capability == 'inject':
+            raise FormatError(f'Cannot inject timings into "{name}" charts.')
+        raise FormatError(f'Cannot convert timings {"from" if capability == "read" else "to"} "{name}".')
+
+    return file_format
+
+
+def check_timings(timings: list[Timing] | TimingTable):
+    '''
+    Checks that timings can be written. Return True and proceed if there is at least one timing point and every BPM is positive, raise a ParseError otherwise.
+
+    - timings: list[Timing] | TimingTable | a list of Timing instances
+    '''
+    if not len(timings):
+        raise ParseError('The chart has no timing points.')
+
+    # min() runs over the raw column of a TimingTable, a stored BPM is positive when the BPM is
+    bpms = timings.bpms if isinstance(timings, TimingTable) else [t.bpm for t in timings]
+
+    if min(bpms) <= 0:
+        timing = timings[next(i for i, bpm in enumerate(bpms) if bpm <= 0)]
+        raise ParseError(f'The timing point at {timing.offset} ms has a BPM of {timing.bpm}, BPMs must be positive.')
+
+    return True
 
 
 def open_file(input_path: str, mode: str = 'r'):
     '''
-    Tries to open a file. Return the file object and proceed if succeeded, exit otherwise.
+    Tries to open a file. Return the file object and proceed if succeeded, raise a MissingFileError otherwise.
 
     - input_path: str | the path towards the file
     - mode: str | mode in which the file is opened
     '''
     try:
-        f = open(input_path, mode, encoding='utf-8')
+        f = open(input_path, mode, encoding=None if 'b' in mode else 'utf-8')
         return f
     
-    except FileNotFoundError:
-        log.error('File not found.')
-        exit(1)
+    except FileNotFoundError as e:
+        raise MissingFileError(f'File not found: {input_path}') from e
+
+
+@contextmanager
+def map_file(input_path: str):
+    '''
+    Maps a file in memory and yields its content as a read-only buffer, or b'' if it is empty, since empty files cannot be mapped.
+    Slicing the buffer only copies the slice. The file is closed even if the caller raises.
+
+    - input_path: str | the path towards the file
+    '''
+    with open_file(input_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+
+        with mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+            yield data
+
+
+def find_line(data: bytes | mmap, prefix: bytes, start: int = 0) -> int:
+    '''
+    Returns the offset of the first line starting with prefix at or after start, or -1.
+
+    - data: bytes | mmap | the content of the file
+    - prefix: bytes | the start of the line
+    '''
+    if start == 0 and data[:len(prefix)] == prefix:
+        return 0
+
+    position = data.find(b'\n' + prefix, max(start - 1, 0))
+    return -1 if position == -1 else position + 1
+
+
+def decode(content: str | bytes) -> str:
+    '''
+    Returns the text of a chart given as text or bytes. Bytes are decoded as UTF-8, with or without a BOM.
+
+    - content: str | bytes | the content of the chart
+    '''
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return bytes(content).decode('utf-8-sig')
+
+    return content
+
+
+def split_tag(value: str) -> list[str]:
+    '''
+    Splits the value of a Stepmania list tag into its entries, e.g. "0.000=120.000\n,4.000=240.000" -> ['0.000=120.000', '4.000=240.000'].
+
+    - value: str | the value of the tag, without the name and ';'
+    '''
+    return [entry.strip() for entry in value.split(',') if entry.strip()]
+
+
+@contextmanager
+def parsing(file_format: str):
+    '''
+    Turns the errors raised while reading the timings of a chart into ParseErrors.
+
+    - file_format: str | the name of the format, for the error message
+    '''
+    try:
+        yield
+
+    except ClockworkError:
+        raise
+
+    # Decimal and int conversions, missing fields and tags, undecodable bytes, and values of the wrong type in structured documents
+    except (ArithmeticError, AttributeError, LookupError, TypeError, ValueError) as e:
+        raise ParseError(f'Could not read the {file_format} timings ({type(e).__name__}: {e})') from e
+
+
+
+# CONVERSION RESULT
+class Conversion(NamedTuple):
+    '''
+    The result of Convert.convert().
+
+    - timings: list[Timing] | TimingTable | the timing points read from the input
+    - output: str | the converted snippet
+    - in_format: str | the format the timings were converted from
+    - out_format: str | the format the timings were converted to
+    '''
+    timings: list[Timing] | TimingTable
+    output: str
+    in_format: str
+    out_format: str
 
 
 
@@ -60,203 +261,1005 @@ class Convert:
     ### OSU ###
 
     @staticmethod
-    def from_osu(input_path: str) -> list[Timing]:
+    def from_osu(input_path: str, table: TimingTable | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
         '''
         Takes in a .osu file and generates a list of Timing points accordingly.
 
         - input_path: str | the path towards the .osu file
 
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - velocities: list | if given, the inherited timing points are appended to it as Velocity instances
+
         Please read the osu! documentation for more info: [https://osu.ppy.sh/wiki/en/Client/File_formats/osu_(file_format)]
         '''
+        return Convert.parse_osu(Convert._extract_osu(input_path), table, velocities)
+
+
+    @staticmethod
+    def _extract_osu(input_path: str) -> bytes:
+        '''
+        Returns the [TimingPoints] section of a .osu file, undecoded. Only that section is copied out of the mapped file.
+        '''
         check_format(input_path, 'osu')
-        f = open_file(input_path)
-
-        osu_content = f.read().split('\n\n')
-        osu_timing_points = []
-        osu_uninherited = []
-        timing_list = []
-
-        # extract [TimingPoints]
-        for section in osu_content:
-            if section.startswith('[TimingPoints]'):
-                osu_timing_points = section.split('\n')[1:]
-                break
-        
-        # extract uninherited
-        for timing in osu_timing_points:
-            # check uninherited flag
-            if timing.split(',')[-2] == '1': 
-                osu_uninherited.append(timing)
-
-        # convert to Timing instances
-        for timing in osu_uninherited:
-            timing_list.append(Timing.from_osu(timing))
-
-        f.close()
+
+        with map_file(input_path) as data:
+            start = find_line(data, b'[TimingPoints]')
+            if start == -1:
+                return b''
+
+            end = data.find(b'\n[', start)
+            return data[start:len(data) if end == -1 else end]
+
+
+    @staticmethod
+    def parse_osu(content: str | bytes, table: TimingTable | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a .osu file and generates a list of Timing points accordingly.
+
+        - content: str | bytes | the content of the .osu file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - velocities: list | if given, the inherited timing points are appended to it as Velocity instances
+        '''
+        with parsing('.osu'):
+            return Convert._read_osu(StringIO(decode(content)), table, velocities)
+
+
+    @staticmethod
+    def _read_osu(lines: Iterable[str], table: TimingTable | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Reads the uninherited timing points of a .osu file, given line by line, and the inherited ones if velocities is given.
+        osu! resets the velocity at every uninherited point, while a Velocity holds until the next one: a 1x Velocity is added where a reset
+        changes the velocity, unless an inherited point sits at the same offset.
+        '''
+        timing_list = [] if table is None else table
+        in_section = False
+        # the current multiplier, and the offset of a reset which is only added once the next inherited point is known
+        multiplier = Decimal(1)
+        reset = None
+
+        # stream line by line: only [TimingPoints] is kept, and the file is left as soon as the section ends
+        with parsing('.osu'):
+            for line in lines:
+                line = line.rstrip('\r\n')
+
+                if not in_section:
+                    in_section = line.startswith('[TimingPoints]')
+                    continue
+
+                # next section
+                if line.startswith('['):
+                    break
+
+                # blank lines and comments
+                if not line.strip() or line.startswith('//'):
+                    continue
+
+                timing_data = line.split(',')
+                # check uninherited flag (defaults to 1 in older file format versions)
+                if len(timing_data) < 7 or timing_data[6] == '1':
+                    timing_list.append(Timing.from_osu(timing_data))
+
+                    if velocities is not None and multiplier != 1:
+                        offset = Decimal(timing_data[0])
+                        if not velocities or velocities[-1].offset != offset:
+                            reset, multiplier = offset, Decimal(1)
+
+                elif velocities is not None:
+                    velocity = Velocity.from_osu(timing_data)
+
+                    if reset is not None and reset != velocity.offset:
+                        velocities.append(Velocity(reset, Decimal(1)))
+                    reset = None
+
+                    velocities.append(velocity)
+                    multiplier = velocity.multiplier
+
+            if reset is not None:
+                velocities.append(Velocity(reset, Decimal(1)))
+
         return timing_list
 
 
     @staticmethod
-    def to_osu(timings: list[Timing], volume: int = 80, sample_set: int=0, sample_index: int=0) -> str:
+    def iter_osu(timings: list[Timing] | TimingTable, volume: int = 80, sample_set: int=0, sample_index: int=0, velocities: list | None = None) -> Iterator[str]:
         '''
-        Takes a list of Timing instances and generates a .osu snippet with the corresponding bookmarks.
+        Takes a list of Timing instances and yields the lines of a .osu snippet with the corresponding bookmarks.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
 
-        - timings: list[Timings] | a list of Timing instances
+        OPTIONAL ARGS:
+        - velocities: list[Velocity] | if given, written as inherited timing points, merged with the uninherited ones in offset order
         '''
-        res = '[TimingPoints]\n'
+        yield '[TimingPoints]\n'
 
-        # normalize
-        if volume >= 100: volume_n = 100
-        else: volume_n = volume
+        if not velocities:
+            for t in timings:
+                yield t.to_osu(volume, sample_set, sample_index) + '\n'
+            return
 
-        for t in timings:
-            res += t.to_osu(volume, sample_set, sample_index) + '\n'
+        # osu! resets the velocity at every uninherited point: the current one is written again right after it, unless a velocity starts there
+        multiplier = Decimal(1)
+        meter = 4
+        reset = None
+        restore = None
+
+        for point in TimingList.interleave(timings, velocities):
+            if restore is not None and not (isinstance(point, Velocity) and point.offset == restore):
+                yield Velocity(restore, multiplier).to_osu(meter, volume, sample_set, sample_index) + '\n'
+            restore = None
 
-        log.info('Successfully converted!')
+            if isinstance(point, Velocity):
+                multiplier = point.multiplier
+                # a 1x velocity on an uninherited point is the reset itself
+                if point.offset != reset or multiplier != 1:
+                    yield point.to_osu(meter, volume, sample_set, sample_index) + '\n'
 
-        pyperclip.copy(res)
-        log.info('[TimingPoints] copied to clipboard.')
-        log.info('You can paste it directly into your .osu, right after the [Events] section.')
-        log.info('Be careful to remove the previous [TimingPoints] section.')
+            else:
+                meter = point.meter[0]
+                reset = point.offset
+                yield point.to_osu(volume, sample_set, sample_index) + '\n'
+                if multiplier != 1:
+                    restore = point.offset
 
-        return res
+        if restore is not None:
+            yield Velocity(restore, multiplier).to_osu(meter, volume, sample_set, sample_index) + '\n'
+
+
+    @staticmethod
+    def to_osu(timings: list[Timing] | TimingTable, volume: int = 80, sample_set: int=0, sample_index: int=0, velocities: list | None = None) -> str:
+        '''
+        Takes a list of Timing instances and generates a .osu snippet with the corresponding bookmarks.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - velocities: list[Velocity] | see Convert.iter_osu()
+        '''
+        return ''.join(Convert.iter_osu(timings, volume, sample_set, sample_index, velocities))
 
 
     ### SOUNDODGER 2 ###
 
     @staticmethod
-    def to_sd2(timings: list[Timing], practice: bool = False) -> str:
+    def from_sd2(input_path: str, table: TimingTable | None = None) -> list[Timing] | TimingTable:
         '''
-        Takes in a list of Timing instances and generates a soundodger 2 .xml snippet with the corresponding bookmarks.
+        Takes in a soundodger 2 level .xml file and generates a list of Timing points accordingly,
+        from the timing of its header file (see find_sd2_header()) and the bookmarks written by Convert.to_sd2().
 
-        - timings: list[Timings] | a list of Timing instances
+        - input_path: str | the path towards the level .xml file
 
         OPTIONAL ARGS:
-        - practice: bool | whether or not the bookmarks will be practice points
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        '''
+        return Convert.parse_sd2(Convert._extract_sd2(input_path), table)
+
+
+    @staticmethod
+    def _extract_sd2(input_path: str) -> bytes:
+        '''
+        Returns the timing elements of a level and its header file, as a small XML document.
+        Both files are streamed: elements are cleared as soon as they are read, so a level is never held as a whole tree.
+        '''
+        from xml.etree.ElementTree import tostring
+
+        check_format(input_path, 'xml')
+        header = find_sd2_header(input_path)
+        res = [b'<Timings>']
+
+        with parsing('.xml'):
+            for path in ([header] if header else []) + [input_path]:
+                with open_file(path, 'rb') as f:
+                    res += [tostring(element) for element in Convert._iter_sd2(f)]
+
+        res.append(b'</Timings>')
+        return b''.join(res)
+
+
+    @staticmethod
+    def parse_sd2(content: str | bytes, table: TimingTable | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a soundodger 2 .xml file and generates a list of Timing points accordingly.
+        The content of a level alone only holds bookmarks: the timing of its header is read by Convert.from_sd2().
+
+        - content: str | bytes | the content of the .xml file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        '''
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        timing_list = [] if table is None else table
+
+        with parsing('.xml'):
+            # sorted by offset, a bookmark replaces the header timing at the same offset
+            timings = {}
+            for element in Convert._iter_sd2(BytesIO(content)):
+                timing = Timing.from_sd2(element.attrib)
+                timings[timing.offset] = timing
+
+            for offset in sorted(timings):
+                timing_list.append(timings[offset])
+
+        return timing_list
+
+
+    @staticmethod
+    def _iter_sd2(source) -> Iterator:
+        '''
+        Streams a soundodger 2 .xml file and yields its timing elements: the ones with a bpm attribute, and the bookmarks written by Convert.to_sd2().
+        Every element is cleared once read. XML errors are raised as ParseErrors.
+        '''
+        from xml.etree.ElementTree import iterparse, ParseError as XMLError
+
+        try:
+            # the open elements: read elements are removed from their parent, which would keep them otherwise
+            parents = []
+
+            for event, element in iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+
+                if 'bpm' in element.attrib or (element.tag == 'Bookmark' and SD2_LABEL.match(element.get('label', ''))):
+                    element.tail = None
+                    yield element
+
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
+        except XMLError as e:
+            raise ParseError(f'Could not read the .xml timings ({e})') from e
+
+
+    @staticmethod
+    def iter_sd2(timings: list[Timing] | TimingTable, practice: bool = False) -> Iterator[str]:
         '''
-        res = ''
+        Takes in a list of Timing instances and yields the lines of a soundodger 2 .xml snippet with the corresponding bookmarks.
 
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - practice: bool | whether or not the bookmarks will be practice points
+        '''
         for t in timings:
-            res += t.to_sd2(practice) + '\n'
+            yield t.to_sd2(practice) + '\n'
+
 
-        log.info('Successfully converted!')
-        
-        pyperclip.copy(res)
-        log.info('Bookmarks copied to clipboard.')
-        log.info('You can paste them directly into your .xml, right after the "<Editor ... />" element.')
+    @staticmethod
+    def to_sd2(timings: list[Timing] | TimingTable, practice: bool = False) -> str:
+        '''
+        Takes in a list of Timing instances and generates a soundodger 2 .xml snippet with the corresponding bookmarks.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
 
-        return res
+        OPTIONAL ARGS:
+        - practice: bool | whether or not the bookmarks will be practice points
+        '''
+        return ''.join(Convert.iter_sd2(timings, practice))
 
     
     ### STEPMANIA ###
 
     @staticmethod
-    def from_stepmania(input_path: str) -> list[Timing]:
+    def from_stepmania(input_path: str, table: TimingTable | None = None, backend: str | None = None, chart: int | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
         '''
         Takes in a .sm or .ssc file and generates a list of Timing points accordingly.
-        Works with .sm and .ssc formats.
-        NOTE: Only #BPMS is supported at the moment. #STOPS will be implemented in the future.
+        Works with .sm and .ssc formats. #BPMS, #STOPS, #DELAYS and #WARPS are read, and #SCROLLS with velocities.
 
         - input_path: str | the path towards the .sm/.ssc file
 
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend, see TimingList.from_stepmania()
+        - chart: int | .ssc only: the index of a chart whose own timing tags are used instead of the song ones
+        - velocities: list | if given, the #SCROLLS entries are appended to it as Velocity instances
+
         Please read the Stepmania documentation for more info: 
         [https://github.com/stepmania/stepmania/wiki/sm]
         [https://github.com/stepmania/stepmania/wiki/ssc]
         '''
+        return Convert.parse_stepmania(Convert._extract_stepmania(input_path, chart), table, backend, chart, velocities)
+
+
+    @staticmethod
+    def _extract_stepmania(input_path: str, chart: int | None = None) -> bytes:
+        '''
+        Returns the header of a .sm/.ssc file, up to its first chart, undecoded. The whole file is returned if the timing of a chart is needed.
+        '''
         check_format(input_path, ('sm', 'ssc'))
-        f = open_file(input_path)
 
-        sm_content = f.read()
-        
-        # offset
-        try:
-            offset_rawstr = re.findall('#OFFSET:.*;', sm_content)[0]        # extract raw tag
-            offset_split = re.split('[,;:]', offset_rawstr)                 # split tag
-            offset = [x for x in offset_split if x][1]                      # extract relevant items
-        except:
-            offset = '0.000000'
-
-        #bpm
-        bpm_rawstr = re.findall('#BPMS:[^;]*;', sm_content, re.DOTALL)[0]   # extract raw tag
-        bpm_split = re.split('[,;:\s]', bpm_rawstr)                         # split tag
-        bpm = [x for x in bpm_split if x][1:]                               # extract relevant items
-        
-        f.close()
-        return TimingList.from_stepmania(float(offset), bpm)
+        with map_file(input_path) as data:
+            first_chart = SM_CHART.search(data)
+            return data[:] if chart is not None or first_chart is None else data[:first_chart.start()]
+
+
+    @staticmethod
+    def parse_stepmania(content: str | bytes, table: TimingTable | None = None, backend: str | None = None, chart: int | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a .sm or .ssc file and generates a list of Timing points accordingly.
+
+        - content: str | bytes | the content of the .sm/.ssc file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend, see TimingList.from_stepmania()
+        - chart: int | .ssc only: the index of a chart whose own timing tags are used instead of the song ones
+        - velocities: list | if given, the #SCROLLS entries are appended to it as Velocity instances
+        '''
+        with parsing('.sm/.ssc'):
+            return Convert._read_stepmania(decode(content), table, backend, chart, velocities)
+
+
+    @staticmethod
+    def _read_stepmania(sm_content: str, table: TimingTable | None = None, backend: str | None = None, chart: int | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Reads the timing tags of a .sm/.ssc file.
+        '''
+        song_tags, chart_tags = Convert._scan_stepmania(sm_content)
+        tags = song_tags
+
+        # like Stepmania, a chart with its own timing does not inherit the song timing, except for the offset
+        if chart is not None and chart_tags[chart]:
+            tags = {'OFFSET': song_tags.get('OFFSET', ''), **chart_tags[chart]}
+
+        offset = tags.get('OFFSET', '').strip() or '0.000000'
+        # scrolls are only timed when they are asked for: they keep the numpy engine from being used
+        scrolls = split_tag(tags.get('SCROLLS', '')) if velocities is not None else []
+
+        return TimingList.from_stepmania(
+            float(offset), split_tag(tags['BPMS']), table, backend,
+            split_tag(tags.get('STOPS', '')), split_tag(tags.get('DELAYS', '')), split_tag(tags.get('WARPS', '')), scrolls, velocities
+        )
+
+
+    @staticmethod
+    def _scan_stepmania(sm_content: str) -> tuple[dict[str, str], list[dict[str, str]]]:
+        '''
+        Collects the timing tags of a .sm/.ssc file in a single pass. Returns the song tags, then the tags of every .ssc chart.
+        The #NOTES blocks are jumped over: a .sm stops at the first one, since its timing is all in the header.
+        Only the first occurrence of a tag counts.
+        '''
+        song_tags = {}
+        chart_tags = []
+        tags = song_tags
+        position = 0
+
+        while (match := SM_TAG.search(sm_content, position)):
+            name = match.group(1).upper()
+            end = sm_content.find(';', match.end())
+            if end == -1:
+                end = len(sm_content)
+
+            # .ssc: the tags that follow belong to a chart
+            if name == 'NOTEDATA':
+                tags = {}
+                chart_tags.append(tags)
+
+            elif name in ('NOTES', 'NOTES2'):
+                if not chart_tags:
+                    break
+
+            elif name in SM_TIMING_TAGS:
+                tags.setdefault(name, sm_content[match.end():end])
+
+            position = end + 1
+
+        return song_tags, chart_tags
     
 
     @staticmethod
-    def to_stepmania(timings: list[Timing], step: Decimal = STEP128) -> str:
+    def iter_stepmania(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None, velocities: list | None = None) -> Iterator[str]:
+        '''
+        Takes a list of Timing instances and yields the pieces of a .sm/.ssc snippet with the corresponding bookmarks: the #OFFSET tag, then the #BPMS tag one timing point at a time.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - step: Decimal | the step of the beat offset quantization
+        - backend: str | the numeric backend, see TimingList.to_stepmania()
+        - velocities: list[Velocity] | if given, a #SCROLLS tag follows, see TimingList.iter_scrolls()
+        '''
+        return TimingList.iter_stepmania(timings, step, backend, velocities)
+
+
+    @staticmethod
+    def to_stepmania(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None, velocities: list | None = None) -> str:
         '''
         Takes a list of Timing instances and generates a .sm/.ssc snippet with the corresponding bookmarks.
 
-        - timings: list[Timings] | a list of Timing instances
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - step: Decimal | the step of the beat offset quantization
+        - backend: str | the numeric backend, see TimingList.to_stepmania()
+        - velocities: list[Velocity] | see Convert.iter_stepmania()
 
         Please read the Stepmania documentation for more info: 
         [https://github.com/stepmania/stepmania/wiki/sm]
         [https://github.com/stepmania/stepmania/wiki/ssc]
         '''
-        content = TimingList.to_stepmania(timings, step)
-        res = f'{content[1]}\n{content[0]}'
-        
-        log.info('Successfully converted!')
-        
-        pyperclip.copy(res)
-        log.info('Tags copied to clipboard.')
-        log.info('You can paste them directly into your .sm/.ssc, right at the end of the first section.')
-        log.info('Be careful to remove the previous tags.')
-
-        return res
+        return ''.join(Convert.iter_stepmania(timings, step, backend, velocities))
 
     
+    ### BMS ###
+    # supports .bms, .bme, .bml and .pms
+
+    @staticmethod
+    def from_bms(input_path: str, table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes in a .bms file (or .bme, .bml, .pms) and generates a list of Timing points accordingly.
+
+        - input_path: str | the path towards the .bms file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend, see TimingList.from_stepmania()
+
+        Please read the BMS command memo for more info: [https://hitkey.nekokan.dyndns.info/cmds.htm]
+        '''
+        return Convert.parse_bms(Convert._extract_bms(input_path), table, backend)
+
+
+    @staticmethod
+    def _extract_bms(input_path: str) -> bytes:
+        '''
+        Returns the timing lines of a .bms file, undecoded. They are spread across the whole file, so the mapped file is scanned once
+        and only those lines are copied out: note and BGM channels are never decoded nor allocated.
+        '''
+        check_format(input_path, ('bms', 'bme', 'bml', 'pms'))
+
+        with map_file(input_path) as data:
+            return b'\n'.join(
+                match.group() for match in BMS_TIMING_LINE.finditer(data)
+                if not data[data.rfind(b'\n', 0, match.start()) + 1:match.start()].strip()
+            )
+
+
+    @staticmethod
+    def parse_bms(content: str | bytes, table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a .bms file and generates a list of Timing points accordingly.
+
+        - content: str | bytes | the content of the .bms file, or only its timing lines
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend, see TimingList.from_stepmania()
+        '''
+        with parsing('.bms'):
+            return Convert._read_bms(StringIO(decode(content)), table, backend)
+
+
+    @staticmethod
+    def _read_bms(lines: Iterable[str], table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Reads the timings of a .bms file, given line by line, and converts them like Stepmania beats.
+        Measure lines of the timing channels are indexed by measure, every other channel is skipped.
+        #RANDOM blocks are not evaluated: the timing lines of every branch are read.
+        '''
+        bpm = '130'
+        bpm_definitions = {}
+        stop_definitions = {}
+        lengths = {}
+        # measure -> [(channel, data)]
+        measures = {}
+
+        with parsing('.bms'):
+            for line in lines:
+                line = line.strip()
+
+                if not line.startswith('#'):
+                    continue
+
+                # measure line, "#mmmcc:data"
+                if line[1:4].isdigit() and line[6:7] == ':':
+                    channel = line[4:6]
+
+                    if channel == BMS_LENGTH:
+                        lengths[int(line[1:4])] = Decimal(line[7:].strip())
+                    elif channel in (BMS_BPM, BMS_EXBPM, BMS_STOP):
+                        measures.setdefault(int(line[1:4]), []).append((channel, line[7:].strip().upper()))
+                    continue
+
+                # headers, "#NAME value"
+                name, _, value = line[1:].replace('\t', ' ').partition(' ')
+                name = name.upper()
+
+                if name == 'BPM':
+                    bpm = value.strip()
+                elif name.startswith('BPM') and len(name) == 5:
+                    bpm_definitions[name[3:]] = Decimal(value)
+                elif name.startswith('EXBPM') and len(name) == 7:
+                    bpm_definitions[name[5:]] = Decimal(value)
+                elif name.startswith('STOP') and len(name) == 6:
+                    stop_definitions[name[4:]] = Decimal(value)
+
+            sm_timings = [f'0={bpm}']
+            bpm_changes = []
+            stops = []
+
+            with localcontext(FIXED_CONTEXT):
+                # beat of the start of the current measure, measures are 4 beats long unless #xxx02 says otherwise
+                measure_start = Decimal(0)
+
+                for measure in range(max(measures, default=-1) + 1):
+                    measure_beats = 4 * lengths.get(measure, Decimal(1))
+
+                    for channel, data in measures.get(measure, ()):
+                        count = len(data) // 2
+
+                        for i in range(count):
+                            key = data[2 * i:2 * i + 2]
+                            if key == '00':
+                                continue
+
+                            beat = measure_start + measure_beats * i / count
+
+                            if channel == BMS_BPM:
+                                bpm_changes.append((beat, 0, Decimal(int(key, 16))))
+                            elif channel == BMS_EXBPM:
+                                bpm_changes.append((beat, 1, bpm_definitions[key]))
+                            else:
+                                stops.append((beat, stop_definitions[key]))
+
+                    measure_start += measure_beats
+
+                # at the same beat, #xxx08 wins over #xxx03
+                bpm_changes.sort(key = lambda change: change[:2])
+                sm_timings += [f'{beat}={value}' for beat, _, value in bpm_changes]
+
+                # stops last a number of beats, turn them into seconds with the BPM they start on
+                stop_entries = []
+                current = 0
+                bpm_at = Decimal(bpm)
+
+                for beat, length in sorted(stops, key = lambda stop: stop[0]):
+                    while current < len(bpm_changes) and bpm_changes[current][0] <= beat:
+                        bpm_at = bpm_changes[current][2]
+                        current += 1
+
+                    stop_entries.append(f'{beat}={length / BMS_STOP_UNIT * 60 / bpm_at}')
+
+            return TimingList.from_stepmania(0, sm_timings, table, backend, stop_entries)
+
+
+    ### ADOFAI ###
+
+    @staticmethod
+    def from_adofai(input_path: str, table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes in a .adofai file and generates a list of Timing points accordingly.
+
+        - input_path: str | the path towards the .adofai file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend, see TimingList.from_adofai()
+
+        Please read the ADOFAI wiki for more info: [https://adofai.fandom.com/wiki/Level_editor]
+        '''
+        return Convert.parse_adofai(Convert._extract_adofai(input_path), table, backend)
+
+
+    @staticmethod
+    def _extract_adofai(input_path: str) -> bytes:
+        '''
+        Returns a .adofai file up to its decorations, undecoded. Decorations come after the actions and hold no timings.
+        '''
+        check_format(input_path, 'adofai')
+
+        with map_file(input_path) as data:
+            actions = data.find(b'"actions"')
+            end = -1 if actions == -1 else data.find(b'"decorations"', actions)
+            return data[:len(data) if end == -1 else end]
+
+
+    @staticmethod
+    def parse_adofai(content: str | bytes, table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a .adofai file and generates a list of Timing points accordingly.
+
+        - content: str | bytes | the content of the .adofai file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend, see TimingList.from_adofai()
+        '''
+        with parsing('.adofai'):
+            return Convert._read_adofai(decode(content), table, backend)
+
+
+    @staticmethod
+    def _read_adofai(adofai_content: str, table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Reads the path, settings and timing actions of a .adofai file.
+        The document is never loaded as a whole: each value is decoded on its own where its key is found,
+        and the actions array one action at a time. Numbers are read as Decimals.
+        '''
+        from json import JSONDecoder, JSONDecodeError
+
+        decoder = JSONDecoder(parse_float=Decimal, parse_int=Decimal)
+        text = adofai_content
+
+        def find_value(key: str) -> int:
+            # position of the value of a key, or -1
+            position = text.find(f'"{key}"')
+            if position == -1:
+                return -1
+
+            position = text.index(':', position + len(key) + 2) + 1
+            while text[position].isspace():
+                position += 1
+            return position
+
+        def decode_at(position: int):
+            # the value starting at position, and the position right after it
+            nonlocal text
+            try:
+                return decoder.raw_decode(text, position)
+            except JSONDecodeError:
+                # only cleaned up when needed, from the value on
+                text = text[:position] + TRAILING_COMMA.sub(r'\1', text[position:])
+                return decoder.raw_decode(text, position)
+
+        with parsing('.adofai'):
+            if (position := find_value('angleData')) != -1:
+                angles = decode_at(position)[0]
+                if not isinstance(angles, list) or not all(isinstance(angle, Decimal) for angle in angles):
+                    raise ParseError('The angleData of the .adofai file must be a list of numbers.')
+            elif (position := find_value('pathData')) != -1:
+                path = decode_at(position)[0]
+                if not isinstance(path, str):
+                    raise ParseError('The pathData of the .adofai file must be a string.')
+                angles = [Decimal(ADOFAI_PATH[letter]) for letter in path]
+            else:
+                raise ParseError('Could not find the angleData or pathData of the .adofai file.')
+
+            settings = {} if (position := find_value('settings')) == -1 else decode_at(position)[0]
+            if not isinstance(settings, dict):
+                raise ParseError('The settings of the .adofai file must be an object.')
+
+            bpm = settings.get('bpm', Decimal(100))
+            offset = settings.get('offset', Decimal(0))
+            if not isinstance(bpm, Decimal) or not isinstance(offset, Decimal):
+                raise ParseError('The bpm and offset settings of the .adofai file must be numbers.')
+
+            # stream the actions array
+            actions = []
+            position = find_value('actions')
+
+            if position != -1 and text[position] == '[':
+                position += 1
+
+                while True:
+                    following = ADOFAI_NEXT_ACTION.match(text, position)
+                    position = following.start(1) if following.group(1) else following.end()
+                    if text[position] == ']':
+                        break
+
+                    # a brace inside a string would cut the match in the middle of it, leaving an odd number of quotes
+                    flat = following.group(1)
+                    if flat and '\\' not in flat and flat.count('"') % 2 == 0:
+                        event_type = ADOFAI_EVENT_TYPE.search(flat)
+                        if event_type and event_type.group(1) not in ADOFAI_TIMING_ACTIONS:
+                            position = following.end()
+                            continue
+
+                    action, position = decode_at(position)
+                    if not isinstance(action, dict):
+                        raise ParseError('The actions of the .adofai file must be objects.')
+                    if action.get('eventType') in ADOFAI_TIMING_ACTIONS:
+                        actions.append(action)
+
+            # SetSpeed multipliers apply to the BPM of the previous floors
+            actions.sort(key = lambda action: int(action['floor']))
+            speeds = []
+            current = bpm
+
+            for action in actions:
+                if action['eventType'] == 'SetSpeed':
+                    if action.get('speedType', 'Bpm') == 'Multiplier':
+                        current = current * action['bpmMultiplier']
+                    else:
+                        current = action['beatsPerMinute']
+                    speeds.append((int(action['floor']), current))
+
+            return TimingList.from_adofai(
+                offset / 1000, bpm, angles, speeds,
+                [int(action['floor']) for action in actions if action['eventType'] == 'Twirl'],
+                [(int(action['floor']), action.get('duration', Decimal(1))) for action in actions if action['eventType'] == 'Pause'],
+                table, backend
+            )
+
+
+    @staticmethod
+    def iter_adofai(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None) -> Iterator[str]:
+        '''
+        Takes a list of Timing instances and yields the pieces of a minimal .adofai level following them.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - step: Decimal | the step of the beat quantization
+        - backend: str | the numeric backend, see TimingList.iter_adofai()
+        '''
+        return TimingList.iter_adofai(timings, step, backend)
+
+
+    @staticmethod
+    def to_adofai(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None) -> str:
+        '''
+        Takes a list of Timing instances and generates a minimal .adofai level following them.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - step: Decimal | the step of the beat quantization
+        - backend: str | the numeric backend, see TimingList.iter_adofai()
+        '''
+        return ''.join(Convert.iter_adofai(timings, step, backend))
+
+
     ### QUAVER ###
     @staticmethod
-    def from_quaver(input_path: str) -> list[Timing]:
+    def from_quaver(input_path: str, table: TimingTable | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
         '''
         Takes a .qua file and returns a list of Timings accordingly.
 
         - input_path: str | the path towards the .sm/.ssc file
 
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - velocities: list | if given, the SliderVelocities are appended to it as Velocity instances
+
         Please read the Quaver API source code for more info:
         [https://github.com/Quaver/Quaver.API/blob/master/Quaver.API/Maps/Qua.cs]
         '''
+        return Convert.parse_quaver(Convert._extract_quaver(input_path), table, velocities)
+
+
+    @staticmethod
+    def _extract_quaver(input_path: str) -> bytes:
+        '''
+        Returns the TimingPoints and SliderVelocities lists of a .qua file, undecoded. Only those lists are copied out of the mapped file.
+        '''
         check_format(input_path, 'qua')
-        f = open_file(input_path)
 
-        qua_content = f.read()
+        with map_file(input_path) as data:
+            lists = []
+
+            for key in (b'TimingPoints:', b'SliderVelocities:'):
+                start = find_line(data, key)
+                if start == -1:
+                    continue
+
+                header_end = data.find(b'\n', start)
+                end = None if header_end == -1 else QUA_KEY.search(data, header_end + 1)
+                lists.append((start, len(data) if end is None else end.start()))
+
+            return b'\n'.join(data[start:end] for start, end in sorted(lists))
+
+
+    @staticmethod
+    def parse_quaver(content: str | bytes, table: TimingTable | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a .qua file and returns a list of Timings accordingly.
+
+        - content: str | bytes | the content of the .qua file
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - velocities: list | if given, the SliderVelocities are appended to it as Velocity instances
+        '''
+        with parsing('.qua'):
+            return Convert._read_quaver(StringIO(decode(content)), table, velocities)
 
-        timings_rawstr = re.findall('TimingPoints.*SliderVelocities', qua_content, re.DOTALL)[0]        # extract raw string
-        timings_rawstr = re.sub('TimingPoints:\n', '', timings_rawstr)                                  # remove unnecessary info
-        timings_rawstr = re.sub('SliderVelocities', '', timings_rawstr)                                 # remove unnecessary info
-        timings_split = timings_rawstr.split('- ')[1:]
-        
-        f.close()
-        return [Timing.from_quaver(t) for t in timings_split]
+
+    @staticmethod
+    def _read_quaver(lines: Iterable[str], table: TimingTable | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Reads the TimingPoints of a .qua file, given line by line, and its SliderVelocities if velocities is given.
+        Only the YAML subset written by Quaver is understood: top-level keys holding a list of flat mappings, in any key order.
+        '''
+        timing_list = [] if table is None else table
+        # the lists still to read: the list their entries are appended to, and the constructor of an entry
+        remaining = {'TimingPoints:': (timing_list, Timing.from_quaver)}
+        if velocities is not None:
+            remaining['SliderVelocities:'] = (velocities, Velocity.from_quaver)
+
+        section = None
+        point = None
+
+        # stream line by line: only the lists are kept, and the file is left as soon as the key after the last one starts
+        with parsing('.qua'):
+            for line in lines:
+                stripped = line.strip()
+
+                # blank lines and comments
+                if not stripped or stripped.startswith('#'):
+                    continue
+
+                # next top-level key. The lists may or may not be indented
+                if line[0] not in ' -':
+                    if point is not None:
+                        section[0].append(section[1](point))
+                        point = None
+
+                    key = next((key for key in remaining if line.startswith(key)), None)
+                    section = None if key is None else remaining.pop(key)
+
+                    # "TimingPoints: []"
+                    if section is not None and stripped[len(key):].strip() == '[]':
+                        section = None
+                    if section is None and not remaining:
+                        break
+                    continue
+
+                if section is None:
+                    continue
+
+                # next entry
+                if stripped.startswith('-'):
+                    if point is not None:
+                        section[0].append(section[1](point))
+                    point = {}
+                    stripped = stripped[1:].lstrip()
+
+                    # "- {}" or a bare "-"
+                    if not stripped or stripped == '{}':
+                        continue
+
+                key, _, value = stripped.partition(':')
+                point[key.rstrip()] = value.strip()
+
+            if point is not None:
+                section[0].append(section[1](point))
+
+        return timing_list
 
     
     @staticmethod
-    def to_quaver(timings: list[Timing]) -> str:
+    def iter_quaver(timings: list[Timing] | TimingTable, velocities: list | None = None) -> Iterator[str]:
+        '''
+        Takes a list of Timing instances and yields the entries of a .qua snippet with the corresponding bookmarks.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - velocities: list[Velocity] | if given, a SliderVelocities list follows the timing points, which then come under their own TimingPoints key
+        '''
+        # without a key, the velocities would be read as timing points
+        if velocities:
+            yield 'TimingPoints:\n'
+
+        for t in timings:
+            yield t.to_quaver()
+
+        if velocities:
+            yield 'SliderVelocities:\n'
+
+            for v in velocities:
+                yield v.to_quaver()
+
+
+    @staticmethod
+    def to_quaver(timings: list[Timing] | TimingTable, velocities: list | None = None) -> str:
         '''
         Takes a list of Timing instances and generates a .qua snippet with the corresponding bookmarks.
 
-        - timings: list[Timings] | a list of Timing instances
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - velocities: list[Velocity] | see Convert.iter_quaver()
 
         Please read the Quaver API source code for more info:
         [https://github.com/Quaver/Quaver.API/blob/master/Quaver.API/Maps/Qua.cs]
         '''
-        res = ''
+        return ''.join(Convert.iter_quaver(timings, velocities))
+
+
+    ### ANY FORMAT ###
+
+    @staticmethod
+    def extract(input_path: str, in_format: str) -> bytes:
+        '''
+        Returns the part of a chart file which holds its timings, undecoded. Convert.read() turns it into Timing points:
+        Convert.read(Convert.extract(path, in_format), in_format) is the same as Convert.from_*(path).
+
+        - input_path: str | the path towards the file
+        - in_format: str | the format of the file, see formats.py
+        '''
+        return require_format(in_format, 'read').load('extract')(input_path)
+
+
+    @staticmethod
+    def read(content: str | bytes, in_format: str, table: TimingTable | None = None, backend: str | None = None, velocities: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the content of a chart and generates a list of Timing points accordingly. Does not do any I/O.
+
+        - content: str | bytes | the content of the chart
+        - in_format: str | the format to convert timings from (osu, stepmania, quaver...)
+
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | the numeric backend used by formats which use beats instead of offsets
+        - velocities: list | if given, the scroll velocities of formats which have them are appended to it as Velocity instances, sorted by offset
+        '''
+        return require_format(in_format, 'read').call('parse', content, table=table, backend=backend, velocities=velocities)
+
+
+    @staticmethod
+    def emit(timings: list[Timing] | TimingTable, out_format: str, practice: bool = False, volume: int = 80, sample_set: int = 0, sample_index: int = 0, step: Decimal = STEP128, backend: str | None = None, velocities: list | None = None) -> Iterator[str]:
+        '''
+        Takes a list of Timing instances and yields a snippet in the given format, piece by piece. Does not do any I/O.
+        The format and the timings are checked right away, not on the first piece, see check_timings().
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+        - out_format: str | the format to convert timings to (osu, sd2, stepmania, quaver...)
+
+        OPTIONAL ARGS:
+        Passed to the emit function of the format (Convert.iter_* for built-in ones), the others are ignored.
+        '''
+        file_format = require_format(out_format, 'write')
+        check_timings(timings)
+
+        return file_format.call('emit', timings, practice=practice, volume=volume, sample_set=sample_set,
+                                sample_index=sample_index, step=step, backend=backend, velocities=velocities)
+
+
+    @staticmethod
+    def write(timings: list[Timing] | TimingTable, out_format: str, practice: bool = False, volume: int = 80, sample_set: int = 0, sample_index: int = 0, step: Decimal = STEP128, backend: str | None = None, velocities: list | None = None) -> str:
+        '''
+        Takes a list of Timing instances and generates a snippet in the given format. Does not do any I/O.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+        - out_format: str | the format to convert timings to (osu, sd2, stepmania, quaver...)
+
+        OPTIONAL ARGS:
+        See Convert.emit().
+        '''
+        return ''.join(Convert.emit(timings, out_format, practice, volume, sample_set, sample_index, step, backend, velocities))
+
+
+    @staticmethod
+    def dump(timings: list[Timing] | TimingTable, out_format: str, stream: TextIO, **options):
+        '''
+        Takes a list of Timing instances and writes a snippet in the given format to a stream, without ever holding the whole snippet in memory.
+
+        - timings: list[Timings] | TimingTable | a list of Timing instances
+        - out_format: str | the format to convert timings to (osu, sd2, stepmania, quaver...)
+        - stream: TextIO | any writable text stream: an open file, sys.stdout, socket.makefile('w')...
+
+        OPTIONAL ARGS:
+        See Convert.emit().
+        '''
+        stream.writelines(Convert.emit(timings, out_format, **options))
 
-        for t in timings:
-            res += t.to_quaver()
 
-        log.info('Successfully converted!')
-        
-        pyperclip.copy(res)
-        log.info('Timings copied to clipboard.')
-        log.info('You can paste them directly into your .qua, right after the "SoundEffects: ..." element.')
-        log.info('Be careful to remove the previous timings.')
+    @staticmethod
+    def convert(content: str | bytes, in_format: str, out_format: str, **options) -> Conversion:
+        '''
+        Converts the timings of a chart from one format to another. Does not do any I/O, and only raises ClockworkErrors.
+
+        - content: str | bytes | the content of the chart
+        - in_format: str | the format to convert timings from
+        - out_format: str | the format to convert timings to
+
+        OPTIONAL ARGS:
+        See Convert.write(). The backend is also used to read the timings.
+        '''
+        require_format(in_format, 'read')
+        require_format(out_format, 'write')
 
-        return res
+        timings = Convert.read(content, in_format, backend=options.get('backend'))
+        return Conversion(timings, Convert.write(timings, out_format, **options), in_format, out_format)
 
 
 
@@ -0,0 +1,175 @@
+# MODULES
+# fits timing points to unsynced charts, see `clockwork fit`: piecewise-constant BPMs are found from the onsets (note times) alone.
+# every onset is assumed to fall on a grid of 1/snap beats. A segment starts with a grid search over one octave of BPMs on its first intervals,
+# is refined by least squares, and runs until the onsets leave its grid: that change point starts the next segment.
+# numpy is required, and only imported when a fit is run.
+import re
+from decimal import Decimal
+from typing import Iterable, Iterator
+# local
+from timing import Timing, TimingList, numpy_available
+from convert import ClockworkError, ParseError, parsing
+from notes import read_lines, read_notes
+
+# CONSTANTS
+# onsets closer than this, in ms, are a single chord
+CHORD_GAP = 2.0
+# intervals used by the grid search of a new segment
+WINDOW = 32
+# onsets in a row which must leave the grid to end a segment, so that a single misplaced note does not split it
+CONFIRM = 4
+# ratio between two BPMs of the grid search, the least squares fit refines the best one
+BPM_RATIO = 1.002
+# refinements of a segment, each one refits it on the onsets which stayed on its grid
+MAX_ITERATIONS = 8
+# onsets looked at past the start of a segment, doubled as long as the segment reaches the end of them
+HORIZON = 4096
+
+# numbers of a plain list of times, separated by whitespace or commas
+TIME = re.compile(r'[^\s,]+')
+
+
+
+# UTILS
+def require_numpy():
+    '''Returns the numpy module. Raise a ClockworkError if it is not installed.'''
+    if not numpy_available():
+        raise ClockworkError('Fitting timings needs numpy, install it with `pip install numpy` or the `fit` extra of clockwork.')
+
+    import numpy
+    return numpy
+
+
+def read_times(input_path: str) -> Iterator[float]:
+    '''
+    Yields the times of a plain list of times in ms, separated by whitespace, commas or newlines. Lines starting with # or // are comments.
+
+    - input_path: str | the path towards the file
+    '''
+    with parsing('time list'):
+        for line in read_lines(input_path):
+            if line.lstrip().startswith(('#', '//')):
+                continue
+
+            for time in TIME.findall(line):
+                yield float(time)
+
+
+def read_onsets(input_path: str, in_format: str | None = None):
+    '''
+    Returns the onsets of a file as a sorted numpy array of times in ms.
+
+    - input_path: str | the path towards the file
+
+    OPTIONAL ARGS:
+    - in_format: str | the format of a chart whose note times are the onsets, see notes.py. A plain list of times if None, see read_times()
+    '''
+    np = require_numpy()
+
+    if in_format is None:
+        times = read_times(input_path)
+    else:
+        times = (note.time for note in read_notes(input_path, in_format).notes)
+
+    return np.sort(np.fromiter(times, dtype=np.float64))
+
+
+
+# FITTING
+def fit_timings(onsets: Iterable[float], min_bpm: float = 90, snap: int = 4, tolerance: float = 5) -> list[Timing]:
+    '''
+    Fits piecewise-constant BPMs to a list of onsets and returns them as Timing instances, which every Convert.to_* function takes.
+    Segments whose grids line up are merged afterwards, see TimingList.simplify().
+
+    - onsets: Iterable[float] | the onsets in ms, e.g. note times
+
+    OPTIONAL ARGS:
+    - min_bpm: float | the BPMs are searched in [min_bpm, 2 * min_bpm): a grid also fits twice its BPM, so only one octave is searched
+    - snap: int | the grid of the onsets, in 1/snap beats. 4 fits 1/4th beats, 12 also fits triplets but is more easily fooled
+    - tolerance: float | the largest distance between an onset and the grid of its segment, in ms
+    '''
+    np = require_numpy()
+    times = np.sort(np.asarray(onsets, dtype=np.float64))
+
+    if len(times):
+        times = times[np.concatenate(([True], np.diff(times) > CHORD_GAP))]
+    if len(times) < 3:
+        raise ParseError('At least 3 onsets are needed to fit timings.')
+
+    # grid units (ms) of one octave of BPMs
+    bpms = min_bpm * BPM_RATIO ** np.arange(int(np.log(2) / np.log(BPM_RATIO)))
+    units = 60000 / (bpms * snap)
+
+    timings = []
+    start = 0
+
+    while start < len(times) - 1:
+        end, offset, unit = fit_segment(np, times, start, units, snap, tolerance)
+
+        if not timings or offset > timings[-1].offset:
+            timings.append(Timing(Decimal(f'{offset:.3f}'), Decimal(f'{60000 / (unit * snap):.3f}')))
+        start = end
+
+    return TimingList.simplify(timings, tolerance)[0]
+
+
+def fit_segment(np, times, start: int, units, snap: int, tolerance: float) -> tuple[int, float, float]:
+    '''
+    Fits the segment starting at an onset. Returns the index of the onset after it, the fitted time of its first onset and its grid unit in ms.
+    '''
+    horizon = HORIZON
+
+    while True:
+        onsets = times[start:start + horizon]
+        unit = grid_unit(np, np.diff(onsets[:WINDOW + 1]), units, snap, tolerance)
+        end = min(WINDOW + 1, len(onsets))
+
+        for _ in range(MAX_ITERATIONS):
+            # every interval is counted in grid steps on its own: a wrong unit only shows up as a drift of the fit
+            steps = np.concatenate(([0], np.cumsum(np.maximum(np.rint(np.diff(onsets) / unit), 1))))
+            offset, unit = least_squares(np, steps[:end], onsets[:end])
+
+            missed = np.abs(onsets - (offset + unit * steps)) > tolerance
+            if len(missed) >= CONFIRM:
+                missed = np.lib.stride_tricks.sliding_window_view(missed, CONFIRM).all(axis=1)
+            change = np.flatnonzero(missed)
+
+            # the onsets left on the grid of the fit, 2 at least
+            fitted = max(int(change[0]) if len(change) else len(onsets), 2)
+            if fitted == end:
+                break
+            end = fitted
+
+        if end < len(onsets) or start + horizon >= len(times):
+            return start + end, float(offset), float(unit)
+
+        horizon *= 2
+
+
+def grid_unit(np, intervals, units, snap: int, tolerance: float) -> float:
+    '''
+    Returns the grid unit in ms which fits a few intervals best. Every candidate unit is tried at once,
+    scored by the distance of the intervals to its grid, in ms, then the best one is refined by least squares.
+    A grid fits as well at 3/4 or 5/4 of its BPM: among the candidates which fit about as well as the best one, the ones on which
+    the median interval is a power of two of beats (a quarter, a half, one or two beats...) win, so that beats and downbeats land on the notes.
+    '''
+    ratios = intervals[None, :] / units[:, None]
+    error = np.sqrt(np.mean(((ratios - np.rint(ratios)) * units[:, None]) ** 2, axis=1))
+
+    beats = np.log2(np.maximum(np.median(np.rint(ratios), axis=1), 1) / snap)
+    preferred = np.flatnonzero((error <= error.min() + tolerance / 2) & (beats == np.rint(beats)))
+    best = units[preferred[np.argmin(error[preferred])] if len(preferred) else np.argmin(error)]
+
+    steps = np.maximum(np.rint(intervals / best), 1)
+    return float(np.dot(steps, intervals) / np.dot(steps, steps))
+
+
+def least_squares(np, steps, onsets) -> tuple[float, float]:
+    '''
+    Fits onsets = offset + unit * steps, and returns the offset and the unit.
+    '''
+    steps_mean, onsets_mean = steps.mean(), onsets.mean()
+    centered = steps - steps_mean
+    unit = np.dot(centered, onsets - onsets_mean) / np.dot(centered, centered)
+
+    return onsets_mean - unit * steps_mean, unit
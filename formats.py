@@ -0,0 +1,231 @@
+# MODULES
+# the registry of chart formats. Readers and writers are given as "module:attribute" strings and only imported when a format is used,
+# so that clockwork starts just as fast however many formats are installed.
+# importlib.metadata is only imported to look up plugins, when a format is not built in.
+from functools import cache
+from importlib import import_module
+from typing import Callable, NamedTuple
+
+# CONSTANTS
+# entry point group of format plugins. Each entry point is named after its format and points to a Format, e.g.
+#   entry_points = {'clockwork.formats': ['bms = clockwork_bms:FORMAT']}
+ENTRY_POINT_GROUP = 'clockwork.formats'
+
+# capabilities a format can declare
+# - read: has extract and parse
+# - write: has emit
+# - inject: has edits, see inject.py
+# - streaming: the reader only decodes the timing region and the writer yields the snippet piece by piece
+# - vectorized: the timing math can run on the numpy engine
+# - velocities: parse and emit take scroll velocities as a `velocities` list of timing.Velocity, see Convert.read()
+# - notes: has read_notes and write_notes, see notes.py
+CAPABILITIES = ('read', 'write', 'inject', 'streaming', 'vectorized', 'velocities', 'notes')
+
+
+
+# UTILS
+@cache
+def resolve(spec: str) -> Callable:
+    '''
+    Imports and returns the object named by a "module:attribute" string. The attribute may be dotted, e.g. "convert:Convert.parse_osu".
+
+    - spec: str | the object to import
+    '''
+    module_name, _, attribute = spec.partition(':')
+    obj = import_module(module_name)
+
+    for name in attribute.split('.'):
+        obj = getattr(obj, name)
+
+    return obj
+
+
+
+# FORMAT CLASS
+class Format(NamedTuple):
+    '''
+    A chart format, as registered in FORMATS or by a plugin.
+
+    - name: str | the name used by -i/-o
+    - extensions: tuple[str, ...] | the file extensions, without the dot
+    - capabilities: frozenset[str] | see CAPABILITIES
+
+    OPTIONAL ARGS:
+    - extract: str | "module:attribute" of a function(input_path) -> bytes returning the undecoded timing region of a file
+    - parse: str | "module:attribute" of a function(content, **read_options) -> list[Timing] | TimingTable
+    - emit: str | "module:attribute" of a function(timings, **write_options) -> Iterator[str]
+    - edits: str | "module:attribute" of a function(data, chunks) -> list[Edit], see inject.py
+    - read_notes: str | "module:attribute" of a function(input_path, **read_options) -> NoteChart, see notes.py
+    - write_notes: str | "module:attribute" of a function(chart, **write_options) -> Iterator[str], see notes.py
+    - read_options: tuple[str, ...] | the keyword arguments taken by parse and read_notes, the others are not passed
+    - write_options: tuple[str, ...] | the keyword arguments taken by emit and write_notes, the others are not passed
+    - hints: tuple[str, ...] | shown after a snippet is copied to the clipboard
+    '''
+    name: str
+    extensions: tuple[str, ...]
+    capabilities: frozenset[str]
+    extract: str | None = None
+    parse: str | None = None
+    emit: str | None = None
+    edits: str | None = None
+    read_notes: str | None = None
+    write_notes: str | None = None
+    read_options: tuple[str, ...] = ('table',)
+    write_options: tuple[str, ...] = ()
+    hints: tuple[str, ...] = ()
+
+
+    def load(self, role: str) -> Callable:
+        '''
+        Imports and returns one of the functions of the format.
+
+        - role: str | extract, parse, emit, edits, read_notes or write_notes
+        '''
+        return resolve(getattr(self, role))
+
+
+    def call(self, role: str, argument, **options):
+        '''
+        Calls a function of the format with the options it takes, the others are ignored.
+
+        - role: str | parse, emit, read_notes or write_notes
+        - argument: the content to parse, the timings to emit, the path of the chart to read or the NoteChart to write
+        '''
+        accepted = self.read_options if role in ('parse', 'read_notes') else self.write_options
+        return self.load(role)(argument, **{key: value for key, value in options.items() if key in accepted})
+
+
+
+# BUILT-IN FORMATS
+FORMATS = {
+    'osu': Format(
+        name = 'osu',
+        extensions = ('osu',),
+        capabilities = frozenset({'read', 'write', 'inject', 'streaming', 'velocities', 'notes'}),
+        extract = 'convert:Convert._extract_osu',
+        parse = 'convert:Convert.parse_osu',
+        emit = 'convert:Convert.iter_osu',
+        edits = 'inject:osu_edits',
+        read_notes = 'notes:read_osu_notes',
+        write_notes = 'notes:iter_osu_notes',
+        read_options = ('table', 'velocities'),
+        write_options = ('volume', 'sample_set', 'sample_index', 'velocities'),
+        hints = (
+            '[TimingPoints] copied to clipboard.',
+            'You can paste it directly into your .osu, right after the [Events] section.',
+            'Be careful to remove the previous [TimingPoints] section.',
+        ),
+    ),
+    'sd2': Format(
+        name = 'sd2',
+        extensions = ('xml',),
+        capabilities = frozenset({'read', 'write', 'inject', 'streaming'}),
+        extract = 'convert:Convert._extract_sd2',
+        parse = 'convert:Convert.parse_sd2',
+        emit = 'convert:Convert.iter_sd2',
+        edits = 'inject:sd2_edits',
+        write_options = ('practice',),
+        hints = (
+            'Bookmarks copied to clipboard.',
+            'You can paste them directly into your .xml, right after the "<Editor ... />" element.',
+        ),
+    ),
+    'stepmania': Format(
+        name = 'stepmania',
+        extensions = ('sm', 'ssc'),
+        capabilities = frozenset({'read', 'write', 'inject', 'streaming', 'vectorized', 'velocities', 'notes'}),
+        extract = 'convert:Convert._extract_stepmania',
+        parse = 'convert:Convert.parse_stepmania',
+        emit = 'convert:Convert.iter_stepmania',
+        edits = 'inject:stepmania_edits',
+        read_notes = 'notes:read_stepmania_notes',
+        write_notes = 'notes:iter_stepmania_notes',
+        read_options = ('table', 'backend', 'velocities', 'chart'),
+        write_options = ('step', 'backend', 'velocities'),
+        hints = (
+            'Tags copied to clipboard.',
+            'You can paste them directly into your .sm/.ssc, right at the end of the first section.',
+            'Be careful to remove the previous tags.',
+        ),
+    ),
+    'quaver': Format(
+        name = 'quaver',
+        extensions = ('qua',),
+        capabilities = frozenset({'read', 'write', 'inject', 'streaming', 'velocities', 'notes'}),
+        extract = 'convert:Convert._extract_quaver',
+        parse = 'convert:Convert.parse_quaver',
+        emit = 'convert:Convert.iter_quaver',
+        edits = 'inject:quaver_edits',
+        read_notes = 'notes:read_quaver_notes',
+        write_notes = 'notes:iter_quaver_notes',
+        read_options = ('table', 'velocities'),
+        write_options = ('velocities',),
+        hints = (
+            'Timings copied to clipboard.',
+            'You can paste them directly into your .qua, right after the "SoundEffects: ..." element.',
+            'Be careful to remove the previous timings.',
+        ),
+    ),
+    'adofai': Format(
+        name = 'adofai',
+        extensions = ('adofai',),
+        capabilities = frozenset({'read', 'write', 'streaming', 'vectorized'}),
+        extract = 'convert:Convert._extract_adofai',
+        parse = 'convert:Convert.parse_adofai',
+        emit = 'convert:Convert.iter_adofai',
+        read_options = ('table', 'backend'),
+        write_options = ('step', 'backend'),
+        hints = (
+            'Level copied to clipboard.',
+            'You can save it as a .adofai file, then pick the song in the editor.',
+        ),
+    ),
+    'bms': Format(
+        name = 'bms',
+        extensions = ('bms', 'bme', 'bml', 'pms'),
+        capabilities = frozenset({'read', 'streaming', 'vectorized'}),
+        extract = 'convert:Convert._extract_bms',
+        parse = 'convert:Convert.parse_bms',
+        read_options = ('table', 'backend'),
+    ),
+}
+
+
+
+# REGISTRY
+@cache
+def plugins() -> dict:
+    '''
+    Returns the entry points of the installed format plugins by name, without loading them. Built-in formats cannot be overridden.
+    '''
+    from importlib.metadata import entry_points
+
+    return {ep.name: ep for ep in entry_points(group=ENTRY_POINT_GROUP) if ep.name not in FORMATS}
+
+
+@cache
+def get_format(name: str) -> Format | None:
+    '''
+    Returns a format by name, or None if it does not exist. Plugins are only looked up, and loaded, when the name is not a built-in format.
+
+    - name: str | the name of the format
+    '''
+    if name in FORMATS:
+        return FORMATS[name]
+
+    if name in plugins():
+        return plugins()[name].load()
+
+    return None
+
+
+def format_names(capability: str | None = None, installed: bool = True) -> list[str]:
+    '''
+    Returns the names of the formats, built-in ones first.
+
+    OPTIONAL ARGS:
+    - capability: str | only return the formats with this capability. Plugins are loaded to check it.
+    - installed: bool | if False, only return the built-in formats, without looking up plugins
+    '''
+    names = list(FORMATS) + (list(plugins()) if installed else [])
+    return [name for name in names if capability is None or capability in get_format(name).capabilities]
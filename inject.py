@@ -0,0 +1,334 @@
+# MODULES
+# writes converted timings straight into an existing chart, see `clockwork --inject`.
+# the target is mapped in memory and scanned once for the byte offsets of its timing section. Everything else is copied through untouched.
+from mmap import mmap, ACCESS_READ
+import os
+import re
+import shutil
+import tempfile
+from heapq import merge
+from typing import Callable, Iterable, Iterator
+# local
+from timing import Timing, TimingTable
+from convert import Convert, FormatError, ParseError, SD2_LABEL, find_line, open_file, parsing, require_format
+
+# CONSTANTS
+# same as convert.SM_TAG, over bytes
+SM_TAG = re.compile(rb'#([A-Za-z0-9]+):')
+# song timing tags which would be applied on top of the injected #BPMS, and are emptied
+SM_CLEARED_TAGS = (b'STOPS', b'DELAYS', b'WARPS')
+# a Soundodger 2 <Bookmark> element, and its label
+SD2_BOOKMARK = re.compile(rb'<Bookmark\b[^>]*?(?:/>|>.*?</Bookmark\s*>)', re.DOTALL)
+SD2_LABEL_ATTRIBUTE = re.compile(rb'\blabel\s*=\s*"([^"]*)"')
+
+# an edit replaces data[start:end] with the chunks
+Edit = tuple[int, int, Iterable[str]]
+
+
+
+# UTILS
+def line_start(data: bytes | mmap, position: int) -> int:
+    '''Returns the offset of the start of the line containing position.'''
+    return data.rfind(b'\n', 0, position) + 1
+
+
+def line_end(data: bytes | mmap, position: int) -> int:
+    '''Returns the offset right after the end of the line containing position, newline included.'''
+    end = data.find(b'\n', position)
+    return len(data) if end == -1 else end + 1
+
+
+def first_line(data: bytes | mmap, prefixes: tuple[bytes, ...]) -> int:
+    '''Returns the offset of the first line starting with one of the prefixes, tried in order, or the end of the file.'''
+    for prefix in prefixes:
+        position = find_line(data, prefix)
+        if position != -1:
+            return position
+
+    return len(data)
+
+
+def list_end(data: bytes | mmap, start: int) -> int:
+    '''Returns the offset of the end of the .qua list whose key starts at start: the next top-level key, or the end of the file.'''
+    end = line_end(data, start)
+    while end < len(data) and data[end:end + 1] in (b' ', b'-', b'#', b'\r', b'\n'):
+        end = line_end(data, end)
+
+    return end
+
+
+def split_chunks(chunks: Iterable[str], is_boundary: Callable[[str], bool], include: bool = False) -> tuple[list[str], list[str]]:
+    '''
+    Splits the snippet pieces of two sections at the first boundary piece, e.g. the timing points and the velocities of a .qua snippet.
+
+    - chunks: Iterable[str] | the pieces
+    - is_boundary: Callable[[str], bool] | True for the piece which starts the second section
+
+    OPTIONAL ARGS:
+    - include: bool | if True, the boundary piece ends the first section instead
+    '''
+    first = []
+    chunks = iter(chunks)
+
+    for chunk in chunks:
+        if is_boundary(chunk):
+            if include:
+                first.append(chunk)
+                return first, list(chunks)
+            return first, [chunk, *chunks]
+
+        first.append(chunk)
+
+    return first, []
+
+
+def separated(data: bytes | mmap, position: int, chunks: Iterable[str]) -> Iterator[str]:
+    '''Yields the chunks, preceded by a newline if they are inserted after an unterminated last line.'''
+    if position == len(data) and position and data[position - 1:position] != b'\n':
+        yield '\n'
+
+    yield from chunks
+
+
+
+# EDITS
+# every function takes the target content and the snippet pieces from Convert.emit(), and returns the edits sorted by offset
+# they are registered as the "edits" of their format, see formats.py
+
+def osu_edits(data: bytes | mmap, chunks: Iterator[str]) -> list[Edit]:
+    '''
+    Replaces the [TimingPoints] section, blank line included. Without one, it is inserted before [Colours] or [HitObjects].
+    The inherited timing points (scroll velocities) of the target are replaced if velocities were converted along,
+    and kept otherwise, merged in offset order with the new uninherited ones.
+    '''
+    start = find_line(data, b'[TimingPoints]')
+
+    if start == -1:
+        start = end = first_line(data, (b'[Colours]', b'[HitObjects]'))
+    else:
+        end = find_line(data, b'[', start + 1)
+        end = len(data) if end == -1 else end
+
+    header, lines = split_chunks(chunks, lambda chunk: chunk != '[TimingPoints]\n')
+    kept = [] if start == end else osu_inherited(bytes(data[line_end(data, start):end]).decode('utf-8'))
+
+    if kept and not any(osu_is_inherited(line) for line in lines):
+        # at the same offset, the uninherited point comes first, like osu! writes them
+        key = lambda line: (float(line.split(',', 1)[0]), osu_is_inherited(line))
+        with parsing('.osu'):
+            lines = list(merge(lines, kept, key = key))
+
+    return [(start, end, separated(data, start, [*header, *lines, '\n']))]
+
+
+def osu_is_inherited(line: str) -> bool:
+    '''Returns True if a [TimingPoints] line is an inherited timing point: its 7th field, uninherited, is 0.'''
+    fields = line.split(',')
+    return len(fields) > 6 and fields[6].strip() == '0'
+
+
+def osu_inherited(section: str) -> list[str]:
+    '''Returns the inherited timing points of the lines of a [TimingPoints] section, newlines normalized.'''
+    return [line.strip() + '\n' for line in section.splitlines() if osu_is_inherited(line) and not line.lstrip().startswith('//')]
+
+
+def sd2_edits(data: bytes | mmap, chunks: Iterator[str]) -> list[Edit]:
+    '''
+    Replaces the bookmarks written by clockwork ("time / bpm" labels, see Timing.to_sd2()) one by one, and leaves every other element,
+    bookmarks of the user included, as it was. The new bookmarks take the place of the first replaced one,
+    or go before the first bookmark, or after the <Editor/> element. New lines are indented like the line they are inserted at.
+    '''
+    edits = []
+    anchor = None
+    bookmarks = list(SD2_BOOKMARK.finditer(data))
+
+    for match in bookmarks:
+        label = SD2_LABEL_ATTRIBUTE.search(match.group(0))
+        if label is None or not SD2_LABEL.match(label.group(1).decode('utf-8', 'replace')):
+            continue
+
+        # alone on its line: the whole line goes
+        start, end = line_start(data, match.start()), line_end(data, match.end())
+        if bytes(data[start:match.start()]).strip() or bytes(data[match.end():end]).strip():
+            start, end = match.start(), match.end()
+
+        edits.append((start, end, []))
+        anchor = match.start() if anchor is None else anchor
+
+    if edits:
+        position = edits[0][0]
+    elif bookmarks:
+        position = line_start(data, bookmarks[0].start())
+        anchor = bookmarks[0].start()
+    else:
+        editor = data.find(b'<Editor')
+        if editor == -1:
+            raise ParseError('Could not find the <Editor/> element of the .xml file.')
+
+        position = line_end(data, data.find(b'>', editor))
+        anchor = editor
+
+    indent = bytes(data[line_start(data, anchor):anchor])
+    indent = indent.decode('utf-8') if not indent.strip() else ''
+    # inserted inside a line, the bookmarks are followed by the rest of it
+    inline = position != line_start(data, position)
+    new = separated(data, position, (indent + chunk.rstrip('\n') + ('' if inline else '\n') for chunk in chunks))
+
+    if edits and edits[0][0] == position:
+        edits[0] = (position, edits[0][1], new)
+    else:
+        edits.append((position, position, new))
+
+    return sorted(edits, key = lambda edit: edit[0])
+
+
+def stepmania_edits(data: bytes | mmap, chunks: Iterator[str]) -> list[Edit]:
+    '''
+    Replaces the song #OFFSET and #BPMS tags, and empties #STOPS, #DELAYS and #WARPS, since the injected BPMs already account for them.
+    #SCROLLS is replaced if velocities were converted along, and left alone otherwise.
+    Missing tags are inserted before the first chart. .ssc chart timing tags are left alone.
+    '''
+    offset_tag = next(chunks).rstrip('\n')
+    # the #BPMS pieces end with ';', the #SCROLLS ones follow
+    bpms, scrolls = split_chunks(chunks, lambda chunk: chunk == ';', include = True)
+    replacements = [(b'OFFSET', [offset_tag]), (b'BPMS', bpms)]
+
+    if scrolls:
+        replacements.append((b'SCROLLS', [scrolls[0].lstrip('\n'), *scrolls[1:]]))
+    tags = {}
+    header_end = len(data)
+    position = 0
+
+    # same scan as Convert._scan_stepmania(), up to the first chart
+    while (match := SM_TAG.search(data, position)):
+        name = match.group(1).upper()
+
+        if name in (b'NOTEDATA', b'NOTES', b'NOTES2'):
+            header_end = line_start(data, match.start())
+            break
+
+        end = data.find(b';', match.end())
+        end = len(data) if end == -1 else end + 1
+        tags.setdefault(name, (match.start(), end))
+        position = end
+
+    edits = []
+    missing = []
+
+    for name, replacement in replacements:
+        if name in tags:
+            edits.append((*tags[name], replacement))
+        else:
+            missing += [*replacement, '\n']
+
+    for name in SM_CLEARED_TAGS:
+        if name in tags:
+            edits.append((*tags[name], [f'#{name.decode()}:;']))
+
+    if missing:
+        edits.append((header_end, header_end, separated(data, header_end, missing)))
+
+    return sorted(edits, key = lambda edit: edit[0])
+
+
+def quaver_edits(data: bytes | mmap, chunks: Iterator[str]) -> list[Edit]:
+    '''
+    Replaces the TimingPoints list. Without one, it is inserted before SliderVelocities or HitObjects.
+    The SliderVelocities list is replaced too if velocities were converted along, or inserted after TimingPoints.
+    '''
+    timing_points, slider_velocities = split_chunks(chunks, lambda chunk: chunk == 'SliderVelocities:\n')
+    # the key is written along with the velocities, see Convert.iter_quaver()
+    if timing_points[:1] == ['TimingPoints:\n']:
+        timing_points = timing_points[1:]
+
+    start = find_line(data, b'TimingPoints:')
+
+    if start == -1:
+        start = end = first_line(data, (b'SliderVelocities:', b'HitObjects:'))
+    else:
+        end = list_end(data, start)
+
+    edits = [(start, end, separated(data, start, ['TimingPoints:\n', *timing_points]))]
+
+    if slider_velocities:
+        sv_start = find_line(data, b'SliderVelocities:')
+
+        if sv_start == -1:
+            edits[0] = (start, end, separated(data, start, ['TimingPoints:\n', *timing_points, *slider_velocities]))
+        else:
+            edits.append((sv_start, list_end(data, sv_start), slider_velocities))
+
+    return sorted(edits, key = lambda edit: edit[0])
+
+
+
+# INJECTION
+def write_edits(target: str, data: bytes | mmap, edits: list[Edit]) -> str:
+    '''
+    Writes a copy of the target with the edits applied to a temporary file next to it, and returns its path.
+    The newlines of the snippet follow the ones of the target.
+
+    - target: str | the path towards the target file
+    - data: bytes | mmap | the content of the target
+    - edits: list[Edit] | the edits, sorted by offset
+    '''
+    first_newline = data.find(b'\n')
+    newline = '\r\n' if first_newline > 0 and data[first_newline - 1:first_newline] == b'\r' else '\n'
+
+    fd, temp_path = tempfile.mkstemp(prefix = '.clockwork-', suffix = '.tmp', dir = os.path.dirname(os.path.abspath(target)))
+
+    try:
+        with os.fdopen(fd, 'wb') as out, memoryview(data) as view:
+            position = 0
+
+            for start, end, chunks in edits:
+                out.write(view[position:start])
+                for chunk in chunks:
+                    out.write(chunk.replace('\n', newline).encode('utf-8'))
+                position = end
+
+            out.write(view[position:])
+
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return temp_path
+
+
+def inject(timings: list[Timing] | TimingTable, target: str, out_format: str, **options):
+    '''
+    Replaces the timing section of an existing chart with the given timings, in place.
+    The file is replaced atomically: it is either fully updated, or left as it was.
+
+    - timings: list[Timing] | TimingTable | a list of Timing instances
+    - target: str | the path towards the chart to update
+    - out_format: str | the format of the chart (osu, sd2, stepmania, quaver...)
+
+    OPTIONAL ARGS:
+    See Convert.emit().
+    '''
+    file_format = require_format(out_format, 'inject')
+    if not target.endswith(tuple(f'.{ext}' for ext in file_format.extensions)):
+        raise FormatError(f'The target file format is not .{" / .".join(file_format.extensions)}')
+
+    edits = file_format.load('edits')
+    chunks = Convert.emit(timings, out_format, **options)
+
+    with open_file(target, 'rb') as f:
+        # empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            temp_path = write_edits(target, b'', edits(b'', chunks))
+
+        else:
+            with mmap(f.fileno(), 0, access = ACCESS_READ) as data:
+                temp_path = write_edits(target, data, edits(data, chunks))
+
+    # the target is closed first, so that it can be replaced on every platform
+    try:
+        shutil.copymode(target, temp_path)
+        os.replace(temp_path, target)
+
+    except BaseException:
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,561 @@
+# MODULES
+# moves the notes of a chart between formats along with its timing, see `clockwork notes`: osu!mania [HitObjects], Quaver HitObjects and Stepmania #NOTES.
+# notes are streamed: they are read line by line, retimed CHUNK_SIZE at a time with a single TempoMap call, and written as they come,
+# so that only the timing points, a chunk of notes and the holds still open are in memory, whatever the size of the chart.
+import re
+from decimal import Decimal
+from heapq import heapify, heappush, heappop
+from itertools import chain, groupby, islice
+from math import gcd, inf
+from typing import Callable, Iterable, Iterator, NamedTuple
+# local
+from timing import Timing, TimingList, TimingTable, TempoMap, STEP128, choose_backend
+from convert import Convert, FormatError, ParseError, SM_TAG, SM_TIMING_TAGS, check_format, open_file, parsing, require_format, split_tag
+
+# CONSTANTS
+# notes are retimed this many at a time
+CHUNK_SIZE = 4096
+
+# OSU
+# width of the playfield: the column of an osu!mania note is x * keys // OSU_WIDTH
+OSU_WIDTH = 512
+# flag of a hold note in the type field of a hit object
+OSU_HOLD = 128
+# game mode of osu!mania charts
+OSU_MANIA = 3
+
+# STEPMANIA
+# beats in a measure of #NOTES
+SM_MEASURE = 4
+# Stepmania stores notes and timing events on rows of 1/48 beat
+SM_ROWS = 48
+# steps types by number of columns, for the charts written by clockwork
+SM_STEPSTYPES = {4: 'dance-single', 5: 'pump-single', 6: 'dance-solo', 7: 'kb7-single', 8: 'dance-double', 10: 'pump-double'}
+# note characters. Mines, fakes and keysounds are not notes and are skipped
+SM_TAP, SM_HOLD, SM_TAIL, SM_ROLL, SM_LIFT = '1', '2', '3', '4', 'L'
+# the measure and chart separators of #NOTES
+SM_SEPARATOR = re.compile(r'([,;])')
+# what follows a note character in .ssc rows: keysound indices, e.g. "1[3]", and attacks, e.g. "1{...}"
+SM_NOTE_EXTRAS = re.compile(r'\[[^\]]*\]|\{[^}]*\}')
+
+
+
+# NOTE CLASSES
+class Note(NamedTuple):
+    '''
+    A single note. Ordered by time, then column.
+
+    - time: float | the time of the note in ms, or its beat inside the Stepmania reader and writer
+    - column: int | the column of the note, from 0
+    - end: float | None | the end of a hold note, None for a tap
+    '''
+    time: float
+    column: int
+    end: float | None = None
+
+
+class NoteChart(NamedTuple):
+    '''
+    A chart as read by the read_notes function of a format. The notes are an iterator: they are read from the file as they are consumed, and only once.
+
+    - timings: list[Timing] | TimingTable | the timing points of the chart
+    - keys: int | the number of columns
+    - notes: Iterator[Note] | the notes, sorted by time
+    '''
+    timings: list[Timing] | TimingTable
+    keys: int
+    notes: Iterator[Note]
+
+
+
+# UTILS
+def read_lines(input_path: str) -> Iterator[str]:
+    '''
+    Yields the lines of a text file one at a time. The file is closed once they are all read, or when the generator is closed.
+
+    - input_path: str | the path towards the file
+    '''
+    with open_file(input_path, 'r') as f:
+        yield from f
+
+
+def retime(notes: Iterable[Note], convert: Callable) -> Iterator[Note]:
+    '''
+    Yields the notes with their times (and the ends of holds) converted, e.g. from beats to ms.
+    Notes are converted CHUNK_SIZE at a time, with a single call to convert.
+
+    - notes: Iterable[Note] | the notes
+    - convert: Callable | a bulk conversion, e.g. TempoMap.beats_to_times
+    '''
+    notes = iter(notes)
+
+    while (chunk := list(islice(notes, CHUNK_SIZE))):
+        values = convert([note.time for note in chunk] + [note.end for note in chunk if note.end is not None])
+        # numpy arrays are turned back into floats in one go
+        values = values.tolist() if hasattr(values, 'tolist') else values
+        ends = iter(values[len(chunk):])
+
+        for note, time in zip(chunk, values):
+            yield Note(time, note.column, None if note.end is None else next(ends))
+
+
+def read_notes(input_path: str, in_format: str, chart: int | None = None, backend: str | None = None) -> NoteChart:
+    '''
+    Reads the timing and the notes of a chart, see the read_notes function of each format.
+
+    - input_path: str | the path towards the chart
+    - in_format: str | the format of the chart (osu, stepmania, quaver)
+
+    OPTIONAL ARGS:
+    - chart: int | stepmania only: the index of the chart whose notes are read, the first one by default
+    - backend: str | the numeric backend, see TimingList.from_stepmania()
+    '''
+    return require_format(in_format, 'notes').call('read_notes', input_path, chart=chart, backend=backend)
+
+
+def emit_notes(chart: NoteChart, out_format: str, **options) -> Iterator[str]:
+    '''
+    Yields the pieces of the timing section and the notes of a chart in another format, see the write_notes function of each format.
+    Nothing is read from the chart before the first piece is asked for.
+
+    - chart: NoteChart | the chart, see read_notes()
+    - out_format: str | the format to write (osu, stepmania, quaver)
+
+    OPTIONAL ARGS:
+    - step: Decimal | stepmania only: the step of the beat quantization of the BPMs and the notes
+    - backend: str | stepmania only: the numeric backend, see TimingList.to_stepmania()
+    - volume, sample_set, sample_index: int | osu only: see Convert.to_osu()
+    '''
+    return require_format(out_format, 'notes').call('write_notes', chart, **options)
+
+
+
+### OSU ###
+
+def read_osu_notes(input_path: str) -> NoteChart:
+    '''
+    Reads the timing points and the hit objects of a .osu file. The column of a note is its x position split in CircleSize columns, like osu!mania does.
+    Only osu!mania charts have columns: the other modes raise a FormatError.
+
+    - input_path: str | the path towards the .osu file
+    '''
+    timings = Convert.from_osu(input_path)
+    lines = read_lines(input_path)
+    keys, mode = 4, 0
+
+    with parsing('.osu'):
+        for line in lines:
+            if line.startswith('Mode:'):
+                mode = int(line[5:].strip())
+            elif line.startswith('CircleSize:'):
+                keys = int(Decimal(line[11:].strip()))
+            elif line.startswith('[HitObjects]'):
+                break
+
+    if mode != OSU_MANIA:
+        lines.close()
+        raise FormatError(f'The .osu file is not an osu!mania chart (Mode: {mode}).')
+
+    return NoteChart(timings, keys, _iter_osu_notes(lines, keys))
+
+
+def _iter_osu_notes(lines: Iterator[str], keys: int) -> Iterator[Note]:
+    '''
+    Yields the notes of the [HitObjects] lines of a .osu file, up to the next section.
+    '''
+    with parsing('.osu'):
+        for line in lines:
+            line = line.strip()
+
+            if line.startswith('['):
+                break
+            if not line or line.startswith('//'):
+                continue
+
+            # x,y,time,type,hitSound,objectParams,hitSample: the end time of a hold starts its hitSample
+            x, _, time, kind, _, *extras = line.split(',')
+            column = min(max(int(x) * keys // OSU_WIDTH, 0), keys - 1)
+            end = float(extras[0].split(':', 1)[0]) if int(kind) & OSU_HOLD else None
+
+            yield Note(float(time), column, end)
+
+
+def iter_osu_notes(chart: NoteChart, volume: int = 80, sample_set: int = 0, sample_index: int = 0) -> Iterator[str]:
+    '''
+    Yields the [TimingPoints] section of a chart, then its [HitObjects] section one note at a time.
+    Notes are placed in the middle of their column: the CircleSize of the .osu must be the number of keys of the chart.
+
+    - chart: NoteChart | the chart, see read_notes()
+
+    OPTIONAL ARGS:
+    - volume, sample_set, sample_index: int | see Convert.to_osu()
+    '''
+    yield from Convert.iter_osu(chart.timings, volume, sample_set, sample_index)
+    yield '\n[HitObjects]\n'
+
+    for note in chart.notes:
+        x = int((note.column + 0.5) * OSU_WIDTH / chart.keys)
+
+        if note.end is None:
+            yield f'{x},192,{round(note.time)},1,0,0:0:0:0:\n'
+        else:
+            yield f'{x},192,{round(note.time)},{OSU_HOLD},0,{round(note.end)}:0:0:0:0:\n'
+
+
+
+### QUAVER ###
+
+def read_quaver_notes(input_path: str) -> NoteChart:
+    '''
+    Reads the timing points and the hit objects of a .qua file. The scratch key of a 7K+1 map is its last column.
+
+    - input_path: str | the path towards the .qua file
+    '''
+    timings = Convert.from_quaver(input_path)
+    lines = read_lines(input_path)
+    keys, scratch = 4, False
+    notes = iter(())
+
+    with parsing('.qua'):
+        for line in lines:
+            if line.startswith('Mode:'):
+                keys = int(line[5:].strip().removeprefix('Keys'))
+            elif line.startswith('HasScratchKey:'):
+                scratch = line[14:].strip().lower() == 'true'
+            elif line.startswith('HitObjects:'):
+                # "HitObjects: []" holds no notes
+                if line[11:].strip() != '[]':
+                    notes = _iter_quaver_notes(lines)
+                break
+
+    return NoteChart(timings, keys + scratch, notes)
+
+
+def _iter_quaver_notes(lines: Iterator[str]) -> Iterator[Note]:
+    '''
+    Yields the notes of the HitObjects list of a .qua file, up to the next top-level key.
+    Nested values (KeySounds) are skipped: only the keys of the hit objects themselves are read.
+    '''
+    indent = None
+    point = None
+
+    with parsing('.qua'):
+        for line in lines:
+            stripped = line.strip()
+
+            if not stripped or stripped.startswith('#'):
+                continue
+            if line[0] not in ' -':
+                break
+
+            depth = len(line) - len(line.lstrip(' '))
+
+            # "- StartTime: 1000" starts a hit object, the dash being indented like the previous ones
+            if stripped.startswith('-') and indent in (None, depth):
+                indent = depth
+                if point is not None:
+                    yield _quaver_note(point)
+                point = {}
+                stripped = stripped[1:].strip()
+                if not stripped or stripped == '{}':
+                    continue
+
+            elif point is None or depth != indent + 2:
+                continue
+
+            key, _, value = stripped.partition(':')
+            point[key.strip()] = value.strip()
+
+        if point is not None:
+            yield _quaver_note(point)
+
+
+def _quaver_note(point: dict[str, str]) -> Note:
+    '''
+    Returns the note of a .qua hit object. Lanes count from 1, and zero values are left out by Quaver.
+    '''
+    end = point.get('EndTime', '0')
+    return Note(float(point.get('StartTime', '0')), int(point.get('Lane', '1')) - 1, None if float(end) == 0 else float(end))
+
+
+def iter_quaver_notes(chart: NoteChart) -> Iterator[str]:
+    '''
+    Yields the TimingPoints list of a chart, then its HitObjects list one note at a time.
+    The Mode of the .qua must match the number of keys of the chart.
+
+    - chart: NoteChart | the chart, see read_notes()
+    '''
+    yield 'TimingPoints:\n'
+    yield from Convert.iter_quaver(chart.timings)
+    yield 'HitObjects:\n'
+
+    for note in chart.notes:
+        end = '' if note.end is None else f'  EndTime: {round(note.end)}\n'
+        yield f'- StartTime: {round(note.time)}\n  Lane: {note.column + 1}\n{end}  KeySounds: []\n'
+
+
+
+### STEPMANIA ###
+
+def read_stepmania_notes(input_path: str, chart: int | None = None, backend: str | None = None) -> NoteChart:
+    '''
+    Reads the timing and the notes of a chart of a .sm/.ssc file, the first one by default.
+    Stops, delays and warps move the notes like they move the BPM changes. Like in Stepmania, the notes on the beat of a stop are played before it,
+    and the ones on the beat of a delay after it.
+    NOTE: notes inside a warp are not skipped.
+
+    - input_path: str | the path towards the .sm/.ssc file
+
+    OPTIONAL ARGS:
+    - chart: int | the index of the chart, in the order of the file
+    - backend: str | the numeric backend, see TimingList.from_stepmania()
+    '''
+    check_format(input_path, ('sm', 'ssc'))
+    lines = read_lines(input_path)
+    song_tags, chart_tags = {}, None
+    tags = song_tags
+    index, target = 0, chart or 0
+
+    with parsing('.sm/.ssc'):
+        # the tags of the song, and of the .ssc charts up to the target
+        for name, value in _scan_tags(lines):
+            if name == 'NOTEDATA':
+                tags = chart_tags = {}
+            elif name in ('NOTES', 'NOTES2'):
+                if index == target:
+                    break
+                index += 1
+            else:
+                tags.setdefault(name, value)
+        else:
+            raise ParseError(f'The .sm/.ssc file has no chart {target}.')
+
+        source = chain([value], lines)
+        if chart_tags is None:
+            # .sm: type, description, difficulty, meter and radar values come first
+            stepstype, source = _sm_header(source)
+        else:
+            stepstype = chart_tags.get('STEPSTYPE', '').strip()
+
+        # like Stepmania, a chart with its own timing does not inherit the song timing, except for the offset
+        timing_tags = {name: value for name, value in (chart_tags or {}).items() if name in SM_TIMING_TAGS}
+        timing_tags = {'OFFSET': song_tags.get('OFFSET', ''), **timing_tags} if timing_tags else song_tags
+
+        beats = []
+        stops = split_tag(timing_tags.get('STOPS', ''))
+        timings = TimingList.from_stepmania(
+            float(timing_tags.get('OFFSET', '').strip() or '0'), split_tag(timing_tags['BPMS']), backend=backend,
+            stops=stops, delays=split_tag(timing_tags.get('DELAYS', '')),
+            warps=split_tag(timing_tags.get('WARPS', '')), beats=beats
+        )
+        stops = [(float(beat), float(seconds) * 1000) for beat, seconds, *_ in (stop.split('=') for stop in stops)]
+
+        measures = _sm_measures(source)
+        first = next(measures, [])
+        keys = {name: keys for keys, name in SM_STEPSTYPES.items()}.get(stepstype) or len(first[0] if first else '')
+
+    # the notes on the row of a stop take its exact beat, to be told apart from the notes after it
+    notes = _iter_stepmania_notes(chain([first], measures), {round(beat * SM_ROWS): beat for beat, _ in stops})
+    return NoteChart(timings, keys, retime(notes, TempoMap(timings, beats, stops).beats_to_times))
+
+
+def _scan_tags(lines: Iterable[str]) -> Iterator[tuple[str, str]]:
+    '''
+    Yields the tags of a .sm/.ssc file as (name, value), reading it line by line.
+    #NOTES is yielded with the rest of its line, and its content is left to the caller: the scan resumes on the next line
+    if the generator is resumed, skipping the note rows, which hold no tags.
+    '''
+    name, value = None, []
+
+    for line in lines:
+        position = 0
+
+        while True:
+            if name is None:
+                match = SM_TAG.search(line, position)
+                if match is None:
+                    break
+
+                name, position = match.group(1).upper(), match.end()
+                if name in ('NOTES', 'NOTES2'):
+                    yield name, line[position:]
+                    name = None
+                    break
+
+            end = line.find(';', position)
+            if end == -1:
+                value.append(line[position:])
+                break
+
+            value.append(line[position:end])
+            yield name, ''.join(value)
+            name, value, position = None, [], end + 1
+
+
+def _sm_header(source: Iterator[str]) -> tuple[str, Iterator[str]]:
+    '''
+    Reads the 5 fields which start a .sm #NOTES tag. Returns the steps type, and the source positioned right after the fields.
+    '''
+    header = ''
+
+    for line in source:
+        header += line.split('//', 1)[0]
+        if header.count(':') >= 5:
+            *fields, rest = header.split(':', 5)
+            return fields[0].strip(), chain([rest], source)
+
+    raise ParseError('The #NOTES tag of the .sm file is incomplete.')
+
+
+def _sm_measures(source: Iterator[str]) -> Iterator[list[str]]:
+    '''
+    Yields the measures of a #NOTES tag as lists of rows, up to the ';' which ends it.
+    '''
+    rows = []
+
+    for line in source:
+        for part in SM_SEPARATOR.split(line.split('//', 1)[0]):
+            if part in (',', ';'):
+                yield rows
+                if part == ';':
+                    return
+                rows = []
+
+            elif part.strip():
+                row = part.strip()
+                rows.append(SM_NOTE_EXTRAS.sub('', row) if '[' in row or '{' in row else row)
+
+    if rows:
+        yield rows
+
+
+def _iter_stepmania_notes(measures: Iterable[list[str]], snaps: dict[int, float] | None = None) -> Iterator[Note]:
+    '''
+    Yields the notes of the measures of a #NOTES tag, timed in beats and sorted.
+    A hold is only complete at its tail: the notes after the head of an open hold wait in a heap until it closes.
+
+    - snaps: dict[int, float] | the beats given to the notes of some rows instead of their own, by row (see SM_ROWS)
+    '''
+    heads = {}
+    ready = []
+
+    for measure, rows in enumerate(measures):
+        for i, row in enumerate(rows):
+            beat = SM_MEASURE * (measure + i / len(rows))
+            if snaps:
+                beat = snaps.get(round(beat * SM_ROWS), beat)
+
+            for column, char in enumerate(row):
+                if char in (SM_TAP, SM_LIFT):
+                    heappush(ready, Note(beat, column))
+                elif char in (SM_HOLD, SM_ROLL):
+                    heads[column] = beat
+                elif char == SM_TAIL and column in heads:
+                    heappush(ready, Note(heads.pop(column), column, beat))
+
+        # the notes before the oldest open hold are final
+        first_open = min(heads.values(), default=inf)
+        while ready and ready[0].time < first_open:
+            yield heappop(ready)
+
+    while ready:
+        yield heappop(ready)
+
+
+def iter_stepmania_notes(chart: NoteChart, step: Decimal = STEP128, backend: str | None = None) -> Iterator[str]:
+    '''
+    Yields the #OFFSET and #BPMS tags of a chart, then an Edit #NOTES tag one measure at a time.
+    Notes are quantized on the same step as the BPM changes, and against the quantized #BPMS, so that both stay on the same grid.
+    Every measure is written with the fewest rows which hold its notes, 4 at least.
+
+    - chart: NoteChart | the chart, see read_notes()
+
+    OPTIONAL ARGS:
+    - step: Decimal | the step of the beat quantization, see quantize_value()
+    - backend: str | the numeric backend, see TimingList.to_stepmania()
+    '''
+    if chart.keys not in SM_STEPSTYPES:
+        raise FormatError(f'Stepmania has no steps type with {chart.keys} columns.')
+
+    backend = choose_backend(backend, len(chart.timings))
+    tempo_map = TempoMap(chart.timings, TimingList._stepmania_beats(chart.timings, step, backend))
+
+    yield from TimingList.iter_stepmania(chart.timings, step, backend)
+    yield f'\n#NOTES:\n     {SM_STEPSTYPES[chart.keys]}:\n     clockwork:\n     Edit:\n     1:\n     0,0,0,0,0:\n'
+
+    events = _sm_events(retime(chart.notes, tempo_map.times_to_beats), float(step))
+    yield from _sm_render(events, chart.keys, int(SM_MEASURE / step))
+    yield ';\n'
+
+
+def _sm_events(notes: Iterable[Note], step: float) -> Iterator[tuple[int, int, str]]:
+    '''
+    Yields the rows of the notes as (step, column, character), sorted by step.
+    Beats are quantized like quantize_value() does, counted in steps. Notes before the first beat are moved to it.
+    The tails of holds wait in a heap until every note before them is out.
+    A row holds a single note per column: a hold which runs into the next note of its column ends a step before it,
+    and a note which lands on a step already taken in its column is dropped.
+    '''
+    # (step, column, character, step of the head)
+    tails = []
+
+    for start, group in groupby(notes, lambda note: max(round(note.time / step), 0)):
+        taken = set()
+        group = list(group)
+        columns = {note.column for note in group}
+
+        # open holds end before the notes of their column
+        if any(column in columns and end >= start for end, column, _, _ in tails):
+            for i, (end, column, char, head) in enumerate(tails):
+                if column in columns and end >= start:
+                    if head < start - 1:
+                        tails[i] = (start - 1, column, char, head)
+                    else:
+                        taken.add(column)
+            heapify(tails)
+
+        while tails and tails[0][0] <= start:
+            yield heappop(tails)[:3]
+
+        for note in group:
+            if note.column in taken:
+                continue
+            taken.add(note.column)
+
+            if note.end is None:
+                yield start, note.column, SM_TAP
+            else:
+                yield start, note.column, SM_HOLD
+                heappush(tails, (max(round(note.end / step), start + 1), note.column, SM_TAIL, start))
+
+    while tails:
+        yield heappop(tails)[:3]
+
+
+def _sm_render(events: Iterable[tuple[int, int, str]], keys: int, steps: int) -> Iterator[str]:
+    '''
+    Yields the measures of #NOTES, separated by ','. Empty measures are written as 4 empty rows.
+
+    - steps: int | the number of steps in a measure
+    '''
+    rows = {}
+    measure = 0
+
+    for position, column, char in events:
+        while position // steps > measure:
+            yield _sm_measure(rows, keys, steps) + ',\n'
+            rows = {}
+            measure += 1
+
+        rows.setdefault(position % steps, ['0'] * keys)[column] = char
+
+    yield _sm_measure(rows, keys, steps)
+
+
+def _sm_measure(rows: dict[int, list[str]], keys: int, steps: int) -> str:
+    '''
+    Returns the rows of a measure, given its notes by step. The spacing between rows is the largest one which divides the measure in 4 and lands on every note.
+    '''
+    spacing = gcd(steps // SM_MEASURE, *rows)
+    empty = '0' * keys
+    return ''.join(''.join(rows.get(i, empty)) + '\n' for i in range(0, steps, spacing))
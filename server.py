@@ -0,0 +1,267 @@
+# MODULES
+# a conversion daemon, see `clockwork serve`. Editor tooling sends requests over a local socket instead of starting clockwork for every conversion,
+# so the interpreter, the imports and the format modules are only loaded once.
+#
+# the protocol is one JSON object per line, both ways. Requests are answered in order on each connection:
+#   {"id": 1, "input": "/path/song.osu", "in_format": "osu", "out_format": "stepmania", "step": 64}
+#   {"id": 1, "ok": true, "points": 12, "output": "#OFFSET:..."}
+# - "content" can be sent instead of "input", with the content of the chart
+# - "target" injects the timings into an existing chart instead of returning them, "output" is then null
+# - the other keys are the options of `clockwork convert`: practice, volume, sample_set, sample_index, step, backend, sv (true/false)
+#   and simplify (a tolerance in ms)
+# - {"command": "ping"} is answered with {"ok": true}
+# errors are answered with {"id": 1, "ok": false, "type": "ParseError", "error": "..."}, and the connection stays open.
+#
+# requests read and write files as the user running the server. The Unix socket is only open to that user, while any local user
+# can connect to a TCP port: the server only listens on TCP with a root directory, outside of which no file is read or written.
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+from decimal import Decimal
+from functools import partial
+# local
+from client import DEFAULT_PORT, default_socket_path, use_tcp, address
+from convert import Convert, ClockworkError, check_timings
+from formats import FORMATS
+from timing import TimingList, numpy_available
+
+# CONSTANTS
+# a request can hold a whole chart
+MAX_REQUEST = 2**28
+# defaults of the conversion options, same as `clockwork convert`
+DEFAULT_OPTIONS = {
+    'practice': False,
+    'volume': 80,
+    'sample_set': 0,
+    'sample_index': 0,
+    'step': 128,
+    'backend': None,
+    'simplify': None,
+}
+
+
+
+# UTILS
+def conversion_options(request: dict) -> dict:
+    '''
+    Returns the conversion options of a request as Convert.write() takes them, and the tolerance of `simplify`, see simplify_pass() in clockwork.py.
+    Missing options take their default value.
+
+    - request: dict | the request
+    '''
+    options = {key: request.get(key, default) for key, default in DEFAULT_OPTIONS.items()}
+    options['step'] = Decimal(1 / int(options['step']))
+    return options
+
+
+def confine(path: str, root: str | None) -> str:
+    '''
+    Checks that a file of a request is inside the root directory of the server. Return the path and proceed if it is, or if there is no root,
+    raise a PermissionError otherwise. Symbolic links are resolved first.
+
+    - path: str | the path towards the file
+    - root: str | None | the root directory, see serve()
+    '''
+    if root is None:
+        return path
+
+    real, root = os.path.realpath(path), os.path.realpath(root)
+    if os.path.commonpath([real, root]) != root:
+        raise PermissionError(f'{path} is outside of the directory served, {root}.')
+
+    return path
+
+
+def handle_request(request: dict, root: str | None = None) -> dict:
+    '''
+    Answers a single request, see the protocol above. Never raises: errors are answered.
+
+    - request: dict | the decoded request
+
+    OPTIONAL ARGS:
+    - root: str | the directory outside of which no file is read or written, see confine()
+    '''
+    response = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+
+    try:
+        if not isinstance(request, dict):
+            raise ValueError('A request must be a JSON object.')
+
+        if request.get('command', 'convert') == 'ping':
+            return {**response, 'ok': True}
+
+        if request.get('command', 'convert') != 'convert':
+            raise ValueError(f'Unknown command "{request["command"]}".')
+
+        in_format, out_format = request['in_format'], request['out_format']
+        options = conversion_options(request)
+        tolerance = options.pop('simplify')
+        options['velocities'] = [] if request.get('sv') else None
+
+        if 'content' in request:
+            timings = Convert.read(request['content'], in_format, backend=options['backend'], velocities=options['velocities'])
+        else:
+            timings = Convert.read(Convert.extract(confine(request['input'], root), in_format), in_format, backend=options['backend'], velocities=options['velocities'])
+
+        if tolerance is not None:
+            check_timings(timings)
+            timings = TimingList.simplify(timings, float(tolerance))[0]
+
+        if request.get('target') is not None:
+            from inject import inject
+            inject(timings, confine(request['target'], root), out_format, **options)
+            return {**response, 'ok': True, 'points': len(timings), 'output': None}
+
+        return {**response, 'ok': True, 'points': len(timings), 'output': Convert.write(timings, out_format, **options)}
+
+    # the server must outlive any request
+    except Exception as e:
+        if isinstance(e, KeyError):
+            e = ValueError(f'Missing request key {e}.')
+
+        return {**response, 'ok': False, 'type': type(e).__name__, 'error': str(e)}
+
+
+def answer(line: bytes, root: str | None = None) -> bytes:
+    '''
+    Decodes a request line and returns the encoded response line, see handle_request().
+
+    - line: bytes | the request, a JSON object
+
+    OPTIONAL ARGS:
+    - root: str | see handle_request()
+    '''
+    try:
+        response = handle_request(json.loads(line), root)
+    except ValueError as e:
+        response = {'id': None, 'ok': False, 'type': type(e).__name__, 'error': f'Invalid JSON: {e}'}
+
+    return json.dumps(response).encode('utf-8') + b'\n'
+
+
+def warm_up():
+    '''
+    Loads everything a first request would: the functions of every built-in format, and numpy when it is installed.
+    '''
+    for file_format in FORMATS.values():
+        for role in ('extract', 'parse', 'emit', 'edits'):
+            if getattr(file_format, role) is not None:
+                file_format.load(role)
+
+    if numpy_available():
+        import numpy
+
+
+
+# SERVER
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, root: str | None = None):
+    '''
+    Answers the requests of a single client until it disconnects.
+    Requests are decoded, converted and answered in the default executor: a big chart or a slow disk does not hold the other clients up.
+
+    OPTIONAL ARGS:
+    - root: str | see handle_request()
+    '''
+    loop = asyncio.get_running_loop()
+
+    try:
+        while (line := await reader.readline()):
+            writer.write(await loop.run_in_executor(None, answer, line, root))
+            await writer.drain()
+
+    # disconnected, or sent a line longer than MAX_REQUEST
+    except (ConnectionError, ValueError):
+        pass
+
+    finally:
+        writer.close()
+
+
+async def start_server(socket_path: str | None = None, port: int | None = None, root: str | None = None) -> asyncio.AbstractServer:
+    '''
+    Starts listening and returns the asyncio server.
+
+    OPTIONAL ARGS:
+    - socket_path: str | the Unix socket to listen on, default_socket_path() if neither this nor port is given
+    - port: int | the localhost TCP port to listen on instead
+    - root: str | the directory outside of which requests cannot read or write files, required on TCP
+    '''
+    if root is not None and not os.path.isdir(root):
+        raise ClockworkError(f'The directory to serve, {root}, does not exist.')
+
+    handler = partial(handle_connection, root = root)
+
+    if use_tcp(socket_path, port):
+        if root is None:
+            raise ClockworkError('Any local user can connect to a TCP port: give the directory the requests are confined to, see --root.')
+        return await asyncio.start_server(handler, '127.0.0.1', port or DEFAULT_PORT, limit = MAX_REQUEST)
+
+    socket_path = socket_path or default_socket_path()
+
+    # a socket left behind by a server which did not stop cleanly
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+        else:
+            raise ClockworkError(f'A server is already listening on {socket_path}.')
+
+    # only the user running the server can connect: the socket is created without access for the others,
+    # the umask is process-wide so it is restored right away
+    umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(handler, socket_path, limit = MAX_REQUEST)
+    finally:
+        os.umask(umask)
+
+    os.chmod(socket_path, 0o600)
+    return server
+
+
+def serve(socket_path: str | None = None, port: int | None = None, on_ready=None, root: str | None = None):
+    '''
+    Warms the conversion engine up and answers requests until interrupted or terminated. The Unix socket is removed on exit.
+
+    OPTIONAL ARGS:
+    - socket_path: str | the Unix socket to listen on, see start_server()
+    - port: int | the localhost TCP port to listen on instead
+    - on_ready: Callable | called with the address once the server listens
+    - root: str | the directory outside of which requests cannot read or write files, see start_server()
+    '''
+    warm_up()
+    listening = False
+
+    async def main():
+        nonlocal listening
+        server = await start_server(socket_path, port, root)
+        listening = True
+
+        # SIGTERM stops the server like Ctrl+C, so that the socket is removed
+        if hasattr(signal, 'SIGTERM') and sys.platform != 'win32':
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+
+        if on_ready is not None:
+            on_ready(address(socket_path, port))
+
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    try:
+        asyncio.run(main())
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        path = socket_path or default_socket_path()
+        if listening and not use_tcp(socket_path, port) and os.path.exists(path):
+            os.remove(path)
+
@@ -3,15 +3,19 @@ from setuptools import setup
 setup(
     name = 'clockwork',
     version = '0.3.1',
-    py_modules = ['clockwork', 'timing', 'convert'],
+    py_modules = ['clockwork', 'timing', 'convert', 'formats', 'inject', 'cache', 'server', 'client', 'notes', 'fit'],
     install_requires = [
         'Click>=8.1.0', 
         'zenlog>=1.1', 
         'pyperclip>=1.8.2'
     ],
+    extras_require = {
+        'fit': ['numpy'],
+    },
     entry_points = {
         'console_scripts': [
             'clockwork = clockwork:cli',
+            'clockwork-client = client:main',
         ],
     },
 )
\ No newline at end of file
@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+import pytest
+
+from convert import Convert, ParseError, OUT_FORMATS
+from timing import Timing, TimingTable, Velocity
+
+
+@pytest.mark.parametrize('in_format, content', [('osu', ''), ('quaver', ''), ('stepmania', '#OFFSET:0;')])
+@pytest.mark.parametrize('out_format', OUT_FORMATS)
+def test_empty_timings_raise_parse_error(in_format, content, out_format):
+    with pytest.raises(ParseError):
+        Convert.convert(content, in_format, out_format)
+
+
+@pytest.mark.parametrize('content', ['#BPMS:0=0;', '#BPMS:0=120,4=-60;'])
+@pytest.mark.parametrize('backend', ['decimal', 'fixed'])
+def test_non_positive_bpm_raises_parse_error(content, backend):
+    with pytest.raises(ParseError):
+        Convert.convert(content, 'stepmania', 'osu', backend=backend)
+
+
+def test_non_positive_bpm_in_table_raises_parse_error():
+    table = TimingTable([Timing(Decimal(0), Decimal(120)), Timing(Decimal(500), Decimal(0))])
+
+    with pytest.raises(ParseError, match='500'):
+        Convert.write(table, 'osu')
+
+
+def test_quaver_velocities_come_with_their_timing_points_key():
+    timings = [Timing(Decimal(0), Decimal(120))]
+
+    assert Convert.write(timings, 'quaver') == timings[0].to_quaver()
+    assert Convert.write(timings, 'quaver', velocities=[Velocity(Decimal(500), Decimal(2))]).startswith('TimingPoints:\n- StartTime: 0\n')
+
+
+@pytest.mark.parametrize('content', [
+    '{"angleData": [0, 0, 0], "settings": [1, 2], "actions": []}',
+    '{"angleData": 5, "settings": {"bpm": 120}, "actions": []}',
+    '{"angleData": [0, 0, 0], "settings": {"bpm": 120}, "actions": [5]}',
+])
+def test_structurally_wrong_document_raises_parse_error(content):
+    with pytest.raises(ParseError):
+        Convert.read(content, 'adofai')
+
+
+@pytest.mark.parametrize('content, message', [
+    ('{"angleData": 5, "settings": {}}', 'angleData'),
+    ('{"angleData": [0, "90", 0], "settings": {}}', 'angleData'),
+    ('{"pathData": 5, "settings": {}}', 'pathData'),
+    ('{"angleData": [0, 0], "settings": [1, 2]}', 'settings'),
+    ('{"angleData": [0, 0], "settings": {"bpm": "fast"}}', 'bpm'),
+    ('{"angleData": [0, 0], "settings": {}, "actions": [5]}', 'actions'),
+])
+def test_adofai_shape_is_checked(content, message):
+    with pytest.raises(ParseError, match=message) as error:
+        Convert.read(content, 'adofai')
+
+    assert error.value.__cause__ is None
@@ -0,0 +1,22 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from fit import fit_timings
+
+
+@pytest.mark.parametrize('bpm', [90, 120, 133.3, 150, 170, 175])
+@pytest.mark.parametrize('beats', [0.5, 1, 2])
+def test_regular_streams_keep_their_bpm(bpm, beats):
+    timings = fit_timings([i * beats * 60000 / bpm for i in range(400)])
+
+    assert [(float(t.offset), float(t.bpm)) for t in timings] == [(0, bpm)]
+
+
+def test_noisy_segments_keep_their_bpm():
+    rng = np.random.default_rng(0)
+    first = np.arange(200) * 60000 / 150
+    second = first[-1] + 60000 / 150 + np.arange(200) * 60000 / 137
+    onsets = np.concatenate((first, second)) + rng.normal(0, 1, 400)
+
+    assert [round(float(t.bpm)) for t in fit_timings(onsets)] == [150, 137]
@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from inject import inject
+from timing import Timing, Velocity
+
+
+TIMINGS = [Timing(Decimal(1000), Decimal(120)), Timing(Decimal(3000), Decimal(240))]
+
+
+def test_sd2_keeps_other_elements_and_user_bookmarks(tmp_path):
+    level = tmp_path / 'level.xml'
+    level.write_text(
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<Level>\n'
+        '  <Editor zoom="1" />\n'
+        '  <Bookmark time="0" col="FFFFFF" label="note" />\n'
+        '  <Bookmark time="2.5" col="FFFFFF" label="2.5 / 150" />\n'
+        '  <Shots><Shot time="1" type="aimed" /></Shots>\n'
+        '  <Bookmark time="4" col="FFFFFF" label="4 / 180" prac="True" />\n'
+        '  <Bookmark time="9" col="FF0000" label="end" />\n'
+        '</Level>\n'
+    )
+
+    inject(TIMINGS, str(level), 'sd2')
+
+    assert level.read_text() == (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<Level>\n'
+        '  <Editor zoom="1" />\n'
+        '  <Bookmark time="0" col="FFFFFF" label="note" />\n'
+        '  <Bookmark time="1" col="FFFFFF" label="1 / 120" />\n'
+        '  <Bookmark time="3" col="FFFFFF" label="3 / 240" />\n'
+        '  <Shots><Shot time="1" type="aimed" /></Shots>\n'
+        '  <Bookmark time="9" col="FF0000" label="end" />\n'
+        '</Level>\n'
+    )
+
+
+def test_sd2_without_generated_bookmarks(tmp_path):
+    level = tmp_path / 'level.xml'
+    level.write_text('<Level>\n  <Editor zoom="1" />\n  <Shots />\n</Level>\n')
+
+    inject(TIMINGS, str(level), 'sd2')
+    inject(TIMINGS, str(level), 'sd2')
+
+    assert level.read_text() == (
+        '<Level>\n'
+        '  <Editor zoom="1" />\n'
+        '  <Bookmark time="1" col="FFFFFF" label="1 / 120" />\n'
+        '  <Bookmark time="3" col="FFFFFF" label="3 / 240" />\n'
+        '  <Shots />\n'
+        '</Level>\n'
+    )
+
+
+def test_quaver_velocities_keep_a_single_timing_points_key(tmp_path):
+    chart = tmp_path / 'chart.qua'
+    chart.write_text('AudioFile: audio.mp3\nTimingPoints:\n- StartTime: 0\n  Bpm: 100\nHitObjects: []\n')
+
+    inject(TIMINGS, str(chart), 'quaver', velocities=[Velocity(Decimal(2000), Decimal(2))])
+
+    assert chart.read_text() == (
+        'AudioFile: audio.mp3\n'
+        'TimingPoints:\n'
+        f'{TIMINGS[0].to_quaver()}{TIMINGS[1].to_quaver()}'
+        'SliderVelocities:\n'
+        f'{Velocity(Decimal(2000), Decimal(2)).to_quaver()}'
+        'HitObjects: []\n'
+    )
+
+
+OSU_TARGET = (
+    'osu file format v14\r\n\r\n[TimingPoints]\r\n'
+    '0,600,4,1,0,80,1,0\r\n'
+    '1000,-50,4,1,0,80,0,0\r\n'
+    '3000,-200,4,1,0,80,0,0\r\n'
+    '\r\n[HitObjects]\r\n256,192,1000,1,0,0:0:0:0:\r\n'
+)
+
+
+def test_osu_keeps_the_velocities_of_the_target(tmp_path):
+    chart = tmp_path / 'chart.osu'
+    chart.write_bytes(OSU_TARGET.encode())
+
+    inject(TIMINGS, str(chart), 'osu')
+
+    assert chart.read_bytes().decode() == (
+        'osu file format v14\r\n\r\n[TimingPoints]\r\n'
+        f'{TIMINGS[0].to_osu()}\r\n'
+        '1000,-50,4,1,0,80,0,0\r\n'
+        f'{TIMINGS[1].to_osu()}\r\n'
+        '3000,-200,4,1,0,80,0,0\r\n'
+        '\r\n[HitObjects]\r\n256,192,1000,1,0,0:0:0:0:\r\n'
+    )
+
+
+def test_osu_replaces_the_velocities_of_the_target_with_converted_ones(tmp_path):
+    chart = tmp_path / 'chart.osu'
+    chart.write_bytes(OSU_TARGET.encode())
+
+    inject(TIMINGS, str(chart), 'osu', velocities=[Velocity(Decimal(2000), Decimal(2))])
+
+    content = chart.read_bytes().decode()
+    assert '1000,-50,' not in content and '3000,-200,' not in content
+    assert '2000,-50,4,0,0,80,0,0\r\n' in content
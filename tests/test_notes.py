@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+import pytest
+
+from convert import FormatError
+from notes import Note, NoteChart, emit_notes, read_notes
+from timing import Timing
+
+
+def write_sm(tmp_path, tags: str, rows: str) -> str:
+    path = tmp_path / 'chart.sm'
+    path.write_text(f'#OFFSET:0;\n#BPMS:0=60;\n{tags}\n#NOTES:\n     dance-single:\n     :\n     Edit:\n     1:\n     0,0,0,0,0:\n{rows};\n')
+    return str(path)
+
+
+# at 60 BPM, the notes of the measure are on beats 4 and 5
+SECOND_MEASURE = '0000\n0000\n0000\n0000\n,\n1000\n0100\n0000\n0000\n'
+
+
+def test_notes_on_a_stop_are_played_before_it(tmp_path):
+    chart = read_notes(write_sm(tmp_path, '#STOPS:4=1;', SECOND_MEASURE), 'stepmania')
+
+    assert [(note.time, note.column) for note in chart.notes] == [(4000, 0), (6000, 1)]
+
+
+def test_notes_on_a_delay_are_played_after_it(tmp_path):
+    chart = read_notes(write_sm(tmp_path, '#DELAYS:4=1;', SECOND_MEASURE), 'stepmania')
+
+    assert [(note.time, note.column) for note in chart.notes] == [(5000, 0), (6000, 1)]
+
+
+def test_notes_on_a_stop_and_a_delay_are_played_between_them(tmp_path):
+    chart = read_notes(write_sm(tmp_path, '#STOPS:4=1;\n#DELAYS:4=0.5;', SECOND_MEASURE), 'stepmania')
+
+    assert [(note.time, note.column) for note in chart.notes] == [(4500, 0), (6500, 1)]
+
+
+def test_ssc_keysounds_are_not_columns(tmp_path):
+    path = tmp_path / 'chart.ssc'
+    path.write_text(
+        '#OFFSET:0;\n#BPMS:0=60;\n#NOTEDATA:;\n#STEPSTYPE:dance-single;\n#NOTES:\n'
+        '1[3]000\n002[1]{Stealth:1}0\n0000\n0030\n;\n'
+    )
+    chart = read_notes(str(path), 'stepmania')
+
+    assert chart.keys == 4
+    assert list(chart.notes) == [Note(0, 0), Note(1000, 2, 3000)]
+
+
+def test_osu_notes_need_a_mania_chart(tmp_path):
+    path = tmp_path / 'chart.osu'
+    path.write_text('osu file format v14\n\n[General]\nMode: 0\n\n[TimingPoints]\n0,500,4,1,0,80,1,0\n\n[HitObjects]\n256,192,0,1,0,0:0:0:0:\n')
+
+    with pytest.raises(FormatError):
+        read_notes(str(path), 'osu')
+
+
+def test_stepmania_hold_ends_before_the_next_note_of_its_column(tmp_path):
+    notes = [Note(0, 0, 1000), Note(1000, 0), Note(1000, 1, 2000), Note(2000, 1, 3000)]
+    path = tmp_path / 'chart.sm'
+    path.write_text(''.join(emit_notes(NoteChart([Timing(Decimal(0), Decimal(60))], 4, iter(notes)), 'stepmania')))
+
+    first, tap, second, third = read_notes(str(path), 'stepmania').notes
+    assert first.column == 0 and first.time == 0 and 0 < first.end < 1000
+    assert tap == Note(1000, 0)
+    assert second.column == 1 and second.time == 1000 and 1000 < second.end < 2000
+    assert third == Note(2000, 1, 3000)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import socket
+import stat
+
+import pytest
+
+import client
+from convert import ClockworkError
+from server import answer, handle_request, start_server
+
+
+CHART = '#OFFSET:0;\n#BPMS:0=120,4=120.001,8=240;\n'
+
+
+def test_simplify_drops_points():
+    request = {'content': CHART, 'in_format': 'stepmania', 'out_format': 'osu'}
+
+    assert handle_request(request)['points'] == 3
+    assert handle_request({**request, 'simplify': 1})['points'] == 2
+
+
+def test_files_are_confined_to_the_root(tmp_path):
+    chart = tmp_path / 'inside' / 'chart.sm'
+    chart.parent.mkdir()
+    chart.write_text(CHART)
+    request = {'input': str(chart), 'in_format': 'stepmania', 'out_format': 'osu'}
+
+    assert handle_request(request, str(chart.parent))['ok']
+
+    response = handle_request({**request, 'target': str(tmp_path / 'outside.osu')}, str(chart.parent))
+    assert response['type'] == 'PermissionError'
+
+    response = handle_request({**request, 'input': str(chart.parent / '..' / 'inside' / '..' / 'chart.sm')}, str(chart.parent))
+    assert response['type'] == 'PermissionError'
+
+
+def test_invalid_json_is_answered():
+    response = json.loads(answer(b'{"id": 1,'))
+
+    assert not response['ok'] and response['error'].startswith('Invalid JSON')
+
+
+def test_tcp_needs_a_root():
+    with pytest.raises(ClockworkError):
+        asyncio.run(start_server(port=47999))
+
+
+def test_unix_socket_is_created_private(tmp_path, monkeypatch):
+    path = str(tmp_path / 'clockwork.sock')
+    # the socket must not be open to the others until it is chmod-ed
+    monkeypatch.setattr(os, 'chmod', lambda *args: None)
+    umask = os.umask(0o022)
+
+    async def serve():
+        server = await start_server(path)
+        server.close()
+        await server.wait_closed()
+        return stat.S_IMODE(os.stat(path).st_mode)
+
+    try:
+        assert asyncio.run(serve()) == 0o600
+        assert os.umask(umask) == 0o022
+    finally:
+        os.umask(umask)
+
+
+def test_client_reports_a_server_which_does_not_answer(tmp_path, monkeypatch, capsys):
+    def time_out(self, **request):
+        raise TimeoutError('timed out')
+
+    path = str(tmp_path / 'clockwork.sock')
+    monkeypatch.setattr(client.Client, 'request', time_out)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(path)
+        listener.listen()
+
+        with pytest.raises(SystemExit) as exit:
+            client.main(['chart.sm', '-i', 'stepmania', '-o', 'osu', '--socket', path])
+
+    assert exit.value.code == 1
+    assert 'timed out' in capsys.readouterr().err
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+import pytest
+
+from convert import Convert, ParseError
+from timing import NUMPY_THRESHOLD, Timing, TimingList, TimingTable, Velocity
+
+
+CHARTS = [
+    # duplicate beats: the last BPM of a beat wins
+    (['0=120', '0=150', '4=200', '4=100', '8=180'], [], []),
+    # entries out of order, and before the first one
+    (['1=120', '8=200', '0=90', '4=150', '4=160'], [], []),
+    # stops and delays, one of them on a BPM change
+    (['0=120', '4=240', '4=180', '12=90'], ['2=0.5', '4=0.25'], ['6=0.125']),
+    # a stop and a delay on the same beat
+    (['0=100', '3=200'], ['3=0.5'], ['3=0.25']),
+]
+
+
+@pytest.mark.parametrize('sm_timings, stops, delays', CHARTS)
+@pytest.mark.parametrize('table', [False, True])
+def test_numpy_engine_matches_decimal(sm_timings, stops, delays, table):
+    pytest.importorskip('numpy')
+    results = []
+
+    for backend in ('decimal', 'numpy'):
+        beats = []
+        timings = TimingList.from_stepmania(
+            -0.05, sm_timings, TimingTable() if table else None, backend, stops=stops, delays=delays, beats=beats
+        )
+        results.append(([(float(t.offset), float(t.bpm)) for t in timings], beats))
+
+    (expected, expected_beats), (points, beats) = results
+    assert len(points) == len(expected) == len(beats)
+    assert beats == expected_beats
+
+    for (offset, bpm), (expected_offset, expected_bpm) in zip(points, expected):
+        assert bpm == expected_bpm
+        assert offset == pytest.approx(expected_offset, abs=0.01)
+
+
+@pytest.mark.parametrize('meter', [3, 300, 9999])
+def test_table_keeps_osu_meters(meter):
+    table = Convert.read(f'[TimingPoints]\n0,500,{meter},1,0,80,1,0\n', 'osu', table=TimingTable())
+
+    assert table[0].meter == (meter, 4)
+
+
+def test_table_rejects_meters_out_of_range():
+    with pytest.raises(ParseError):
+        Convert.read('[TimingPoints]\n0,500,70000,1,0,80,1,0\n', 'osu', table=TimingTable())
+
+
+def alternating_chart(points: int) -> list[Timing]:
+    # 149 BPM points are 400 ms long, which is not a whole number of steps
+    return [Timing(Decimal(i * 400), Decimal(149 + i % 2)) for i in range(points)]
+
+
+@pytest.mark.parametrize('table', [False, True])
+def test_stepmania_output_does_not_change_at_the_numpy_threshold(table):
+    pytest.importorskip('numpy')
+    below, above = alternating_chart(NUMPY_THRESHOLD - 1), alternating_chart(NUMPY_THRESHOLD)
+    velocities = [Velocity(Decimal(i * 1000 + 250), Decimal(i % 3 + 1)) for i in range(NUMPY_THRESHOLD // 3)]
+
+    for timings in (below, above):
+        timings = TimingTable(timings) if table else timings
+        expected = ''.join(TimingList.iter_stepmania(timings, backend='decimal', velocities=velocities))
+
+        assert ''.join(TimingList.iter_stepmania(timings, velocities=velocities)) == expected
+        assert ''.join(TimingList.iter_stepmania(timings, backend='numpy', velocities=velocities)) == expected
+
+    bpms, offset = TimingList.to_stepmania(below)
+    assert TimingList.to_stepmania(above)[1] == offset
+    assert TimingList.to_stepmania(above)[0].startswith(bpms[:-1])
+
+
+@pytest.mark.parametrize('out_format', ['osu', 'quaver', 'stepmania'])
+def test_conversion_does_not_change_at_the_numpy_threshold(out_format):
+    pytest.importorskip('numpy')
+    content = '#OFFSET:0;\n#BPMS:' + ','.join(f'{i}={149 + i % 2}' for i in range(NUMPY_THRESHOLD)) + ';'
+
+    assert Convert.convert(content, 'stepmania', out_format).output == Convert.convert(content, 'stepmania', out_format, backend='decimal').output
@@ -1,22 +1,65 @@
 # MODULES
-import click
-import pyperclip
+# standard library only: numpy is optional and imported when it is used
 from decimal import *
-from sys import platform
-from zenlog import log
-from typing import Callable
+from array import array
+from bisect import bisect_right
+from fractions import Fraction
+from functools import cache, wraps
+from heapq import merge
+from itertools import accumulate
+from typing import Callable, Iterable, Iterator
 
 # CONSTANTS
 SD2_COLOR = 'FFFFFF'
 STEP128 = Decimal('0.0078125')
 
+# numeric backends of TimingList
+# - decimal: Decimals rounded to 7 digits at every step (DECIMAL_CONTEXT)
+# - fraction: exact rationals, rounded to the microsecond once at the end
+# - fixed: integer microseconds, each segment is rounded to the microsecond
+# - numpy: doubles over whole arrays, see the numpy engine of TimingList
+BACKENDS = ('decimal', 'fraction', 'fixed', 'numpy')
+# timing lists at least this long are written with numpy when it is installed, see choose_backend()
+NUMPY_THRESHOLD = 1000
+MICROSECOND = Decimal('0.001')
+
+# ADOFAI
+# angle of a midspin tile in angleData: the planet turns back without any time passing
+ADOFAI_MIDSPIN = 999
+
+# kinds of Stepmania timing events, in the order they apply at the same beat
+STEPMANIA_BPM = 0
+STEPMANIA_PAUSE = 1     # #STOPS and #DELAYS
+STEPMANIA_SCROLL = 2    # #SCROLLS, starts once the chart resumes
+STEPMANIA_WARP = 3
+STEPMANIA_RESUME = 4    # end of a warp
+
+# SCROLL VELOCITIES
+# osu! only takes multipliers between 0.01x and 10x, as inherited beat lengths between -10000 and -10
+OSU_VELOCITY_RANGE = (Decimal('0.01'), Decimal(10))
+
 # DECIMAL CONTEXT
 # for 1/128 subdivisions. fuck 1/192ths they don't translate well into decimals
-getcontext().prec = 7
+# only ever used locally (see decimal_context), the context of the calling program is left untouched
+DECIMAL_CONTEXT = Context(prec=7)
+# wide enough for fixed-point conversions, which must not be rounded to 7 digits
+FIXED_CONTEXT = Context(prec=28)
 
 
 
 # UTILS
+def decimal_context(func: Callable) -> Callable:
+    '''
+    Decorator running func in a local copy of DECIMAL_CONTEXT.
+    '''
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with localcontext(DECIMAL_CONTEXT):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
 def quantize_value(val: Decimal, step: Decimal):
     '''
     Quantizes a given value based on step size.
@@ -27,6 +70,72 @@ def quantize_value(val: Decimal, step: Decimal):
     return round(val / step, 0) * step
 
 
+@cache
+def numpy_available() -> bool:
+    '''Returns True if numpy can be imported. numpy is an optional dependency, only imported when it is used.'''
+    from importlib.util import find_spec
+    return find_spec('numpy') is not None
+
+
+def choose_backend(backend: str | None, size: int, approximate: bool = False) -> str:
+    '''
+    Returns the numeric backend to use for a timing list.
+    If no backend is given, numpy is picked for lists of at least NUMPY_THRESHOLD points when it is installed, decimal otherwise.
+    The automatic choice never changes the output: numpy is only picked where it gives the same result as decimal.
+
+    - backend: str | None | one of BACKENDS, or None to pick one automatically
+    - size: int | the number of timing points
+
+    OPTIONAL ARGS:
+    - approximate: bool | the numpy engine of the caller computes with doubles, so decimal is picked if no backend is given
+    '''
+    if backend is None:
+        if size >= NUMPY_THRESHOLD and not approximate and numpy_available():
+            return 'numpy'
+        return 'decimal'
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend "{backend}", expected one of {", ".join(BACKENDS)}.')
+
+    return backend
+
+
+def to_microseconds(value: Fraction | float) -> Decimal:
+    '''
+    Rounds an exact or binary value to the microsecond and returns it as a Decimal.
+
+    - value: Fraction | float | a time in ms
+    '''
+    if isinstance(value, Fraction):
+        return (Decimal(value.numerator) / value.denominator).quantize(MICROSECOND, context=FIXED_CONTEXT)
+
+    return Decimal(f'{value:.3f}')
+
+
+def to_integer_microseconds(value: Decimal) -> int:
+    '''
+    Rounds a time in ms to a whole number of microseconds.
+
+    - value: Decimal | a time in ms
+    '''
+    return int(value.scaleb(3, FIXED_CONTEXT).to_integral_value(context=FIXED_CONTEXT))
+
+
+def beat_decimal(steps: int, step: Decimal) -> Decimal:
+    '''
+    Returns an exact beat from a number of quantization steps, without trailing zeros.
+
+    - steps: int | the number of steps
+    - step: Decimal | the step size
+    '''
+    beat = FIXED_CONTEXT.multiply(Decimal(steps), step)
+
+    if beat == beat.to_integral_value():
+        return beat.quantize(Decimal(1), context=FIXED_CONTEXT)
+
+    return beat.normalize(FIXED_CONTEXT)
+
+
 
 # TIMING CLASS
 # contains the Timing class as well as various utility functions that have to do with timing.
@@ -93,8 +202,30 @@ class Timing:
 
 
     ### SOUNDODGER 2 ###
-    # no from_sd2() constructor because Soundodger 2 does not store timing information in .xml files.
+    # Soundodger 2 keeps the timing of a level in a separate header file. Bookmarks only hold timings when they were written by to_sd2().
 
+    @classmethod
+    @decimal_context
+    def from_sd2(cls, sd2_timing: dict[str, str]) -> Callable:
+        '''
+        Takes the attributes of a single Soundodger 2 element and creates a single Timing instance from it. Times are in seconds.
+        The element is either the timing of a header file, with bpm and offset (or delay) attributes,
+        or a bookmark written by to_sd2(), with a "time / bpm" label.
+        '''
+        if 'bpm' in sd2_timing:
+            time = sd2_timing.get('offset', sd2_timing.get('delay', '0'))
+            bpm = sd2_timing['bpm']
+        else:
+            time = sd2_timing['time']
+            bpm = sd2_timing['label'].split('/')[1]
+
+        return cls(
+            offset = Decimal(time) * 1000,
+            bpm = Decimal(bpm.strip())
+        )
+
+
+    @decimal_context
     def to_sd2(self, practice: bool = False) -> str:
         '''
         Returns a string containing a single soundodger bookmark with offset and BPM in its title.
@@ -117,15 +248,19 @@ class Timing:
     ### OSU ###
 
     @classmethod
-    def from_osu(cls, osu_timing: str) -> Callable:
+    @decimal_context
+    def from_osu(cls, osu_timing: str | list[str]) -> Callable:
         '''
         Takes a single uninherited osu! timing and creates a single Timing instance from it.
 
-        - timing: str | a string containing an uninherited osu! timing
+        - timing: str | list[str] | a string containing an uninherited osu! timing, or its comma-separated fields
 
         Please read the osu! documentation for more info: [https://osu.ppy.sh/wiki/en/Client/File_formats/osu_(file_format)#timing-points]
         ''' 
-        timing_data = osu_timing.split(',')
+        if isinstance(osu_timing, str):
+            timing_data = osu_timing.split(',')
+        else:
+            timing_data = osu_timing
 
         return cls(
             offset = Decimal(timing_data[0]),
@@ -134,6 +269,7 @@ class Timing:
         )
 
 
+    @decimal_context
     def to_osu(self, volume: int = 80, sample_set: int = 0, sample_index: int = 0) -> str:
         '''
         Returns a string containing a single uninherited osu timing.
@@ -155,30 +291,38 @@ class Timing:
     ### QUAVER ###
 
     @classmethod
-    def from_quaver(cls, qua_timing: str) -> Callable:
+    def from_quaver(cls, qua_timing: str | dict[str, str]) -> Callable:
         '''
         Takes a single Quaver timing point and creates a single Timing instance from it.
+        The point can be given as YAML text, or as a dict of its keys already read (see Convert.from_quaver()).
+        StartTime is omitted by Quaver when it is 0.
         '''
-        # split lines and strip unnecessary data
-        timing_data = [s.strip('- ') for s in qua_timing.split('\n')]
-        # remove empty strings
-        timing_data = [s.split(':') for s in timing_data if s]
-        # convert to dict (easier to work with)
-        timing_dict = {
-            x[0]: x[1].strip(' ')
-            for x in timing_data
-        }
-
-        # meter
-        if 'Meter' not in timing_dict:
-            meter_denominator = 4
-        elif timing_dict['Meter'] == 'Triple':
+        if isinstance(qua_timing, dict):
+            timing_dict = qua_timing
+
+        else:
+            # split lines and strip unnecessary data
+            timing_data = [s.strip('- ') for s in qua_timing.split('\n')]
+            # remove empty strings
+            timing_data = [s.split(':') for s in timing_data if s]
+            # convert to dict (easier to work with)
+            timing_dict = {
+                x[0]: x[1].strip(' ')
+                for x in timing_data
+            }
+
+        # meter, written as Meter by older versions and Signature by newer ones
+        meter = timing_dict.get('Meter', timing_dict.get('Signature', '4'))
+
+        if meter == 'Triple':
             meter_denominator = 3
+        elif meter == 'Quadruple':
+            meter_denominator = 4
         else:
-            meter_denominator = int(timing_dict['Meter'])
+            meter_denominator = int(meter)
         
         return cls(
-            offset = Decimal(timing_dict['StartTime']),
+            offset = Decimal(timing_dict.get('StartTime', '0')),
             bpm = Decimal(timing_dict['Bpm']),
             meter = (meter_denominator, 4)
         )
@@ -197,6 +341,328 @@ class Timing:
 
 
 
+# VELOCITY CLASS
+class Velocity:
+    '''
+    A scroll velocity change. The offset is in milliseconds.
+    A velocity holds until the next one, whatever the BPM changes in between: osu! inherited points, which are reset by every uninherited one,
+    are turned into this model by Convert.parse_osu() and back by Convert.iter_osu().
+
+    - self.offset: Decimal
+    - self.multiplier: Decimal | the scroll speed, relative to the BPM. 1 is the normal speed
+    '''
+
+    def __init__(self, offset: Decimal, multiplier: Decimal):
+        self.offset = offset
+        self.multiplier = multiplier
+
+
+    def __repr__(self):
+        # print function
+        return f'Velocity / {str(self.offset)} / {str(self.multiplier)}x'
+
+
+    def __eq__(self, other):
+        return isinstance(other, Velocity) and (self.offset, self.multiplier) == (other.offset, other.multiplier)
+
+
+    ### OSU ###
+
+    @classmethod
+    @decimal_context
+    def from_osu(cls, osu_timing: str | list[str]) -> Callable:
+        '''
+        Takes a single inherited osu! timing and creates a single Velocity instance from it. Its beat length is -100 divided by the multiplier.
+
+        - osu_timing: str | list[str] | a string containing an inherited osu! timing, or its comma-separated fields
+        '''
+        if isinstance(osu_timing, str):
+            timing_data = osu_timing.split(',')
+        else:
+            timing_data = osu_timing
+
+        return cls(
+            offset = Decimal(timing_data[0]),
+            multiplier = -100 / Decimal(timing_data[1])
+        )
+
+
+    @decimal_context
+    def to_osu(self, meter: int = 4, volume: int = 80, sample_set: int = 0, sample_index: int = 0) -> str:
+        '''
+        Returns a string containing a single inherited osu timing. Multipliers are clamped to OSU_VELOCITY_RANGE.
+
+        OPTIONAL ARGS:
+        - meter: int | the meter of the uninherited point it follows
+        See Timing.to_osu() for the others.
+        '''
+        time = str(round(self.offset))
+        multiplier = min(max(self.multiplier, OSU_VELOCITY_RANGE[0]), OSU_VELOCITY_RANGE[1])
+
+        return f'{time},{-100 / multiplier:f},{meter},{sample_set},{sample_index},{volume},0,0'
+
+
+    ### QUAVER ###
+
+    @classmethod
+    def from_quaver(cls, qua_velocity: dict[str, str]) -> Callable:
+        '''
+        Takes the keys of a single Quaver SliderVelocities entry and creates a single Velocity instance from it.
+        StartTime and Multiplier are omitted by Quaver when they are 0.
+        '''
+        return cls(
+            offset = Decimal(qua_velocity.get('StartTime', '0')),
+            multiplier = Decimal(qua_velocity.get('Multiplier', '0'))
+        )
+
+
+    def to_quaver(self) -> str:
+        '''
+        Returns a string containing a single Quaver SliderVelocities entry.
+        '''
+        return f'- StartTime: {self.offset}\n  Multiplier: {self.multiplier}\n'
+
+
+
+# TIMINGTABLE CLASS
+class TimingTable:
+    '''
+    A columnar collection of timing points. Offsets, BPMs and meters are stored in parallel arrays instead of one Timing instance per point.
+    Behaves like a list[Timing]: indexing and iterating yield Timing views, append() and extend() take Timing instances.
+
+    - self.precision: int | None | if None, offsets and BPMs are stored as doubles. Otherwise, they are stored as fixed-point integers with this many decimal places.
+    - self.offsets: array
+    - self.bpms: array
+    - self.meters: array[int] | meter numerators
+    - self.meter_units: array[int] | meter denominators
+    '''
+
+    def __init__(self, timings: Iterable[Timing] = (), precision: int | None = None):
+        self.precision = precision
+        typecode = 'd' if precision is None else 'q'
+
+        self.offsets = array(typecode)
+        self.bpms = array(typecode)
+        # osu! takes meters up to 9999
+        self.meters = array('H')
+        self.meter_units = array('H')
+
+        self.extend(timings)
+
+
+    def __repr__(self):
+        # print function
+        return f'TimingTable / {len(self)} points / {"double" if self.precision is None else f"fixed {self.precision}"}'
+
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+    def __iter__(self) -> Iterator[Timing]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+    def __getitem__(self, index: int | slice) -> Timing:
+        if isinstance(index, slice):
+            res = TimingTable(precision=self.precision)
+            res.offsets = self.offsets[index]
+            res.bpms = self.bpms[index]
+            res.meters = self.meters[index]
+            res.meter_units = self.meter_units[index]
+            return res
+
+        return Timing(
+            offset = self._load(self.offsets[index]),
+            bpm = self._load(self.bpms[index]),
+            meter = (self.meters[index], self.meter_units[index])
+        )
+
+
+    def _store(self, value: Decimal) -> float | int:
+        '''Converts a Decimal to the column representation.'''
+        if self.precision is None:
+            return float(value)
+
+        return int(Decimal(value).scaleb(self.precision, FIXED_CONTEXT).to_integral_value(context=FIXED_CONTEXT))
+
+
+    def _load(self, value: float | int) -> Decimal:
+        '''Converts a column value back to a Decimal.'''
+        if self.precision is None:
+            # keep whole numbers short, so that they are printed the same way as their source
+            if value.is_integer():
+                return Decimal(int(value))
+            return Decimal(repr(value))
+
+        return Decimal(value).scaleb(-self.precision, FIXED_CONTEXT)
+
+
+    def append(self, timing: Timing):
+        '''
+        Stores a single Timing instance.
+
+        - timing: Timing | the timing point to store
+        '''
+        self.offsets.append(self._store(timing.offset))
+        self.bpms.append(self._store(timing.bpm))
+        self.meters.append(timing.meter[0])
+        self.meter_units.append(timing.meter[1])
+
+
+    def extend(self, timings: Iterable[Timing]):
+        '''
+        Stores several Timing instances.
+
+        - timings: Iterable[Timing] | the timing points to store
+        '''
+        for t in timings:
+            self.append(t)
+
+
+    def extend_columns(self, offsets: list[float], bpms: list[float], meter: tuple[int, int] = (4,4)):
+        '''
+        Stores several timing points given as columns of floats, without going through Timing instances.
+
+        - offsets: list[float] | the offsets in ms
+        - bpms: list[float] | the BPMs
+
+        OPTIONAL ARGS:
+        - meter: tuple[int, int] | the meter shared by every point
+        '''
+        if self.precision is None:
+            self.offsets.extend(offsets)
+            self.bpms.extend(bpms)
+        else:
+            scale = 10 ** self.precision
+            self.offsets.extend(round(x * scale) for x in offsets)
+            self.bpms.extend(round(x * scale) for x in bpms)
+
+        self.meters.extend([meter[0]] * len(offsets))
+        self.meter_units.extend([meter[1]] * len(offsets))
+
+
+
+# TEMPOMAP CLASS
+class TempoMap:
+    '''
+    A tempo map built once from a list of Timing instances, for conversions between times (in ms) and beats.
+    The beat of every timing point is prefix-summed, so that each lookup is a binary search instead of a replay of the whole list.
+    Before the first timing point and after the last one, the first and last BPMs are extended.
+
+    - self.offsets: list[float] | the offset of every timing point in ms
+    - self.bpms: list[float] | the BPM of every timing point
+    - self.beats: list[float] | the beat of every timing point, the first one being beat 0
+
+    - self.stops: dict[float, float] | the length in ms of the stops, by beat
+
+    OPTIONAL ARGS:
+    - beats: Iterable[float] | the beat of every timing point, instead of the prefix sums, e.g. quantized ones from TimingList._stepmania_beats(),
+        or the ones of a chart with stops from TimingList.from_stepmania()
+    - stops: Iterable[tuple[float, float]] | Stepmania stops as (beat, length in ms). The beat of a stop is mapped to the time the stop starts,
+        like Stepmania plays the notes on it before the stop. Delays are left out: the notes on their beat are played after them
+    '''
+
+    def __init__(self, timings: list[Timing] | TimingTable, beats: Iterable[float] | None = None, stops: Iterable[tuple[float, float]] = ()):
+        if not len(timings):
+            raise ValueError('A TempoMap needs at least one timing point.')
+
+        self.stops = {}
+        for beat, length in stops:
+            self.stops[beat] = self.stops.get(beat, 0.0) + length
+
+        if isinstance(timings, TimingTable) and timings.precision is None:
+            self.offsets = timings.offsets.tolist()
+            self.bpms = timings.bpms.tolist()
+        else:
+            self.offsets = [float(t.offset) for t in timings]
+            self.bpms = [float(t.bpm) for t in timings]
+
+        if beats is not None:
+            self.beats = [float(b) for b in beats]
+            if len(self.beats) != len(self.offsets):
+                raise ValueError('A TempoMap needs the beat of every timing point.')
+            return
+
+        # beats elapsed in every segment, prefix-summed
+        self.beats = list(accumulate(
+            ((self.offsets[i] - self.offsets[i-1]) * self.bpms[i-1] / 60000 for i in range(1, len(self.offsets))),
+            initial = 0.0
+        ))
+
+
+    def __repr__(self):
+        # print function
+        return f'TempoMap / {len(self.offsets)} points / {self.beats[-1]} beats'
+
+
+    def time_to_beat(self, time: float) -> float:
+        '''
+        Returns the beat at a given time.
+
+        - time: float | a time in ms
+        '''
+        i = max(bisect_right(self.offsets, time) - 1, 0)
+        return self.beats[i] + (time - self.offsets[i]) * self.bpms[i] / 60000
+
+
+    def beat_to_time(self, beat: float) -> float:
+        '''
+        Returns the time in ms of a given beat.
+
+        - beat: float | a beat
+        '''
+        i = max(bisect_right(self.beats, beat) - 1, 0)
+        return self.offsets[i] + (beat - self.beats[i]) * 60000 / self.bpms[i] - self.stops.get(beat, 0.0)
+
+
+    def times_to_beats(self, times: Iterable[float]):
+        '''
+        Converts a whole array of times in ms to beats in one call.
+        Returns a numpy array if numpy is installed, a list otherwise.
+
+        - times: Iterable[float] | times in ms, e.g. hit object offsets
+        '''
+        if not numpy_available():
+            return [self.time_to_beat(t) for t in times]
+
+        import numpy as np
+
+        times = np.asarray(times, dtype=np.float64)
+        offsets, beats, bpms = np.asarray(self.offsets), np.asarray(self.beats), np.asarray(self.bpms)
+
+        i = np.maximum(np.searchsorted(offsets, times, side='right') - 1, 0)
+        return beats[i] + (times - offsets[i]) * bpms[i] / 60000
+
+
+    def beats_to_times(self, beats: Iterable[float]):
+        '''
+        Converts a whole array of beats to times in ms in one call.
+        Returns a numpy array if numpy is installed, a list otherwise.
+
+        - beats: Iterable[float] | beats, e.g. Stepmania note rows
+        '''
+        if not numpy_available():
+            return [self.beat_to_time(b) for b in beats]
+
+        import numpy as np
+
+        beats = np.asarray(beats, dtype=np.float64)
+        offsets, map_beats, bpms = np.asarray(self.offsets), np.asarray(self.beats), np.asarray(self.bpms)
+
+        i = np.maximum(np.searchsorted(map_beats, beats, side='right') - 1, 0)
+        times = offsets[i] + (beats - map_beats[i]) * 60000 / bpms[i]
+
+        if self.stops:
+            stop_beats, lengths = np.array(sorted(self.stops.items()), dtype=np.float64).T
+            j = np.minimum(np.searchsorted(stop_beats, beats), len(stop_beats) - 1)
+            times -= np.where(stop_beats[j] == beats, lengths[j], 0.0)
+
+        return times
+
+
+
 # TIMINGLIST CLASS
 class TimingList():
     '''
@@ -208,83 +674,625 @@ class TimingList():
     # supports .sm and .ssc
 
     @staticmethod
-    def from_stepmania(offset: Decimal, sm_timings: list[str]) -> list[Timing]:
+    def from_stepmania(offset: Decimal, sm_timings: list[str], table: TimingTable | None = None, backend: str | None = None, stops: list[str] = (), delays: list[str] = (), warps: list[str] = (), scrolls: list[str] = (), velocities: list | None = None, beats: list | None = None) -> list[Timing] | TimingTable:
         '''
         Takes a list of Stepmania timing points and creates a list of Timing instances from it.
         Works with .sm and .ssc formats.
-        NOTE: Only #BPMS is supported at the moment. #STOPS will be implemented in the future.
+        Stops and delays pause the chart, so a timing point is added where it resumes. Warps skip beats without any time passing.
 
         - offset: float | the initial offset in seconds.
         - timings: list[str] | a list containing Stepmania timings (BPM changes)
 
+        OPTIONAL ARGS:
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | one of BACKENDS. decimal if None, see choose_backend()
+            The numpy engine computes offsets as doubles, and does not handle stops, delays, warps and scrolls: charts which use them fall back to fraction.
+        - stops: list[str] | #STOPS entries, "beat=seconds"
+        - delays: list[str] | #DELAYS entries, "beat=seconds"
+        - warps: list[str] | #WARPS entries, "beat=length in beats"
+        - scrolls: list[str] | #SCROLLS entries, "beat=multiplier"
+        - velocities: list | if given, the scrolls are appended to it as Velocity instances, timed in the same pass as the BPMs
+        - beats: list | if given, the beat of every timing point is appended to it, see TempoMap
+
         Please read the Stepmania documentation for more info: 
         [https://github.com/stepmania/stepmania/wiki/sm]
         [https://github.com/stepmania/stepmania/wiki/ssc]
         '''
-        # convert the offset to milliseconds
-        time = Decimal(offset * 1000)
-        res = []
-        # turn the timings into usable data
-        timings_split = [
-            [Decimal(val) for val in t.split('=')]
-            for t in sm_timings
-        ]
+        res = [] if table is None else table
+        backend = choose_backend(backend, len(sm_timings), approximate=True)
+
+        if backend == 'numpy':
+            if not (stops or delays or warps or scrolls):
+                return TimingList._from_stepmania_numpy(offset, sm_timings, res, beats)
+
+            backend = 'fraction'
+
+        with localcontext(DECIMAL_CONTEXT if backend == 'decimal' else FIXED_CONTEXT):
+            # turn the timings into usable data
+            split = lambda entries: [
+                [Decimal(val) for val in t.split('=')[:2]]
+                for t in entries
+            ]
+            timings_split = split(sm_timings)
+
+            # convert the offset to milliseconds, and pick how segment durations and pauses (in seconds) are added to it
+            if backend == 'decimal':
+                time = Decimal(offset * 1000)
+                segment = lambda bpm, beats: Timing.beat_length(bpm, beats)
+                pause = lambda seconds: seconds * 1000
+                to_offset = lambda time: time
+
+            elif backend == 'fraction':
+                time = Fraction(str(offset)) * 1000
+                segment = lambda bpm, beats: Timing.beat_length(Fraction(bpm), Fraction(beats))
+                pause = lambda seconds: Fraction(seconds) * 1000
+                to_offset = to_microseconds
+
+            else:
+                # fixed: integer microseconds
+                time = int((Decimal(str(offset)) * 1000000).to_integral_value())
+                segment = lambda bpm, beats: int((Timing.beat_length(bpm, beats) * 1000).to_integral_value())
+                pause = lambda seconds: int((seconds * 1000000).to_integral_value())
+                to_offset = lambda time: Decimal(time).scaleb(-3)
+
+            # every event in beat order. at the same beat, BPM changes come first and warp ends last
+            beat, bpm = timings_split[0]
+            events = sorted(
+                [(b, STEPMANIA_BPM, value) for b, value in timings_split[1:]]
+                + [(b, STEPMANIA_PAUSE, value) for b, value in split(stops) + split(delays)]
+                + [(b, STEPMANIA_WARP, value) for b, value in split(warps)]
+                + [(b + value, STEPMANIA_RESUME, None) for b, value in split(warps)]
+                + [(b, STEPMANIA_SCROLL, value) for b, value in split(scrolls)],
+                key = lambda event: event[:2]
+            )
 
-        # i have no idea why this works
-        res.append(Timing(time, timings_split[0][1]))
-        
-        for i in range(len(timings_split) - 1):
+            # points created at the same time (zero-length segments, warps) are merged, the last one wins
+            pending = (time, bpm, beat)
+            warp_end = beat
 
-            current_bpm = timings_split[i][1]
-            # add the time elapsed since the last bpm change
-            time += Timing.beat_length(
-                bpm = current_bpm,
-                beat_amount = timings_split[i+1][0] - timings_split[i][0]
-            )
-            res.append(Timing(time, current_bpm))
+            for event_beat, kind, value in events:
+                if event_beat < beat:
+                    continue
+
+                # add the time elapsed since the last event, warped beats take no time
+                elapsed = event_beat - max(beat, warp_end)
+                if elapsed > 0:
+                    time += segment(bpm, elapsed)
+                beat = event_beat
+
+                if kind == STEPMANIA_WARP:
+                    warp_end = max(warp_end, beat + value)
+                    continue
+
+                if kind == STEPMANIA_SCROLL:
+                    if velocities is not None:
+                        velocities.append(Velocity(to_offset(time), value))
+                    continue
+
+                if kind == STEPMANIA_BPM:
+                    bpm = value
+                elif kind == STEPMANIA_PAUSE:
+                    time += pause(value)
+
+                if time != pending[0]:
+                    res.append(Timing(to_offset(pending[0]), pending[1]))
+                    if beats is not None:
+                        beats.append(float(pending[2]))
+                pending = (time, bpm, beat)
+
+            res.append(Timing(to_offset(pending[0]), pending[1]))
+            if beats is not None:
+                beats.append(float(pending[2]))
 
         return res
         
 
     @staticmethod
-    def to_stepmania(timings: list[Timing], step: Decimal = STEP128) -> tuple[str, str]:
+    def iter_stepmania(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None, velocities: list | None = None) -> Iterator[str]:
+        '''
+        Takes a list of Timing instances and yields the Stepmania #OFFSET tag, then the #BPMS tag one timing point at a time.
+        Works with .sm and .ssc formats.
+
+        - timings: list[Timing] | TimingTable | a list of Timing instances
+        - precision: Decimal | the step of the beat offset quantization. 
+            In some cases, a smaller step is preferrable, but in some others, you might be better off using 1/2nds or whole beats.
+
+        OPTIONAL ARGS:
+        - backend: str | one of BACKENDS. Picked from the list size if None, see choose_backend()
+        - velocities: list[Velocity] | if given and not empty, a #SCROLLS tag follows, see TimingList.iter_scrolls()
+        '''
+        backend = choose_backend(backend, len(timings))
+        # the numpy engine writes the beats of the decimal backend, see TimingList._stepmania_beats_numpy()
+        context = DECIMAL_CONTEXT if backend in ('decimal', 'numpy') else FIXED_CONTEXT
+
+        # offset
+        yield f'#OFFSET:{context.divide(timings[0].offset, 1000)};\n'
+        
+        # header
+        yield '#BPMS:'
+        separator = ''
+
+        for beat, t in zip(TimingList._stepmania_beats(timings, step, backend), timings):
+            yield f'{separator}{beat}={t.bpm}\n'
+            separator = ','
+
+        yield ';'
+
+        if velocities:
+            yield from TimingList.iter_scrolls(timings, velocities, step, backend)
+
+
+    @staticmethod
+    def to_stepmania(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None) -> tuple[str, str]:
         '''
         Takes a list of Timing instances and returns a tuple of strings containing Stepmania #OFFSET and #BPM tags.
         Works with .sm and .ssc formats.
-        NOTE: Only #BPMS is supported at the moment. #STOPS will be implemented in the future.
+        NOTE: Only #BPMS is written at the moment. #STOPS, #DELAYS and #WARPS are read, see TimingList.from_stepmania().
 
-        - timings: list[Timing] | a list of Timing instances
+        - timings: list[Timing] | TimingTable | a list of Timing instances
         - precision: Decimal | the step of the beat offset quantization. 
             In some cases, a smaller step is preferrable, but in some others, you might be better off using 1/2nds or whole beats.
 
+        OPTIONAL ARGS:
+        - backend: str | one of BACKENDS. Picked from the list size if None, see choose_backend()
+
         Please read the Stepmania documentation for more info: 
         [https://github.com/stepmania/stepmania/wiki/sm]
         [https://github.com/stepmania/stepmania/wiki/ssc]
         '''
-        # offset
-        offset_tag = f'#OFFSET:{timings[0].offset / 1000};'
-        
-        # header
-        header_tag = '#BPMS:'
+        offset_tag, *header = TimingList.iter_stepmania(timings, step, backend)
+        return ''.join(header), offset_tag.rstrip('\n')
+
+
+    @staticmethod
+    def _stepmania_beats(timings: list[Timing] | TimingTable, step: Decimal, backend: str) -> Iterator[Decimal]:
+        '''
+        Yields the quantized beat of every timing point.
+        Contexts are used through their methods here: a localcontext cannot be held across yields.
+        '''
+        if backend == 'numpy':
+            yield from TimingList._stepmania_beats_numpy(timings, step)
+            return
+
+        if backend != 'decimal':
+            yield from TimingList._stepmania_beats_exact(timings, step, backend)
+            return
+
+        context = DECIMAL_CONTEXT
         total_beats = Decimal('0.0')
-        
-        # create list of beats
-        beat_list = [Decimal('0.0')]
-        for i in range(1, len(timings)):
-            current_timing = timings[i]
-        
-            total_beats += quantize_value(
-                Timing.beat_amount(timings[i-1].bpm, (current_timing.offset - timings[i-1].offset)),
-                step
+        previous = None
+
+        for t in timings:
+            if previous is not None:
+                total_beats = context.add(total_beats, context.multiply(TimingList._stepmania_steps(previous, t, step), step))
+
+            yield total_beats
+            previous = t
+
+
+    @staticmethod
+    def _stepmania_steps(previous: Timing, t: Timing, step: Decimal) -> Decimal:
+        '''
+        Returns the quantization steps between two timing points, as the decimal backend counts them.
+        Timing.beat_amount() and quantize_value(), in DECIMAL_CONTEXT.
+        '''
+        context = DECIMAL_CONTEXT
+        amount = context.divide(context.multiply(context.subtract(t.offset, previous.offset), previous.bpm), 60000)
+        return round(context.divide(amount, step), 0)
+
+
+    @staticmethod
+    def _stepmania_beats_exact(timings: list[Timing] | TimingTable, step: Decimal, backend: str) -> Iterator[Decimal]:
+        '''
+        fraction and fixed counterpart of TimingList._stepmania_beats().
+        Beats are counted in whole steps, so that the total never drifts.
+        '''
+        context = FIXED_CONTEXT
+        total_steps = 0
+        previous = None
+
+        for t in timings:
+            if previous is not None:
+                if backend == 'fraction':
+                    amount = (Fraction(t.offset) - Fraction(previous.offset)) * Fraction(previous.bpm) / 60000 / Fraction(step)
+                    total_steps += round(amount)
+
+                else:
+                    # fixed: integer microseconds
+                    duration = to_integer_microseconds(t.offset) - to_integer_microseconds(previous.offset)
+                    amount = context.divide(context.multiply(Decimal(duration), previous.bpm), context.multiply(60000000, step))
+                    total_steps += int(amount.to_integral_value(ROUND_HALF_EVEN, context))
+
+            yield beat_decimal(total_steps, step)
+            previous = t
+
+
+    ### ADOFAI ###
+    # a path of tiles: angleData holds the direction of each tile, and the planet takes 1 beat to turn 180 degrees
+
+    @staticmethod
+    def from_adofai(offset: Decimal, bpm: Decimal, angles: list[Decimal], speeds: list[tuple[int, Decimal]] = (), twirls: list[int] = (), pauses: list[tuple[int, Decimal]] = (), table: TimingTable | None = None, backend: str | None = None) -> list[Timing] | TimingTable:
+        '''
+        Takes the path and the speed changes of an ADOFAI level and creates a list of Timing instances from it.
+        The angle turned on every tile is accumulated into the beat of every tile, then converted like Stepmania beats.
+
+        - offset: Decimal | the time of the first tile in seconds
+        - bpm: Decimal | the initial BPM
+        - angles: list[Decimal] | the angleData of the level, ADOFAI_MIDSPIN for midspins
+
+        OPTIONAL ARGS:
+        - speeds: list[tuple[int, Decimal]] | (floor, BPM) of every SetSpeed, in floor order
+        - twirls: list[int] | floors of every Twirl, each one reverses the rotation of the planet
+        - pauses: list[tuple[int, Decimal]] | (floor, beats) of every Pause
+        - table: TimingTable | if given, the timing points are appended to it and it is returned instead of a list
+        - backend: str | one of BACKENDS. decimal if None, see choose_backend()
+            The numpy engine accumulates the angles as doubles.
+
+        Please read the ADOFAI wiki for more info: [https://adofai.fandom.com/wiki/Level_editor]
+        '''
+        backend = choose_backend(backend, len(angles), approximate=True)
+
+        if backend == 'numpy':
+            degrees = TimingList._adofai_degrees_numpy(angles, twirls, pauses)
+        else:
+            degrees = TimingList._adofai_degrees(angles, twirls, pauses)
+
+        # several speeds on the same floor: the last one wins
+        last = len(degrees) - 1
+        floors = {0: bpm}
+        for floor, value in speeds:
+            floors[min(floor, last)] = value
+
+        sm_timings = [
+            f'{FIXED_CONTEXT.divide(Decimal(degrees[floor]), 180)}={value}'
+            for floor, value in sorted(floors.items())
+        ]
+
+        return TimingList.from_stepmania(offset, sm_timings, table, backend)
+
+
+    @staticmethod
+    def _adofai_degrees(angles: list[Decimal], twirls: list[int], pauses: list[tuple[int, Decimal]]) -> list[Decimal]:
+        '''
+        Returns the angle turned by the planet from the first tile to every tile, pauses included.
+        '''
+        context = FIXED_CONTEXT
+        twirled = set()
+        for floor in twirls:
+            twirled ^= {floor}
+
+        paused = {}
+        for floor, beats in pauses:
+            paused[floor] = paused.get(floor, 0) + beats * 180
+
+        turns = []
+        heading = Decimal(0)
+        clockwise = True
+
+        for floor, angle in enumerate(angles):
+            if floor in twirled:
+                clockwise = not clockwise
+
+            if angle == ADOFAI_MIDSPIN:
+                turn = Decimal(0)
+                heading = context.add(heading, 180)
+
+            else:
+                # the planet leaves the tile from the opposite of the direction it came in
+                turn = context.subtract(context.add(heading, 180), angle) % 360
+                if turn < 0:
+                    turn += 360
+                if not clockwise:
+                    turn = (360 - turn) % 360
+                # a full circle, not a standstill
+                if turn == 0:
+                    turn = Decimal(360)
+                heading = angle
+
+            turns.append(context.add(turn, paused.get(floor, 0)))
+
+        return list(accumulate(turns, context.add, initial=Decimal(0)))
+
+
+    @staticmethod
+    def iter_adofai(timings: list[Timing] | TimingTable, step: Decimal = STEP128, backend: str | None = None) -> Iterator[str]:
+        '''
+        Takes a list of Timing instances and yields a minimal .adofai level following them, piece by piece.
+        Beats are quantized like Stepmania beats. Whole beats are straight tiles, the rest of a beat is a turn.
+        The last timing point gets one measure of tiles.
+
+        - timings: list[Timing] | TimingTable | a list of Timing instances
+
+        OPTIONAL ARGS:
+        - step: Decimal | the step of the beat quantization
+        - backend: str | one of BACKENDS. Picked from the list size if None, see choose_backend()
+        '''
+        backend = choose_backend(backend, len(timings))
+        context = FIXED_CONTEXT
+        number = lambda value: f'{value.normalize(context):f}'
+
+        yield '{\n\t"angleData": ['
+
+        actions = []
+        floor = 0
+        heading = Decimal(0)
+        separator = ''
+        beats = list(TimingList._stepmania_beats(timings, step, backend))
+        # the length of the last timing point
+        beats.append(context.add(beats[-1], timings[-1].meter[0]))
+
+        for i, t in enumerate(timings):
+            if i:
+                actions.append(f'\t\t{{ "floor": {floor}, "eventType": "SetSpeed", "speedType": "Bpm", "beatsPerMinute": {number(t.bpm)}, "bpmMultiplier": 1 }}')
+
+            length = context.subtract(beats[i + 1], beats[i])
+            whole = int(length)
+            rest = context.subtract(length, whole)
+
+            for _ in range(whole):
+                yield f'{separator}{number(heading)}'
+                separator = ', '
+            floor += whole
+
+            if rest:
+                heading = context.subtract(context.add(heading, 180), context.multiply(rest, 180)) % 360
+                yield f'{separator}{number(heading)}'
+                separator = ', '
+                floor += 1
+
+        yield '],\n'
+        yield f'\t"settings":\n\t{{\n\t\t"version": 13,\n\t\t"bpm": {number(timings[0].bpm)},\n\t\t"offset": {number(timings[0].offset)}\n\t}},\n'
+        yield '\t"actions":\n\t[\n'
+        yield ',\n'.join(actions)
+        yield '\n\t],\n\t"decorations": []\n}\n'
+
+
+    ### SIMPLIFICATION ###
+
+    @staticmethod
+    def simplify(timings: list[Timing] | TimingTable, tolerance: float) -> tuple[list[Timing] | TimingTable, float]:
+        '''
+        Drops the timing points which do not move the beat grid by more than tolerance ms, in a single pass, and returns the kept points
+        (a TimingTable if one was given) with the largest shift of the grid in ms.
+        The grid of a kept point runs over the points dropped after it. Every timing point restarts the grid, so the grid of a dropped point
+        is matched line by line to the nearest lines of the kept one: the shift grows linearly along the point, and is measured where
+        it starts and where the next point starts. Points which change the meter are kept, and so is the last point unless it repeats the BPM,
+        since its BPM runs until the end of the song.
+
+        - timings: list[Timing] | TimingTable | a list of Timing instances, sorted by offset
+        - tolerance: float | the largest shift of the beat grid allowed, in ms
+        '''
+        points = timings if isinstance(timings, list) else list(timings)
+        offsets = [float(t.offset) for t in points]
+        bpms = [float(t.bpm) for t in points]
+        kept = points[:1]
+        worst = 0.0
+        # the last kept point, and the position of the current point on its grid, in beats
+        anchor = 0
+        beats = 0.0
+
+        def shift(position: float, offset: float) -> float:
+            # distance between a position on the grid of the anchor and an offset
+            return abs(offsets[anchor] + position * 60000 / bpms[anchor] - offset)
+
+        for i in range(1, len(points)):
+            beats += (offsets[i] - offsets[i - 1]) * bpms[i - 1] / 60000
+
+            if points[i].meter == points[anchor].meter:
+                line = round(beats)
+                shifts = [shift(line, offsets[i])]
+
+                if i == len(points) - 1:
+                    droppable = bpms[i] == bpms[anchor]
+                else:
+                    shifts.append(shift(line + (offsets[i + 1] - offsets[i]) * bpms[i] / 60000, offsets[i + 1]))
+                    droppable = True
+
+                if droppable and max(shifts) <= tolerance:
+                    worst = max(worst, *shifts)
+                    beats = line
+                    continue
+
+            kept.append(points[i])
+            anchor = i
+            beats = 0.0
+
+        if isinstance(timings, TimingTable):
+            return TimingTable(kept, timings.precision), worst
+
+        return kept, worst
+
+
+
+    ### SCROLL VELOCITIES ###
+    # velocities are kept in their own list sorted by offset, next to the timing points. Formats which tie them to the BPMs
+    # (osu! resets them at every uninherited point, Stepmania places them on beats) walk both lists together, once, without any lookup.
+
+    @staticmethod
+    def interleave(timings: list[Timing] | TimingTable, velocities: list[Velocity]) -> Iterator[Timing | Velocity]:
+        '''
+        Yields the timing points and the velocities in offset order, in a single pass over both lists. At the same offset, timing points come first.
+
+        - timings: list[Timing] | TimingTable | a list of Timing instances, sorted by offset
+        - velocities: list[Velocity] | a list of Velocity instances, sorted by offset
+        '''
+        return merge(timings, velocities, key = lambda point: point.offset)
+
+
+    @staticmethod
+    def iter_scrolls(timings: list[Timing] | TimingTable, velocities: list[Velocity], step: Decimal = STEP128, backend: str | None = None) -> Iterator[str]:
+        '''
+        Yields the Stepmania #SCROLLS tag of a list of velocities, one velocity at a time. .ssc only, .sm files ignore it.
+        Each velocity is placed from the quantized beat of the timing point before it, like the #BPMS entries: the timing points are walked
+        along the velocities, so both lists are only read once.
+
+        - timings: list[Timing] | TimingTable | a list of Timing instances
+        - velocities: list[Velocity] | a list of Velocity instances, sorted by offset
+
+        OPTIONAL ARGS:
+        - step: Decimal | the step of the beat quantization
+        - backend: str | one of BACKENDS, see TimingList.iter_stepmania()
+        '''
+        backend = choose_backend(backend, len(timings))
+        context = DECIMAL_CONTEXT if backend in ('decimal', 'numpy') else FIXED_CONTEXT
+
+        segments = zip(TimingList._stepmania_beats(timings, step, backend), timings)
+        beat, segment = next(segments)
+        following = next(segments, None)
+
+        yield '\n#SCROLLS:'
+        separator = ''
+
+        for v in velocities:
+            while following is not None and following[1].offset <= v.offset:
+                beat, segment = following
+                following = next(segments, None)
+
+            # Timing.beat_amount() and quantize_value(), counted in steps from the timing point
+            amount = context.divide(context.multiply(context.subtract(v.offset, segment.offset), segment.bpm), 60000)
+            steps = round(context.divide(amount, step), 0)
+
+            if backend in ('decimal', 'numpy'):
+                scroll_beat = context.add(beat, context.multiply(steps, step))
+            else:
+                scroll_beat = beat_decimal(int(context.divide(beat, step)) + int(steps), step)
+
+            # velocities before the first timing point start with the chart
+            yield f'{separator}{max(scroll_beat, 0)}={v.multiplier}\n'
+            separator = ','
+
+        yield ';'
+
+
+    ### NUMPY ENGINE ###
+    # same results as the loops above, computed over whole arrays with cumulative sums.
+    # values are computed as doubles, then rounded to the microsecond like the exact backends.
+    # the Stepmania beats written from a timing list are the exception: they are the ones of the decimal backend.
+
+    @staticmethod
+    def _columns(timings: list[Timing] | TimingTable):
+        '''
+        Returns the offsets and BPMs of a timing list as two float64 numpy arrays.
+        TimingTable columns are read in place instead of going through Timing views.
+        '''
+        import numpy as np
+
+        if isinstance(timings, TimingTable):
+            if timings.precision is None:
+                return np.frombuffer(timings.offsets, dtype=np.float64), np.frombuffer(timings.bpms, dtype=np.float64)
+
+            scale = 10 ** timings.precision
+            return np.frombuffer(timings.offsets, dtype=np.int64) / scale, np.frombuffer(timings.bpms, dtype=np.int64) / scale
+
+        offsets = np.fromiter((float(t.offset) for t in timings), dtype=np.float64, count=len(timings))
+        bpms = np.fromiter((float(t.bpm) for t in timings), dtype=np.float64, count=len(timings))
+        return offsets, bpms
+
+
+    @staticmethod
+    def _from_stepmania_numpy(offset: Decimal, sm_timings: list[str], res: list[Timing] | TimingTable, beats_out: list | None = None) -> list[Timing] | TimingTable:
+        '''
+        numpy counterpart of the TimingList.from_stepmania() loop. TimingTables are filled column-wise, without Timing instances.
+        '''
+        import numpy as np
+
+        pairs = [t.split('=')[:2] for t in sm_timings]
+        beats, bpm_values = np.array(pairs, dtype=np.float64).T
+
+        # like the loop: the first entry starts the chart, the others apply in beat order from its beat,
+        # and the points of zero-length segments are merged, the last one wins
+        order = np.concatenate(([0], 1 + np.argsort(beats[1:], kind='stable')))
+        order = order[beats[order] >= beats[0]]
+        order = order[np.append(np.diff(beats[order]) != 0, True)]
+
+        if len(order) != len(pairs) or np.any(np.diff(order) < 0):
+            beats, bpm_values = beats[order], bpm_values[order]
+            pairs = [pairs[i] for i in order.tolist()]
+
+        if beats_out is not None:
+            beats_out.extend(beats.tolist())
+
+        # time elapsed since the last bpm change, accumulated from the initial offset
+        start = Decimal(offset * 1000)
+        times = float(start) + np.cumsum(60000 / bpm_values[:-1] * np.diff(beats))
+
+        if isinstance(res, TimingTable):
+            res.extend_columns(
+                [float(start)] + times.tolist(),
+                bpm_values.tolist()
             )
-            beat_list += [total_beats]
-        
-        # make header
-        for i in range(len(beat_list)):
-            header_tag += f'{beat_list[i]}={timings[i].bpm}\n,'
+            return res
+
+        bpms = [Decimal(p[1]) for p in pairs]
+
+        res.append(Timing(to_microseconds(float(start)), bpms[0]))
+        res.extend(
+            Timing(to_microseconds(time), bpm)
+            for time, bpm in zip(times.tolist(), bpms[1:])
+        )
+        return res
+
+
+    @staticmethod
+    def _stepmania_beats_numpy(timings: list[Timing] | TimingTable, step: Decimal) -> Iterator[Decimal]:
+        '''
+        numpy counterpart of TimingList._stepmania_beats(): yields the quantized beat of every timing point.
+        The beats are the ones of the decimal backend, digit for digit: the steps between points are counted over whole arrays,
+        then summed with Decimals rounded to 7 digits. Counts within rounding error of a half step are counted again with Decimals.
+        '''
+        import numpy as np
+
+        offsets, bpms = TimingList._columns(timings)
+
+        # np.rint rounds half to even, like round() on Decimals
+        ratios = np.diff(offsets) * bpms[:-1] / 60000 / float(step)
+        steps = np.rint(ratios)
+        ties = np.abs(np.abs(ratios - steps) - 0.5) <= np.abs(ratios) * 4e-6 + 1e-9
+        steps = [Decimal(s) for s in steps.astype(np.int64).tolist()]
+
+        for i in np.flatnonzero(ties).tolist():
+            steps[i] = TimingList._stepmania_steps(timings[i], timings[i + 1], step)
+
+        context = DECIMAL_CONTEXT
+        total_beats = Decimal('0.0')
+        yield total_beats
+
+        for s in steps:
+            total_beats = context.add(total_beats, context.multiply(s, step))
+            yield total_beats
+
+
+    @staticmethod
+    def _adofai_degrees_numpy(angles: list[Decimal], twirls: list[int], pauses: list[tuple[int, Decimal]]) -> list[float]:
+        '''
+        numpy counterpart of TimingList._adofai_degrees().
+        '''
+        import numpy as np
+
+        angles = np.array(angles, dtype=np.float64)
+        midspins = angles == ADOFAI_MIDSPIN
+
+        # direction the planet comes in from, for every tile. A midspin turns it back
+        headings = angles.copy()
+        for floor in np.flatnonzero(midspins).tolist():
+            headings[floor] = (headings[floor - 1] if floor else 0) + 180
+        previous = np.concatenate(([0.0], headings[:-1]))
+
+        # parity of the twirls up to each tile
+        flips = np.zeros(len(angles), dtype=np.int64)
+        np.add.at(flips, [floor for floor in twirls if floor < len(angles)], 1)
+        counterclockwise = np.cumsum(flips) % 2 == 1
+
+        turns = np.mod(previous + 180 - angles, 360)
+        turns = np.where(counterclockwise, np.mod(-turns, 360), turns)
+        turns[turns == 0] = 360
+        turns[midspins] = 0
+
+        for floor, beats in pauses:
+            if floor < len(angles):
+                turns[floor] += float(beats) * 180
 
-        header_tag = header_tag[:-1] + ';'
-        return header_tag, offset_tag
+        return np.concatenate(([0.0], np.cumsum(turns))).tolist()
 
 
 